@@ -0,0 +1,101 @@
+"""
+Batch Runner.
+
+Submits agent prompts through the OpenAI Batch API for offline, non-interactive
+gap analyses. Batched requests are billed at half price but may take up to
+the completion window to return.
+"""
+
+import asyncio
+import sys
+import os
+
+# Add parent directory to path for config import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from openai import AsyncOpenAI
+from langchain_core.messages import BaseMessage, SystemMessage
+from config import OPENAI_API_KEY
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def to_batch_row(custom_id: str, model: str, messages: list[BaseMessage], **params) -> dict:
+    """
+    Build one Batch API request line from LangChain messages.
+
+    Args:
+        custom_id: Identifier used to match the result back to the request
+        model: Chat model name
+        messages: Messages as built by an agent's build_messages()
+        params: Extra chat completion parameters (temperature, etc.)
+
+    Returns:
+        Dict ready to be serialized as a JSONL row
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": [
+                {
+                    "role": "system" if isinstance(m, SystemMessage) else "user",
+                    "content": m.content
+                }
+                for m in messages
+            ],
+            **params
+        }
+    }
+
+
+async def run_batch(rows: list[dict], poll_interval: float = 30.0) -> dict[str, str]:
+    """
+    Upload request rows, submit a batch, and wait for the results.
+
+    Args:
+        rows: Request rows from to_batch_row()
+        poll_interval: Seconds between status checks
+
+    Returns:
+        Dict mapping custom_id to the assistant message content
+        (empty string for rows that errored)
+    """
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+    payload = b"\n".join(orjson.dumps(row) for row in rows)
+    input_file = await client.files.create(
+        file=("batch_input.jsonl", payload),
+        purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=COMPLETION_WINDOW
+    )
+
+    while batch.status not in TERMINAL_STATUSES:
+        await asyncio.sleep(poll_interval)
+        batch = await client.batches.retrieve(batch.id)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+    output = await client.files.content(batch.output_file_id)
+
+    results = {}
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        record = orjson.loads(line)
+        response = record.get("response") or {}
+        choices = (response.get("body") or {}).get("choices") or []
+        results[record["custom_id"]] = choices[0]["message"]["content"] if choices else ""
+
+    return results
@@ -5,16 +5,27 @@ LLM-powered agent that synthesizes analysis findings into structured research ga
 and generates actionable hypotheses.
 """
 
-import json
+import asyncio
+import re
 import sys
 import os
+from functools import lru_cache
+from itertools import islice
 
 # Add parent directory to path for config import
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import orjson
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
-from config import OPENAI_API_KEY, MODEL_NAME, LLM_TEMPERATURE_CREATIVE
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from config import (
+    OPENAI_API_KEY, MODEL_SYNTHESIZER, LLM_TEMPERATURE, LLM_TEMPERATURE_CREATIVE,
+    LLM_TOP_P, LLM_SEED
+)
+from cache import LRUCache, SingleFlight, make_key
+from http_clients import get_openai_http_client
+from agents.batch_runner import to_batch_row, run_batch
+from agents.schemas import GapSynthesis, Hypothesis
 
 
 SYSTEM_PROMPT = """You are a senior research strategist helping identify high-impact research opportunities in public health, behavioral science, and social science domains.
@@ -122,18 +133,89 @@ GUIDELINES:
 - When in doubt about validity, exclude the gap and explain why in "excluded_gaps\""""
 
 
+# Static prefix of every request - built once and shared across calls
+_SYS_MSG = SystemMessage(content=SYSTEM_PROMPT)
+
+# JSON object inside an optional ```json fence
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.DOTALL | re.IGNORECASE)
+
+# Follow-up turn for the one corrective retry after unparseable output
+_JSON_RETRY_MSG = HumanMessage(
+    content="The previous response was not valid JSON. Respond with ONLY the corrected JSON object."
+)
+
+# Parsed results keyed by a hash of the full prompt inputs
+_SYNTHESIS_CACHE = LRUCache(maxsize=512)
+
+# Identical requests arriving before the cache is populated share one LLM call
+_IN_FLIGHT = SingleFlight()
+
+# Formatted prompt text keyed by a hash of the inputs, shared by the
+# streaming and non-streaming paths
+_FORMATTED_ANALYSIS_CACHE = LRUCache(maxsize=64)
+
+
+# Routes requests sharing SYSTEM_PROMPT to the same provider prefix cache;
+# bump the version whenever SYSTEM_PROMPT changes
+PROMPT_CACHE_KEY = "gap_synthesizer_v1"
+
+
 THINKING_TEXT = "Prioritizing research gaps by impact and feasibility... Formulating testable hypotheses... Designing study approaches... Assessing resource requirements... Generating actionable recommendations..."
 
 
+@lru_cache(maxsize=1)
 def get_llm():
-    """Get configured LLM instance with creative temperature."""
+    """Get the shared LLM instance (built once per process)."""
     return ChatOpenAI(
-        model=MODEL_NAME,
-        temperature=LLM_TEMPERATURE_CREATIVE,  # Slightly higher for creative hypothesis generation
-        api_key=OPENAI_API_KEY
+        model=MODEL_SYNTHESIZER,
+        temperature=LLM_TEMPERATURE,
+        top_p=LLM_TOP_P,
+        seed=LLM_SEED,
+        api_key=OPENAI_API_KEY,
+        extra_body={"prompt_cache_key": PROMPT_CACHE_KEY},
+        http_async_client=get_openai_http_client()
     )
 
 
+@lru_cache(maxsize=1)
+def get_creative_llm():
+    """Get the higher-temperature LLM used only to refine hypotheses, constrained to the Hypothesis schema."""
+    return ChatOpenAI(
+        model=MODEL_SYNTHESIZER,
+        temperature=LLM_TEMPERATURE_CREATIVE,
+        api_key=OPENAI_API_KEY,
+        http_async_client=get_openai_http_client()
+    ).with_structured_output(Hypothesis, method="json_schema", strict=True)
+
+
+@lru_cache(maxsize=1)
+def get_structured_llm():
+    """Get the synthesizer LLM constrained to the GapSynthesis schema."""
+    return get_llm().with_structured_output(
+        GapSynthesis, method="json_schema", strict=True, include_raw=True
+    )
+
+
+def _parse_synthesis(content: str) -> dict | None:
+    """Extract the synthesis JSON from a model response, or None if unparseable."""
+    match = _FENCE_RE.search(content)
+    json_str = match.group(1) if match else content.strip()
+    try:
+        return orjson.loads(json_str)
+    except orjson.JSONDecodeError:
+        return None
+
+
+async def _retry_as_json(messages: list, content: str) -> dict | None:
+    """Ask once more for the JSON with JSON mode enforced; None if that also fails."""
+    llm = get_llm().bind(response_format={"type": "json_object"})
+    try:
+        response = await llm.ainvoke([*messages, AIMessage(content=content), _JSON_RETRY_MSG])
+    except Exception:
+        return None
+    return _parse_synthesis(response.content)
+
+
 def format_analysis_for_prompt(analysis: dict, stats: dict, domain: str) -> str:
     """
     Format analysis results for synthesis prompt.
@@ -146,69 +228,105 @@ def format_analysis_for_prompt(analysis: dict, stats: dict, domain: str) -> str:
     Returns:
         Formatted string for LLM prompt
     """
-    lines = []
-    
-    lines.append(f"RESEARCH DOMAIN: {domain}")
-    lines.append(f"PAPERS ANALYZED: {stats.get('total_papers', 'Unknown')}")
-    lines.append("")
+    cache_key = make_key(domain, analysis, stats)
+    formatted = _FORMATTED_ANALYSIS_CACHE.get(cache_key)
+    if formatted is None:
+        formatted = _format_analysis(analysis, stats, domain)
+        _FORMATTED_ANALYSIS_CACHE.set(cache_key, formatted)
+    return formatted
+
+
+# (analysis key, section heading) for each understudied-category block
+_UNDERSTUDIED_SECTIONS = (
+    ("understudied_populations", "UNDERSTUDIED POPULATIONS:"),
+    ("understudied_interventions", "UNDERSTUDIED INTERVENTIONS:"),
+    ("understudied_outcomes", "UNDERSTUDIED OUTCOMES:"),
+)
+
+
+def _format_analysis(analysis: dict, stats: dict, domain: str) -> str:
+    """Build the prompt text for format_analysis_for_prompt."""
+    return "\n".join(_analysis_lines(analysis, stats, domain))
+
+
+def _analysis_lines(analysis: dict, stats: dict, domain: str):
+    """Yield prompt lines for _format_analysis; empty strings are section breaks."""
+    yield f"RESEARCH DOMAIN: {domain}"
+    yield f"PAPERS ANALYZED: {stats.get('total_papers', 'Unknown')}"
+    yield ""
     
     # Distribution insights
     dist_insights = analysis.get('distribution_insights', {})
     
-    lines.append("UNDERSTUDIED POPULATIONS:")
-    for pop in dist_insights.get('understudied_populations', []):
-        lines.append(f"  - {pop.get('category')}: {pop.get('percentage')}% - {pop.get('significance', '')}")
-    lines.append("")
-    
-    lines.append("UNDERSTUDIED INTERVENTIONS:")
-    for interv in dist_insights.get('understudied_interventions', []):
-        lines.append(f"  - {interv.get('category')}: {interv.get('percentage')}% - {interv.get('significance', '')}")
-    lines.append("")
+    for key, heading in _UNDERSTUDIED_SECTIONS:
+        yield heading
+        for item in dist_insights.get(key, []):
+            yield f"  - {item.get('category')}: {item.get('percentage')}% - {item.get('significance', '')}"
+        yield ""
     
-    lines.append("UNDERSTUDIED OUTCOMES:")
-    for out in dist_insights.get('understudied_outcomes', []):
-        lines.append(f"  - {out.get('category')}: {out.get('percentage')}% - {out.get('significance', '')}")
-    lines.append("")
-    
-    if dist_insights.get('methodological_observations'):
-        lines.append(f"METHODOLOGICAL OBSERVATIONS: {dist_insights['methodological_observations']}")
-        lines.append("")
+    observations = dist_insights.get('methodological_observations')
+    if observations:
+        yield f"METHODOLOGICAL OBSERVATIONS: {observations}"
+        yield ""
     
     # Sparse combinations
-    lines.append("HIGH-PRIORITY SPARSE COMBINATIONS:")
-    sparse_analysis = analysis.get('sparse_combination_analysis', [])
-    high_priority = [s for s in sparse_analysis if s.get('priority') == 'high' or s.get('is_genuine_gap')]
-    for combo in high_priority[:10]:
-        lines.append(f"  - {combo.get('combination')}: {combo.get('paper_count')} papers")
-        lines.append(f"    Significance: {combo.get('clinical_significance', 'N/A')}")
-    lines.append("")
+    yield "HIGH-PRIORITY SPARSE COMBINATIONS:"
+    high_priority = (
+        s for s in analysis.get('sparse_combination_analysis', [])
+        if s.get('priority') == 'high' or s.get('is_genuine_gap')
+    )
+    for combo in islice(high_priority, 10):
+        yield f"  - {combo.get('combination')}: {combo.get('paper_count')} papers"
+        yield f"    Significance: {combo.get('clinical_significance', 'N/A')}"
+    yield ""
     
     # Temporal insights
     temporal = analysis.get('temporal_insights', {})
-    lines.append("TEMPORAL INSIGHTS:")
-    lines.append(f"  Overall trend: {temporal.get('overall_trend', 'unknown')}")
-    if temporal.get('emerging_topics'):
-        lines.append(f"  Emerging topics: {', '.join(temporal['emerging_topics'])}")
-    if temporal.get('declining_topics'):
-        lines.append(f"  Declining topics: {', '.join(temporal['declining_topics'])}")
-    lines.append("")
+    yield "TEMPORAL INSIGHTS:"
+    yield f"  Overall trend: {temporal.get('overall_trend', 'unknown')}"
+    emerging = temporal.get('emerging_topics')
+    if emerging:
+        yield f"  Emerging topics: {', '.join(emerging)}"
+    declining = temporal.get('declining_topics')
+    if declining:
+        yield f"  Declining topics: {', '.join(declining)}"
+    yield ""
     
     # Contradictions
-    contradictions = analysis.get('contradictions_and_debates', [])
+    contradictions = analysis.get('contradictions_and_debates')
     if contradictions:
-        lines.append("ACTIVE DEBATES/CONTRADICTIONS:")
+        yield "ACTIVE DEBATES/CONTRADICTIONS:"
         for debate in contradictions:
-            lines.append(f"  - {debate.get('topic')}: {debate.get('summary', '')}")
-    lines.append("")
+            yield f"  - {debate.get('topic')}: {debate.get('summary', '')}"
+    yield ""
     
     # Key findings
-    if analysis.get('key_findings_summary'):
-        lines.append(f"ANALYZER SUMMARY: {analysis['key_findings_summary']}")
+    summary = analysis.get('key_findings_summary')
+    if summary:
+        yield f"ANALYZER SUMMARY: {summary}"
+
+
+def build_messages(analysis: dict, stats: dict, domain: str) -> list:
+    """Build the chat messages shared by the interactive, streaming and batch paths."""
+    formatted_analysis = format_analysis_for_prompt(analysis, stats, domain)
     
-    return "\n".join(lines)
+    user_message = f"""{formatted_analysis}
+
+Based on this analysis, identify the top 3-5 research gaps and generate specific, testable hypotheses for each."""
+    
+    return [
+        _SYS_MSG,
+        HumanMessage(content=user_message)
+    ]
 
 
-async def synthesize_gaps(analysis: dict, stats: dict, domain: str) -> dict:
+async def synthesize_gaps(
+    analysis: dict,
+    stats: dict,
+    domain: str,
+    mode: str = "interactive",
+    refine_hypotheses: bool = False
+) -> dict:
     """
     Synthesize analysis into prioritized research gaps and hypotheses.
     
@@ -216,38 +334,57 @@ async def synthesize_gaps(analysis: dict, stats: dict, domain: str) -> dict:
         analysis: Results from literature_analyzer
         stats: Original statistics from aggregator
         domain: Original research domain string
+        mode: "interactive" for a direct call, "batch" to go through the
+              discounted OpenAI Batch API (slow - offline use only)
+        refine_hypotheses: Rewrite the top gaps' hypotheses with a
+                           higher-temperature pass (extra calls, run in parallel)
         
     Returns:
         Dict with prioritized gaps and hypotheses
     """
-    llm = get_llm()
+    cache_key = make_key(domain, analysis, stats)
+    result = _SYNTHESIS_CACHE.get(cache_key)
+    if result is None:
+        result = await _IN_FLIGHT.do(
+            f"{mode}:{cache_key}",
+            lambda: _synthesize_gaps_uncached(analysis, stats, domain, cache_key, mode)
+        )
     
-    formatted_analysis = format_analysis_for_prompt(analysis, stats, domain)
+    if refine_hypotheses and not result.get("parse_error"):
+        await refine_top_hypotheses(result, domain)
     
-    user_message = f"""{formatted_analysis}
+    return result
 
-Based on this analysis, identify the top 3-5 research gaps and generate specific, testable hypotheses for each."""
-    
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=user_message)
-    ]
+
+async def _synthesize_gaps_uncached(
+    analysis: dict,
+    stats: dict,
+    domain: str,
+    cache_key: str,
+    mode: str
+) -> dict:
+    """Cache-miss path of synthesize_gaps; runs at most once per key at a time."""
+    messages = await asyncio.to_thread(build_messages, analysis, stats, domain)
     
-    response = await llm.ainvoke(messages)
-    content = response.content
+    if mode == "batch":
+        row = to_batch_row(
+            "gap_synthesizer", MODEL_SYNTHESIZER, messages,
+            temperature=LLM_TEMPERATURE, top_p=LLM_TOP_P, seed=LLM_SEED
+        )
+        content = (await run_batch([row]))["gap_synthesizer"]
+        result = _parse_synthesis(content)
+    else:
+        output = await get_structured_llm().ainvoke(messages)
+        parsed = output["parsed"]
+        content = output["raw"].content
+        # Schema-constrained output only fails to parse on refusals/truncation
+        result = parsed.model_dump() if parsed is not None else _parse_synthesis(content)
+        if result is None:
+            result = await _retry_as_json(messages, content)
     
-    # Parse JSON from response
-    try:
-        if "```json" in content:
-            json_str = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            json_str = content.split("```")[1].split("```")[0]
-        else:
-            json_str = content
-        
-        result = json.loads(json_str.strip())
-        
-    except json.JSONDecodeError:
+    if result is not None:
+        _SYNTHESIS_CACHE.set(cache_key, result)
+    else:
         result = {
             "raw_synthesis": content,
             "parse_error": True
@@ -256,6 +393,49 @@ Based on this analysis, identify the top 3-5 research gaps and generate specific
     return result
 
 
+# Optional second stage: creative rewrite of the top gaps' hypotheses
+HYPOTHESIS_PROMPT = """You sharpen research hypotheses. Given one research gap, write a more specific, original, and testable hypothesis for it.
+
+Keep the population and intervention of the gap unchanged. Name a measurable primary outcome and the expected direction of effect."""
+
+_HYPOTHESIS_SYS_MSG = SystemMessage(content=HYPOTHESIS_PROMPT)
+
+# Only the highest-ranked gaps are worth the extra calls
+REFINE_TOP_N = 3
+
+
+async def _refine_hypothesis(gap: dict, domain: str) -> None:
+    """Replace one gap's hypothesis with a creative rewrite."""
+    gap_json = orjson.dumps(
+        {k: gap.get(k) for k in ("title", "description", "clinical_significance", "hypothesis")}
+    ).decode()
+    messages = [
+        _HYPOTHESIS_SYS_MSG,
+        HumanMessage(content=f"Research Domain: {domain}\n\nResearch Gap:\n{gap_json}")
+    ]
+    hypothesis = await get_creative_llm().ainvoke(messages)
+    gap["hypothesis"] = hypothesis.model_dump()
+
+
+async def refine_top_hypotheses(result: dict, domain: str, top_n: int = REFINE_TOP_N) -> dict:
+    """
+    Rewrite the hypotheses of the top-ranked gaps in place, in parallel.
+    
+    Gaps whose refinement call fails keep the deterministic hypothesis.
+    
+    Args:
+        result: Output of synthesize_gaps()
+        domain: Original research domain string
+        top_n: Number of gaps to refine
+        
+    Returns:
+        The same result dict
+    """
+    gaps = result.get("research_gaps", [])[:top_n]
+    await asyncio.gather(*(_refine_hypothesis(gap, domain) for gap in gaps), return_exceptions=True)
+    return result
+
+
 async def synthesize_gaps_streaming(analysis: dict, stats: dict, domain: str):
     """
     Synthesize gaps with streaming output.
@@ -270,17 +450,75 @@ async def synthesize_gaps_streaming(analysis: dict, stats: dict, domain: str):
     """
     llm = get_llm()
     
-    formatted_analysis = format_analysis_for_prompt(analysis, stats, domain)
+    messages = await asyncio.to_thread(build_messages, analysis, stats, domain)
     
-    user_message = f"""{formatted_analysis}
+    async for chunk in llm.astream(messages):
+        if chunk.content:
+            yield chunk.content
 
-Based on this analysis, identify the top 3-5 research gaps and generate specific, testable hypotheses for each."""
+
+class ArrayItemScanner:
+    """
+    Pull completed objects out of a JSON array while the document is still streaming.
     
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=user_message)
-    ]
+    Tracks brace depth (ignoring braces inside strings) from the opening
+    bracket of the named array, so each element can be parsed as soon as its
+    closing brace arrives instead of after the whole response.
+    """
     
-    async for chunk in llm.astream(messages):
-        if chunk.content:
-            yield chunk.content
\ No newline at end of file
+    def __init__(self, key: str):
+        self._marker = f'"{key}"'
+        self._text = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = 0
+    
+    def feed(self, chunk: str) -> list[dict]:
+        """Add streamed text and return any array elements completed by it."""
+        self._text += chunk
+        if self._done:
+            return []
+        
+        if not self._in_array:
+            marker_at = self._text.find(self._marker)
+            if marker_at < 0:
+                return []
+            bracket_at = self._text.find("[", marker_at + len(self._marker))
+            if bracket_at < 0:
+                return []
+            self._in_array = True
+            self._pos = bracket_at + 1
+        
+        items = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        items.append(orjson.loads(text[self._item_start:i + 1]))
+                    except orjson.JSONDecodeError:
+                        pass  # Malformed element - the final full parse decides
+            elif char == "]" and self._depth == 0:
+                self._done = True
+                break
+        self._pos = len(text)
+        return items
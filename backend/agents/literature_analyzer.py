@@ -5,16 +5,31 @@ LLM-powered agent that analyzes aggregated literature statistics to identify pat
 contradictions, and preliminary gap signals.
 """
 
-import json
+import asyncio
+import heapq
+import re
 import sys
 import os
+from functools import lru_cache
+from operator import itemgetter
 
 # Add parent directory to path for config import
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import orjson
+import tiktoken
+from openai import RateLimitError
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
-from config import OPENAI_API_KEY, MODEL_NAME, LLM_TEMPERATURE
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from config import (
+    OPENAI_API_KEY, MODEL_ANALYZER, MODEL_SYNTHESIZER, LLM_TEMPERATURE, LLM_TOP_P, LLM_SEED,
+    MAX_PROMPT_TOKENS
+)
+from cache import LRUCache, SingleFlight, make_key
+from http_clients import get_openai_http_client
+from agents.batch_runner import to_batch_row, run_batch
+from processors.abstract_digest import digest
+from agents.schemas import LiteratureAnalysis, CorpusStats, DistributionEntry, SampleAbstract
 
 
 SYSTEM_PROMPT = """You are an expert systematic reviewer and epidemiologist analyzing literature statistics for research gap identification.
@@ -120,19 +135,102 @@ OUTPUT FORMAT - Respond with valid JSON only:
 }"""
 
 
+# Static prefix of every request - built once and shared across calls
+_SYS_MSG = SystemMessage(content=SYSTEM_PROMPT)
+
+# JSON object inside an optional ```json fence
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.DOTALL | re.IGNORECASE)
+
+# Follow-up turn for the one corrective retry after unparseable output
+_JSON_RETRY_MSG = HumanMessage(
+    content="The previous response was not valid JSON. Respond with ONLY the corrected JSON object."
+)
+
+# Parsed results keyed by a hash of the full prompt inputs
+_ANALYSIS_CACHE = LRUCache(maxsize=512)
+
+# Identical requests arriving before the cache is populated share one LLM call
+_IN_FLIGHT = SingleFlight()
+
+# Formatted prompt text keyed by a hash of the stats dict, shared by the
+# streaming and non-streaming paths
+_FORMATTED_STATS_CACHE = LRUCache(maxsize=64)
+
+
+# Routes requests sharing SYSTEM_PROMPT to the same provider prefix cache;
+# bump the version whenever SYSTEM_PROMPT changes
+PROMPT_CACHE_KEY = "literature_analyzer_v1"
+
+
 THINKING_TEXT = "Analyzing population distributions... Examining intervention coverage... Identifying sparse research combinations... Reviewing temporal publication trends... Scanning abstracts for contradictions... Synthesizing gap patterns..."
 
 
-def get_llm():
-    """Get configured LLM instance."""
+@lru_cache(maxsize=None)
+def _build_llm(model: str) -> ChatOpenAI:
+    """Build the shared LLM instance for a model (once per process)."""
     return ChatOpenAI(
-        model=MODEL_NAME,
+        model=model,
         temperature=LLM_TEMPERATURE,
-        api_key=OPENAI_API_KEY
+        top_p=LLM_TOP_P,
+        seed=LLM_SEED,
+        api_key=OPENAI_API_KEY,
+        extra_body={"prompt_cache_key": PROMPT_CACHE_KEY},
+        http_async_client=get_openai_http_client()
+    )
+
+
+@lru_cache(maxsize=1)
+def get_llm():
+    """Get the analyzer LLM, falling back to the flagship tier on rate limits."""
+    llm = _build_llm(MODEL_ANALYZER)
+    if MODEL_ANALYZER == MODEL_SYNTHESIZER:
+        return llm
+    return llm.with_fallbacks(
+        [_build_llm(MODEL_SYNTHESIZER)],
+        exceptions_to_handle=(RateLimitError,)
     )
 
 
-def format_statistics_for_prompt(stats: dict) -> str:
+def _structured(model: str):
+    """Constrain a model to the LiteratureAnalysis schema; include_raw keeps refusals non-fatal."""
+    return _build_llm(model).with_structured_output(
+        LiteratureAnalysis, method="json_schema", strict=True, include_raw=True
+    )
+
+
+@lru_cache(maxsize=1)
+def get_structured_llm():
+    """Get the schema-constrained analyzer LLM, with the same flagship fallback as get_llm()."""
+    llm = _structured(MODEL_ANALYZER)
+    if MODEL_ANALYZER == MODEL_SYNTHESIZER:
+        return llm
+    return llm.with_fallbacks(
+        [_structured(MODEL_SYNTHESIZER)],
+        exceptions_to_handle=(RateLimitError,)
+    )
+
+
+def _parse_analysis(content: str) -> dict | None:
+    """Extract the analysis JSON from a model response, or None if unparseable."""
+    match = _FENCE_RE.search(content)
+    json_str = match.group(1) if match else content.strip()
+    try:
+        return orjson.loads(json_str)
+    except orjson.JSONDecodeError:
+        return None
+
+
+async def _retry_as_json(messages: list, content: str) -> dict | None:
+    """Ask once more for the JSON with JSON mode enforced; None if that also fails."""
+    llm = _build_llm(MODEL_ANALYZER).bind(response_format={"type": "json_object"})
+    try:
+        response = await llm.ainvoke([*messages, AIMessage(content=content), _JSON_RETRY_MSG])
+    except Exception:
+        return None
+    return _parse_analysis(response.content)
+
+
+def format_statistics_for_prompt(stats: CorpusStats) -> str:
     """
     Format statistics dictionary into readable prompt text.
     
@@ -142,113 +240,192 @@ def format_statistics_for_prompt(stats: dict) -> str:
     Returns:
         Formatted string for LLM prompt
     """
-    lines = []
-    
-    # Header
-    lines.append(f"CORPUS SUMMARY: {stats['total_papers']} papers")
-    if stats.get('year_range', {}).get('min') and stats.get('year_range', {}).get('max'):
-        lines.append(f"Year range: {stats['year_range']['min']} - {stats['year_range']['max']}")
-    lines.append("")
+    cache_key = make_key(stats)
+    formatted = _FORMATTED_STATS_CACHE.get(cache_key)
+    if formatted is None:
+        formatted = _format_statistics(stats)
+        _FORMATTED_STATS_CACHE.set(cache_key, formatted)
+    return formatted
+
+
+# Categories listed in full per distribution; the rest share one compact line
+# (the tail is where understudied categories live, so it is shortened, not dropped)
+TOP_CATEGORIES_PER_DISTRIBUTION = 15
+
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> tiktoken.Encoding | None:
+    """Tokenizer for the analyzer model, or None if its BPE file can't be loaded."""
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(MODEL_ANALYZER)
+    except KeyError:
+        encoding_name = "o200k_base"
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        # First use downloads the BPE ranks - offline hosts fall back to estimates
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens the analyzer model will see for text (~4 chars/token if offline)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode_ordinary(text))
+
+
+@lru_cache(maxsize=1)
+def _system_prompt_tokens() -> int:
+    """Token count of SYSTEM_PROMPT, computed once per process."""
+    return count_tokens(SYSTEM_PROMPT)
+
+
+def remaining_budget(user_msg_tokens: int) -> int:
+    """Tokens left under MAX_PROMPT_TOKENS after the system prompt and user text so far."""
+    return MAX_PROMPT_TOKENS - _system_prompt_tokens() - user_msg_tokens
+
+
+# (stats key, section heading) for each distribution block, in prompt order
+_DISTRIBUTION_SECTIONS = (
+    ("population", "POPULATION DISTRIBUTION:"),
+    ("intervention", "INTERVENTION DISTRIBUTION:"),
+    ("outcome", "OUTCOME DISTRIBUTION:"),
+    ("study_type", "STUDY TYPE DISTRIBUTION:"),
+)
+
+
+def _format_distribution(heading: str, distribution: dict[str, DistributionEntry]) -> str:
+    """Render one distribution block, most-studied categories first."""
+    ranked = sorted(distribution.values(), key=itemgetter('count'), reverse=True)
+    top = ranked[:TOP_CATEGORIES_PER_DISTRIBUTION]
+    tail = ranked[TOP_CATEGORIES_PER_DISTRIBUTION:]
+    rows = "".join(d['line'] + "\n" for d in top)
+    if tail:
+        rows += "  - Less common: " + ", ".join(f"{d['display_name']} ({d['count']})" for d in tail) + "\n"
+    return f"{heading}\n{rows}"
+
+
+def _format_sample(index: int, sample: SampleAbstract) -> str:
+    """Render one sampled abstract entry."""
+    text = f"\n\n[{index}] {sample.get('title', 'Untitled')} ({sample.get('year', 'N/A')})"
+    study_types = sample.get('study_type')
+    if study_types:
+        text += f"\n    Type: {', '.join(study_types)}"
+    abstract = sample.get('abstract')
+    if abstract:
+        text += f"\n    Abstract: {digest(abstract)}"
+    return text
+
+
+def _format_statistics(stats: CorpusStats) -> str:
+    """Build the prompt text for format_statistics_for_prompt."""
+    # The aggregator always emits these keys - index directly instead of .get() with fallback dicts
+    distributions = stats['distributions']
+    year_range = stats['year_range']
+    temporal = stats['temporal_trends']
     
-    # Population distribution
-    lines.append("POPULATION DISTRIBUTION:")
-    pop_dist = stats.get('distributions', {}).get('population', {})
-    for cat, data in sorted(pop_dist.items(), key=lambda x: x[1]['count'], reverse=True):
-        lines.append(f"  - {data['display_name']}: {data['count']} papers ({data['percentage']}%)")
-    lines.append("")
+    # Every section ends in a newline; joining on "\n" leaves one blank line between them
+    header = f"CORPUS SUMMARY: {stats['total_papers']} papers\n"
+    if year_range['min'] and year_range['max']:
+        header += f"Year range: {year_range['min']} - {year_range['max']}\n"
     
-    # Intervention distribution
-    lines.append("INTERVENTION DISTRIBUTION:")
-    int_dist = stats.get('distributions', {}).get('intervention', {})
-    for cat, data in sorted(int_dist.items(), key=lambda x: x[1]['count'], reverse=True):
-        lines.append(f"  - {data['display_name']}: {data['count']} papers ({data['percentage']}%)")
-    lines.append("")
+    sections = [header]
+    sections.extend(
+        _format_distribution(heading, distributions[key])
+        for key, heading in _DISTRIBUTION_SECTIONS
+    )
     
-    # Outcome distribution
-    lines.append("OUTCOME DISTRIBUTION:")
-    out_dist = stats.get('distributions', {}).get('outcome', {})
-    for cat, data in sorted(out_dist.items(), key=lambda x: x[1]['count'], reverse=True):
-        lines.append(f"  - {data['display_name']}: {data['count']} papers ({data['percentage']}%)")
-    lines.append("")
+    sparse_rows = "".join(
+        f"  - {item['display']}: {item['count']} papers\n"
+        for item in heapq.nsmallest(15, stats['sparse_combinations'], key=itemgetter('count'))
+    )
+    sections.append(f"SPARSE POPULATION-INTERVENTION COMBINATIONS (< 3 papers):\n{sparse_rows}")
     
-    # Study type distribution
-    lines.append("STUDY TYPE DISTRIBUTION:")
-    st_dist = stats.get('distributions', {}).get('study_type', {})
-    for cat, data in sorted(st_dist.items(), key=lambda x: x[1]['count'], reverse=True):
-        lines.append(f"  - {data['display_name']}: {data['count']} papers ({data['percentage']}%)")
-    lines.append("")
+    peak_year = temporal.get('peak_year')
+    sections.append(
+        "TEMPORAL TRENDS:\n"
+        f"  Overall trend: {temporal['trend']}\n"
+        f"  Recent avg change: {temporal.get('avg_recent_change', 'N/A')}%\n"
+        + (f"  Peak year: {peak_year} ({temporal['peak_count']} papers)\n" if peak_year else "")
+    )
     
-    # Sparse combinations
-    lines.append("SPARSE POPULATION-INTERVENTION COMBINATIONS (< 3 papers):")
-    sparse = stats.get('sparse_combinations', [])[:15]
-    for item in sparse:
-        lines.append(f"  - {item['display']}: {item['count']} papers")
-    lines.append("")
+    # Sample abstracts are the only open-ended section - pack them until the budget runs out
+    budget = remaining_budget(count_tokens("\n".join(sections)))
+    samples = []
+    for i, sample in enumerate(stats['sample_abstracts'][:10], 1):
+        entry = _format_sample(i, sample)
+        budget -= count_tokens(entry)
+        if budget < 0:
+            break
+        samples.append(entry)
+    sections.append(f"SAMPLE ABSTRACTS FOR REVIEW:{''.join(samples)}")
     
-    # Temporal trends
-    lines.append("TEMPORAL TRENDS:")
-    temporal = stats.get('temporal_trends', {})
-    lines.append(f"  Overall trend: {temporal.get('trend', 'unknown')}")
-    lines.append(f"  Recent avg change: {temporal.get('avg_recent_change', 'N/A')}%")
-    if temporal.get('peak_year'):
-        lines.append(f"  Peak year: {temporal['peak_year']} ({temporal['peak_count']} papers)")
-    lines.append("")
+    return "\n".join(sections)
+
+
+def build_messages(stats: dict, domain: str) -> list:
+    """Build the chat messages shared by the interactive, streaming and batch paths."""
+    formatted_stats = format_statistics_for_prompt(stats)
     
-    # Sample abstracts
-    lines.append("SAMPLE ABSTRACTS FOR REVIEW:")
-    for i, sample in enumerate(stats.get('sample_abstracts', [])[:10], 1):
-        lines.append(f"\n[{i}] {sample.get('title', 'Untitled')} ({sample.get('year', 'N/A')})")
-        study_types = sample.get('study_type', [])
-        if study_types:
-            lines.append(f"    Type: {', '.join(study_types)}")
-        abstract = sample.get('abstract', '')
-        if abstract:
-            lines.append(f"    Abstract: {abstract[:300]}...")
+    user_message = f"""RESEARCH DOMAIN: {domain}
+
+{formatted_stats}
+
+Analyze these statistics and identify research gaps, patterns, and opportunities."""
     
-    return "\n".join(lines)
+    return [
+        _SYS_MSG,
+        HumanMessage(content=user_message)
+    ]
 
 
-async def analyze_literature(stats: dict, domain: str) -> dict:
+async def analyze_literature(stats: dict, domain: str, mode: str = "interactive") -> dict:
     """
     Analyze literature statistics to identify patterns and gaps.
     
     Args:
         stats: Statistics from generate_statistics_summary()
         domain: Original research domain string
+        mode: "interactive" for a direct call, "batch" to go through the
+              discounted OpenAI Batch API (slow - offline use only)
         
     Returns:
         Dict with analysis results
     """
-    llm = get_llm()
-    
-    formatted_stats = format_statistics_for_prompt(stats)
+    cache_key = make_key(domain, stats)
+    cached = _ANALYSIS_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
     
-    user_message = f"""RESEARCH DOMAIN: {domain}
+    return await _IN_FLIGHT.do(
+        f"{mode}:{cache_key}", lambda: _analyze_literature_uncached(stats, domain, cache_key, mode)
+    )
 
-{formatted_stats}
 
-Analyze these statistics and identify research gaps, patterns, and opportunities."""
+async def _analyze_literature_uncached(stats: dict, domain: str, cache_key: str, mode: str) -> dict:
+    """Cache-miss path of analyze_literature; runs at most once per key at a time."""
+    messages = await asyncio.to_thread(build_messages, stats, domain)
     
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=user_message)
-    ]
+    if mode == "batch":
+        row = to_batch_row(
+            "literature_analyzer", MODEL_ANALYZER, messages,
+            temperature=LLM_TEMPERATURE, top_p=LLM_TOP_P, seed=LLM_SEED
+        )
+        content = (await run_batch([row]))["literature_analyzer"]
+        result = _parse_analysis(content)
+    else:
+        output = await get_structured_llm().ainvoke(messages)
+        parsed = output["parsed"]
+        content = output["raw"].content
+        # Schema-constrained output only fails to parse on refusals/truncation
+        result = parsed.model_dump() if parsed is not None else _parse_analysis(content)
+        if result is None:
+            result = await _retry_as_json(messages, content)
     
-    response = await llm.ainvoke(messages)
-    content = response.content
-    
-    # Parse JSON from response
-    try:
-        if "```json" in content:
-            json_str = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            json_str = content.split("```")[1].split("```")[0]
-        else:
-            json_str = content
-        
-        result = json.loads(json_str.strip())
-        
-    except json.JSONDecodeError:
+    if result is not None:
+        _ANALYSIS_CACHE.set(cache_key, result)
+    else:
         # Return raw content if JSON parsing fails
         result = {
             "raw_analysis": content,
@@ -271,18 +448,7 @@ async def analyze_literature_streaming(stats: dict, domain: str):
     """
     llm = get_llm()
     
-    formatted_stats = format_statistics_for_prompt(stats)
-    
-    user_message = f"""RESEARCH DOMAIN: {domain}
-
-{formatted_stats}
-
-Analyze these statistics and identify research gaps, patterns, and opportunities."""
-    
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=user_message)
-    ]
+    messages = await asyncio.to_thread(build_messages, stats, domain)
     
     async for chunk in llm.astream(messages):
         if chunk.content:
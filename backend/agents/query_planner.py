@@ -4,16 +4,29 @@ Query Planner Agent.
 LLM-powered agent that decomposes a research domain into searchable queries.
 """
 
-import json
+import logging
+import re
 import sys
 import os
+from functools import lru_cache
 
 # Add parent directory to path for config import
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import orjson
+from openai import RateLimitError
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
-from config import OPENAI_API_KEY, MODEL_NAME, LLM_TEMPERATURE
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from config import (
+    OPENAI_API_KEY, MODEL_PLANNER, MODEL_SYNTHESIZER, LLM_TEMPERATURE, LLM_TOP_P, LLM_SEED,
+    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD
+)
+from cache import LRUCache, SemanticCache, SingleFlight, normalize_text
+from http_clients import get_openai_http_client
+from agents.batch_runner import to_batch_row, run_batch
+from agents.schemas import QueryPlan
+
+logger = logging.getLogger(__name__)
 
 
 SYSTEM_PROMPT = """You are a systematic review methodologist specializing in public health and behavioral interventions research.
@@ -56,51 +69,172 @@ GUIDELINES:
 - Consider both US and international terminology"""
 
 
+# Static prefix of every request - built once and shared across calls
+_SYS_MSG = SystemMessage(content=SYSTEM_PROMPT)
+
+# JSON object inside an optional ```json fence
+_FENCE_RE = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.DOTALL | re.IGNORECASE)
+
+# Follow-up turn for the one corrective retry after unparseable output
+_JSON_RETRY_MSG = HumanMessage(
+    content="The previous response was not valid JSON. Respond with ONLY the corrected JSON object."
+)
+
+# Parsed plans keyed by normalized query - repeat submissions skip the LLM
+_PLAN_CACHE = LRUCache(maxsize=512)
+
+# Paraphrase-tolerant fallback, only consulted when SEMANTIC_CACHE_ENABLED
+_SEMANTIC_PLAN_CACHE = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD)
+
+# Identical queries arriving before the cache is populated share one LLM call
+_IN_FLIGHT = SingleFlight()
+
+
+# Routes requests sharing SYSTEM_PROMPT to the same provider prefix cache;
+# bump the version whenever SYSTEM_PROMPT changes
+PROMPT_CACHE_KEY = "query_planner_v1"
+
+
 THINKING_TEXT = "Analyzing research domain... Identifying key concepts and MeSH terms... Designing comprehensive search strategy... Balancing sensitivity and specificity... Generating optimized PubMed queries..."
 
 
-def get_llm():
-    """Get configured LLM instance."""
+@lru_cache(maxsize=None)
+def _build_llm(model: str) -> ChatOpenAI:
+    """Build the shared LLM instance for a model (once per process)."""
     return ChatOpenAI(
-        model=MODEL_NAME,
+        model=model,
         temperature=LLM_TEMPERATURE,
-        api_key=OPENAI_API_KEY
+        top_p=LLM_TOP_P,
+        seed=LLM_SEED,
+        api_key=OPENAI_API_KEY,
+        extra_body={"prompt_cache_key": PROMPT_CACHE_KEY},
+        http_async_client=get_openai_http_client()
+    )
+
+
+def get_flagship_llm() -> ChatOpenAI:
+    """Get the next-tier LLM used when the planner model fails."""
+    return _build_llm(MODEL_SYNTHESIZER)
+
+
+@lru_cache(maxsize=1)
+def get_llm():
+    """Get the planner LLM, falling back to the flagship tier on rate limits."""
+    llm = _build_llm(MODEL_PLANNER)
+    if MODEL_PLANNER == MODEL_SYNTHESIZER:
+        return llm
+    return llm.with_fallbacks(
+        [get_flagship_llm()],
+        exceptions_to_handle=(RateLimitError,)
+    )
+
+
+def _structured(model: str):
+    """Constrain a model to the QueryPlan schema; include_raw keeps refusals non-fatal."""
+    return _build_llm(model).with_structured_output(
+        QueryPlan, method="json_schema", strict=True, include_raw=True
+    )
+
+
+@lru_cache(maxsize=1)
+def get_structured_llm():
+    """Get the schema-constrained planner LLM, with the same flagship fallback as get_llm()."""
+    llm = _structured(MODEL_PLANNER)
+    if MODEL_PLANNER == MODEL_SYNTHESIZER:
+        return llm
+    return llm.with_fallbacks(
+        [_structured(MODEL_SYNTHESIZER)],
+        exceptions_to_handle=(RateLimitError,)
     )
 
 
-async def plan_queries(user_query: str) -> dict:
+def _parse_plan(content: str) -> dict | None:
+    """Extract the plan JSON from a model response, or None if unparseable."""
+    match = _FENCE_RE.search(content)
+    json_str = match.group(1) if match else content.strip()
+    try:
+        return orjson.loads(json_str)
+    except orjson.JSONDecodeError:
+        return None
+
+
+async def _retry_as_json(messages: list, content: str) -> dict | None:
+    """Ask once more for the JSON with JSON mode enforced (on the flagship tier); None if that also fails."""
+    llm = get_flagship_llm().bind(response_format={"type": "json_object"})
+    try:
+        response = await llm.ainvoke([*messages, AIMessage(content=content), _JSON_RETRY_MSG])
+    except Exception:
+        return None
+    return _parse_plan(response.content)
+
+
+def build_messages(user_query: str) -> list:
+    """Build the chat messages shared by the interactive, streaming and batch paths."""
+    return [
+        _SYS_MSG,
+        HumanMessage(content=f"Research Domain: {user_query}")
+    ]
+
+
+async def plan_queries(user_query: str, mode: str = "interactive") -> dict:
     """
     Generate search queries for a research domain.
     
     Args:
         user_query: User's research domain or question
+        mode: "interactive" for a direct call, "batch" to go through the
+              discounted OpenAI Batch API (slow - offline use only)
         
     Returns:
         Dict with search queries and PICO dimensions
     """
-    llm = get_llm()
+    cache_key = normalize_text(user_query)
+    cached = _PLAN_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
     
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=f"Research Domain: {user_query}")
-    ]
+    return await _IN_FLIGHT.do(
+        f"{mode}:{cache_key}", lambda: _plan_queries_uncached(user_query, cache_key, mode)
+    )
+
+
+async def _plan_queries_uncached(user_query: str, cache_key: str, mode: str) -> dict:
+    """Cache-miss path of plan_queries; runs at most once per key at a time."""
+    query_vector = None
+    if SEMANTIC_CACHE_ENABLED:
+        try:
+            query_vector = await _SEMANTIC_PLAN_CACHE.embed(cache_key)
+        except Exception:
+            query_vector = None  # Embedding outage - fall through to the LLM
+        if query_vector is not None:
+            similar = _SEMANTIC_PLAN_CACHE.lookup(query_vector)
+            if similar is not None:
+                # Report the hit out of band - the plan keeps the shape the LLM returns
+                logger.debug("plan_queries: Semantic cache hit for %r", user_query)
+                return similar
     
-    response = await llm.ainvoke(messages)
-    content = response.content
+    messages = build_messages(user_query)
     
-    # Parse JSON from response
-    try:
-        # Try to extract JSON from response
-        if "```json" in content:
-            json_str = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            json_str = content.split("```")[1].split("```")[0]
-        else:
-            json_str = content
-        
-        result = json.loads(json_str.strip())
-        
-    except json.JSONDecodeError:
+    if mode == "batch":
+        row = to_batch_row(
+            "query_planner", MODEL_PLANNER, messages,
+            temperature=LLM_TEMPERATURE, top_p=LLM_TOP_P, seed=LLM_SEED
+        )
+        result = _parse_plan((await run_batch([row]))["query_planner"])
+    else:
+        output = await get_structured_llm().ainvoke(messages)
+        parsed = output["parsed"]
+        content = output["raw"].content
+        # Schema-constrained output only fails to parse on refusals/truncation
+        result = parsed.model_dump() if parsed is not None else _parse_plan(content)
+        if result is None:
+            result = await _retry_as_json(messages, content)
+    
+    if result is not None:
+        _PLAN_CACHE.set(cache_key, result)
+        if query_vector is not None:
+            _SEMANTIC_PLAN_CACHE.insert(query_vector, result)
+    else:
         # Fallback: construct basic query from user input
         result = {
             "domain_summary": user_query,
@@ -130,10 +264,7 @@ async def plan_queries_streaming(user_query: str):
     """
     llm = get_llm()
     
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=f"Research Domain: {user_query}")
-    ]
+    messages = build_messages(user_query)
     
     async for chunk in llm.astream(messages):
         if chunk.content:
@@ -0,0 +1,217 @@
+"""
+Agent Output Schemas.
+
+Pydantic models mirroring the JSON formats described in each agent's
+SYSTEM_PROMPT. Passed to OpenAI Structured Outputs so responses are
+constrained to the schema server-side.
+
+Strict mode requires every field to be present, so optional values are
+modelled as nullable rather than defaulted.
+
+The TypedDicts at the end describe the aggregator's statistics summary,
+which the analyzer formats into its prompt.
+"""
+
+from typing import Optional, TypedDict, NotRequired
+
+from pydantic import BaseModel
+
+
+# =============================================================================
+# Drug Discovery
+# =============================================================================
+
+class AgentScore(BaseModel):
+    """The score line each drug discovery scoring agent ends its response with."""
+    score: float
+    band: str
+    justification: str
+
+
+# =============================================================================
+# Query Planner
+# =============================================================================
+
+class QueryPlan(BaseModel):
+    domain_summary: str
+    search_queries: list[str]
+    key_populations: list[str]
+    key_interventions: list[str]
+    key_outcomes: list[str]
+    time_range_suggestion: str
+    search_rationale: str
+
+
+# =============================================================================
+# Literature Analyzer
+# =============================================================================
+
+class UnderstudiedCategory(BaseModel):
+    category: str
+    percentage: float
+    significance: str
+    is_valid_intervention_target: Optional[bool]
+    rationale: Optional[str]
+
+
+class FilteredOut(BaseModel):
+    population_or_combination: str
+    reason: str
+
+
+class DistributionInsights(BaseModel):
+    understudied_populations: list[UnderstudiedCategory]
+    understudied_interventions: list[UnderstudiedCategory]
+    understudied_outcomes: list[UnderstudiedCategory]
+    methodological_observations: str
+    filtered_out: list[FilteredOut]
+
+
+class SparseCombination(BaseModel):
+    combination: str
+    paper_count: int
+    is_genuine_gap: bool
+    gap_type: str
+    reasoning: str
+    clinical_significance: str
+    priority: str
+
+
+class TemporalInsights(BaseModel):
+    overall_trend: str
+    emerging_topics: list[str]
+    declining_topics: list[str]
+    interpretation: str
+
+
+class Debate(BaseModel):
+    topic: str
+    summary: str
+    research_implication: str
+
+
+class LiteratureAnalysis(BaseModel):
+    distribution_insights: DistributionInsights
+    sparse_combination_analysis: list[SparseCombination]
+    temporal_insights: TemporalInsights
+    contradictions_and_debates: list[Debate]
+    key_findings_summary: str
+    analysis_caveats: list[str]
+
+
+# =============================================================================
+# Gap Synthesizer
+# =============================================================================
+
+class ValidityCheck(BaseModel):
+    population_is_intervention_target: bool
+    intervention_is_appropriate_for_population: bool
+    study_would_be_ethically_feasible: bool
+
+
+class EvidenceSummary(BaseModel):
+    papers_found: int
+    related_papers: int
+    key_statistic: str
+
+
+class Hypothesis(BaseModel):
+    statement: str
+    primary_outcome: str
+    expected_direction: str
+
+
+class StudyDesign(BaseModel):
+    design: str
+    setting: str
+    population: str
+    sample_size_estimate: str
+    duration: str
+
+
+class ResearchGap(BaseModel):
+    rank: int
+    title: str
+    category: str
+    description: str
+    validity_check: ValidityCheck
+    evidence_summary: EvidenceSummary
+    clinical_significance: str
+    hypothesis: Hypothesis
+    suggested_study_design: StudyDesign
+    challenges: list[str]
+    feasibility_rating: str
+    impact_rating: str
+    novelty_rating: str
+
+
+class ExcludedGap(BaseModel):
+    gap: str
+    reason: str
+
+
+class GapSynthesis(BaseModel):
+    research_gaps: list[ResearchGap]
+    excluded_gaps: list[ExcludedGap]
+    synthesis_summary: str
+    field_observations: str
+    methodological_recommendations: list[str]
+
+
+# =============================================================================
+# Corpus Statistics (processors.aggregator.generate_statistics_summary)
+# =============================================================================
+
+class DistributionEntry(TypedDict):
+    display_name: str
+    count: int
+    percentage: float
+    line: str  # Preformatted prompt row
+
+
+class YearRange(TypedDict):
+    min: Optional[int]
+    max: Optional[int]
+
+
+class Distributions(TypedDict):
+    population: dict[str, DistributionEntry]
+    intervention: dict[str, DistributionEntry]
+    setting: dict[str, DistributionEntry]
+    outcome: dict[str, DistributionEntry]
+    study_type: dict[str, DistributionEntry]
+
+
+class TemporalTrends(TypedDict):
+    trend: str
+    changes: list[dict]
+    # Absent when there are fewer than two years of data
+    avg_recent_change: NotRequired[float]
+    peak_year: NotRequired[int]
+    peak_count: NotRequired[int]
+
+
+class SparseCell(TypedDict):
+    dimension1: str
+    dimension2: str
+    count: int
+    display: str
+
+
+class SampleAbstract(TypedDict):
+    pmid: Optional[str]
+    title: Optional[str]
+    abstract: str
+    year: Optional[str]
+    study_type: list[str]
+
+
+class CorpusStats(TypedDict):
+    total_papers: int
+    year_range: YearRange
+    distributions: Distributions
+    temporal_trends: TemporalTrends
+    sparse_combinations: list[SparseCell]
+    understudied: dict[str, list[dict]]
+    sample_abstracts: list[SampleAbstract]
+    raw_counts: dict[str, dict[str, int]]
@@ -6,9 +6,120 @@ No LLM - pure API calls.
 """
 
 import asyncio
-import httpx
-from typing import Optional
-from config import OPENALEX_BASE_URL, OPENALEX_EMAIL, OPENALEX_BATCH_SIZE
+import time
+import orjson
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from cache import JsonlCache, LRUCache, SingleFlight, normalize_text
+from http_clients import get_api_http_client
+from api_clients.rate_limiter import AsyncRateLimiter
+from config import (
+    OPENALEX_BASE_URL, OPENALEX_EMAIL, OPENALEX_BATCH_SIZE,
+    OPENALEX_MAX_CONCURRENCY, OPENALEX_REQUESTS_PER_SECOND, OPENALEX_CACHE_PATH,
+    OPENALEX_CACHE_TTL, OPENALEX_CACHE_MISS_TTL, OPENALEX_CACHE_MAX_ENTRIES
+)
+
+
+OPENALEX_LIMITER = AsyncRateLimiter(rate=OPENALEX_REQUESTS_PER_SECOND, capacity=OPENALEX_REQUESTS_PER_SECOND)
+
+# Lowercased bare DOI -> extracted fields, persisted across runs. DOIs that
+# OpenAlex does not know are stored as misses, re-requested after
+# OPENALEX_CACHE_MISS_TTL in case OpenAlex has indexed them since.
+DOI_CACHE = JsonlCache(OPENALEX_CACHE_PATH, ttl=OPENALEX_CACHE_TTL, max_entries=OPENALEX_CACHE_MAX_ENTRIES)
+
+# Part of every DOI_CACHE key. Bump when ENRICH_SELECT or the fields extracted
+# from it change, so entries with the old field set are misses.
+DOI_CACHE_VERSION = 1
+
+# Yearly counts move over months and search rankings over days; both are
+# re-requested with the same arguments across gaps and sessions
+_TRENDS_CACHE = LRUCache(maxsize=2048, ttl=24 * 3600)
+_SEARCH_CACHE = LRUCache(maxsize=512, ttl=3600)
+# Concurrent misses on the same key share one request (the TTL caches only
+# cover completed ones)
+_IN_FLIGHT = SingleFlight()
+
+# OpenAlex rejects per_page above 200
+OPENALEX_MAX_PER_PAGE = 200
+
+# Root-level fields actually read from each /works response (OpenAlex does not
+# support dotted selects); skipping the rest cuts payload and decode time
+ENRICH_SELECT = "doi,cited_by_count,concepts,open_access,referenced_works_count"
+SEARCH_SELECT = (
+    "id,doi,title,publication_year,cited_by_count,concepts,open_access,"
+    "authorships,abstract_inverted_index"
+)
+
+
+def _normalize_doi(doi: str) -> str:
+    """Strip the doi.org URL prefix and lowercase - the form used for filters, matching and cache keys."""
+    return doi.removeprefix("https://doi.org/").removeprefix("http://doi.org/").lower()
+
+
+def _doi_key(doi: str) -> str:
+    """DOI_CACHE key for a normalized DOI under the current cache version."""
+    return f"v{DOI_CACHE_VERSION}:{doi}"
+
+
+def _miss_entry() -> dict:
+    """DOI_CACHE value recording that OpenAlex returned nothing for a DOI."""
+    return {"__miss__": True, "t": time.time()}
+
+
+def _apply_openalex_data(paper: dict, data: dict) -> None:
+    """Copy extracted OpenAlex fields onto a paper dict."""
+    paper.update(
+        citation_count=data["citation_count"],
+        openalex_concepts=list(data["concepts"]),
+        open_access=data["open_access"]
+    )
+
+
+async def _fetch_doi_batch(
+    client,
+    batch: list[tuple[int, str]],
+    headers: dict,
+    semaphore: asyncio.Semaphore
+) -> dict[str, dict]:
+    """
+    Look up one batch of DOIs on OpenAlex.
+    
+    Args:
+        client: Shared httpx client
+        batch: (paper index, normalized DOI) pairs
+        headers: Request headers
+        semaphore: Bounds concurrent OpenAlex requests
+        
+    Returns:
+        Dict mapping lowercased bare DOI to the extracted OpenAlex fields
+    """
+    # OpenAlex expects DOIs without the https://doi.org/ prefix
+    doi_filter = "|".join(doi for _, doi in batch)
+    
+    async with semaphore:
+        await OPENALEX_LIMITER.acquire()
+        response = await client.get(
+            f"{OPENALEX_BASE_URL}/works",
+            params={"filter": f"doi:{doi_filter}", "select": ENRICH_SELECT},
+            headers=headers
+        )
+    response.raise_for_status()
+    
+    results = orjson.loads(response.content).get("results", [])
+    
+    # Create lookup by DOI
+    doi_to_data = {}
+    for result in results:
+        result_doi = result.get("doi", "")
+        if result_doi:
+            doi_to_data[_normalize_doi(result_doi)] = {
+                "citation_count": result.get("cited_by_count", 0),
+                "concepts": [c.get("display_name") for c in result.get("concepts", [])[:5]],
+                "open_access": result.get("open_access", {}).get("is_oa", False),
+                "referenced_works_count": result.get("referenced_works_count", 0)
+            }
+    
+    return doi_to_data
 
 
 async def enrich_papers_by_doi(
@@ -18,6 +129,8 @@ async def enrich_papers_by_doi(
     """
     Enrich papers with OpenAlex data (citation counts, concepts).
     
+    Batches are requested concurrently, bounded by OPENALEX_MAX_CONCURRENCY.
+    
     Args:
         papers: List of paper dicts, each should have 'doi' field
         on_progress: Optional callback for progress updates
@@ -25,8 +138,8 @@ async def enrich_papers_by_doi(
     Returns:
         Same papers list with added 'citation_count' and 'concepts' fields
     """
-    # Filter papers that have DOIs
-    papers_with_doi = [(i, p) for i, p in enumerate(papers) if p.get("doi")]
+    # Filter papers that have DOIs, normalizing each once
+    papers_with_doi = [(i, _normalize_doi(p["doi"])) for i, p in enumerate(papers) if p.get("doi")]
     
     if not papers_with_doi:
         if on_progress:
@@ -36,74 +149,59 @@ async def enrich_papers_by_doi(
     if on_progress:
         on_progress(f"Enriching {len(papers_with_doi)} papers with OpenAlex data...")
     
+    await asyncio.to_thread(DOI_CACHE.load)
+    
+    # Serve previously seen DOIs from the on-disk cache; only the rest go out
+    to_fetch = []
+    enriched_count = 0
+    for idx, doi in papers_with_doi:
+        data = DOI_CACHE.get(_doi_key(doi))
+        if data is None:
+            to_fetch.append((idx, doi))
+        elif data.get("__miss__"):
+            if time.time() - data["t"] > OPENALEX_CACHE_MISS_TTL:
+                to_fetch.append((idx, doi))
+        else:
+            _apply_openalex_data(papers[idx], data)
+            enriched_count += 1
+    
+    if on_progress and len(to_fetch) < len(papers_with_doi):
+        on_progress(f"{len(papers_with_doi) - len(to_fetch)} papers served from the OpenAlex cache")
+    
     headers = {"mailto": OPENALEX_EMAIL}
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        # Process in batches
-        for batch_start in range(0, len(papers_with_doi), OPENALEX_BATCH_SIZE):
-            batch = papers_with_doi[batch_start:batch_start + OPENALEX_BATCH_SIZE]
-            
-            # Build DOI filter - OpenAlex expects DOIs without https://doi.org/ prefix
-            dois = []
-            for _, paper in batch:
-                doi = paper["doi"]
-                # Clean DOI format
-                if doi.startswith("https://doi.org/"):
-                    doi = doi.replace("https://doi.org/", "")
-                elif doi.startswith("http://doi.org/"):
-                    doi = doi.replace("http://doi.org/", "")
-                dois.append(doi)
-            
-            doi_filter = "|".join(dois)
-            
-            try:
-                response = await client.get(
-                    f"{OPENALEX_BASE_URL}/works",
-                    params={"filter": f"doi:{doi_filter}"},
-                    headers=headers
-                )
-                response.raise_for_status()
-                
-                results = response.json().get("results", [])
-                
-                # Create lookup by DOI
-                doi_to_data = {}
-                for result in results:
-                    result_doi = result.get("doi", "")
-                    if result_doi:
-                        # Normalize DOI for matching
-                        clean_doi = result_doi.replace("https://doi.org/", "").replace("http://doi.org/", "")
-                        doi_to_data[clean_doi.lower()] = {
-                            "citation_count": result.get("cited_by_count", 0),
-                            "concepts": [c.get("display_name") for c in result.get("concepts", [])[:5]],
-                            "open_access": result.get("open_access", {}).get("is_oa", False),
-                            "referenced_works_count": len(result.get("referenced_works", []))
-                        }
-                
-                # Merge back into papers
-                for idx, paper in batch:
-                    paper_doi = paper["doi"]
-                    if paper_doi.startswith("https://doi.org/"):
-                        paper_doi = paper_doi.replace("https://doi.org/", "")
-                    elif paper_doi.startswith("http://doi.org/"):
-                        paper_doi = paper_doi.replace("http://doi.org/", "")
-                    
-                    if paper_doi.lower() in doi_to_data:
-                        data = doi_to_data[paper_doi.lower()]
-                        papers[idx]["citation_count"] = data["citation_count"]
-                        papers[idx]["openalex_concepts"] = data["concepts"]
-                        papers[idx]["open_access"] = data["open_access"]
-                
-            except Exception as e:
-                if on_progress:
-                    on_progress(f"OpenAlex batch error (non-fatal): {str(e)}")
-            
-            # Small delay between batches
-            if batch_start + OPENALEX_BATCH_SIZE < len(papers_with_doi):
-                await asyncio.sleep(0.1)
+    client = get_api_http_client()
+    semaphore = asyncio.Semaphore(OPENALEX_MAX_CONCURRENCY)
+    batches = [
+        to_fetch[batch_start:batch_start + OPENALEX_BATCH_SIZE]
+        for batch_start in range(0, len(to_fetch), OPENALEX_BATCH_SIZE)
+    ]
+    results = await asyncio.gather(
+        *(_fetch_doi_batch(client, batch, headers, semaphore) for batch in batches),
+        return_exceptions=True
+    )
+    
+    new_entries = {}
+    for batch, doi_to_data in zip(batches, results):
+        if isinstance(doi_to_data, Exception):
+            # Failed batches are not cached - they are retried on the next run
+            if on_progress:
+                on_progress(f"OpenAlex batch error (non-fatal): {str(doi_to_data)}")
+            continue
+        
+        # Merge back into papers
+        for idx, doi in batch:
+            data = doi_to_data.get(doi)
+            if data is not None:
+                _apply_openalex_data(papers[idx], data)
+                new_entries[_doi_key(doi)] = data
+                enriched_count += 1
+            else:
+                new_entries[_doi_key(doi)] = _miss_entry()
+    
+    await asyncio.to_thread(DOI_CACHE.put_many, new_entries)
     
     if on_progress:
-        enriched_count = sum(1 for p in papers if p.get("citation_count") is not None)
         on_progress(f"Enriched {enriched_count} papers with citation data")
     
     return papers
@@ -125,41 +223,155 @@ async def get_concept_trends(
     Returns:
         Dict mapping year (str) to publication count
     """
-    from datetime import datetime
+    cache_key = f"{normalize_text(concept)}|{years}"
+    cached = _TRENDS_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
     
+    return await _IN_FLIGHT.do(
+        f"trends:{cache_key}",
+        lambda: _fetch_concept_trends(concept, years, cache_key, on_progress)
+    )
+
+
+async def _fetch_concept_trends(
+    concept: str,
+    years: int,
+    cache_key: str,
+    on_progress: Optional[callable]
+) -> dict[str, int]:
     current_year = datetime.now().year
     start_year = current_year - years
     
     headers = {"mailto": OPENALEX_EMAIL}
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            response = await client.get(
-                f"{OPENALEX_BASE_URL}/works",
-                params={
-                    "search": concept,
-                    "group_by": "publication_year",
-                    "filter": f"publication_year:{start_year}-{current_year}"
-                },
-                headers=headers
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            trends = {}
-            
-            for group in data.get("group_by", []):
-                year = group.get("key")
-                count = group.get("count", 0)
-                if year:
-                    trends[str(year)] = count
-            
-            return trends
-            
-        except Exception as e:
-            if on_progress:
-                on_progress(f"OpenAlex trends error: {str(e)}")
-            return {}
+    client = get_api_http_client()
+    try:
+        await OPENALEX_LIMITER.acquire()
+        response = await client.get(
+            f"{OPENALEX_BASE_URL}/works",
+            params={
+                "search": concept,
+                "group_by": "publication_year",
+                "filter": f"publication_year:{start_year}-{current_year}"
+            },
+            headers=headers
+        )
+        response.raise_for_status()
+        
+        data = orjson.loads(response.content)
+        trends = {}
+        
+        for group in data.get("group_by", []):
+            year = group.get("key")
+            count = group.get("count", 0)
+            if year:
+                trends[str(year)] = count
+        
+        _TRENDS_CACHE.set(cache_key, trends)
+        return trends
+        
+    except Exception as e:
+        if on_progress:
+            on_progress(f"OpenAlex trends error: {str(e)}")
+        return {}
+
+
+def _reconstruct_abstract(abstract_inv: Optional[dict[str, list[int]]]) -> Optional[str]:
+    """
+    Rebuild abstract text from OpenAlex's inverted index (word -> positions).
+    
+    Args:
+        abstract_inv: The work's abstract_inverted_index, if any
+        
+    Returns:
+        Abstract string, or None if absent or malformed
+    """
+    if not abstract_inv:
+        return None
+    
+    # One pass collects (position, word) pairs and the highest position
+    pairs = []
+    max_pos = -1
+    try:
+        for word, positions in abstract_inv.items():
+            for pos in positions:
+                pairs.append((pos, word))
+                if pos > max_pos:
+                    max_pos = pos
+    except (AttributeError, TypeError):
+        return None
+    
+    if max_pos < 0:
+        return None
+    
+    words = [""] * (max_pos + 1)
+    for pos, word in pairs:
+        words[pos] = word
+    return " ".join(words)
+
+
+def _work_to_paper(work: dict) -> dict:
+    """Convert an OpenAlex work (SEARCH_SELECT fields) to a paper dict."""
+    return {
+        "id": work.get("id", ""),
+        "title": work.get("title", "Untitled"),
+        "year": work.get("publication_year"),
+        "citation_count": work.get("cited_by_count", 0),
+        "doi": work.get("doi"),
+        "concepts": [c.get("display_name") for c in work.get("concepts", [])[:5]],
+        "source": "openalex",
+        "open_access": work.get("open_access", {}).get("is_oa", False),
+        "authors": [
+            a.get("author", {}).get("display_name") 
+            for a in work.get("authorships", [])[:3]
+        ],
+        "abstract": _reconstruct_abstract(work.get("abstract_inverted_index")),
+    }
+
+
+async def iter_openalex(query: str, max_results: int = 50) -> AsyncIterator[dict]:
+    """
+    Search OpenAlex and yield papers page by page using cursor pagination.
+    
+    Each page's papers are yielded as soon as that page arrives, so callers
+    can process results while later pages are still being requested.
+    
+    Args:
+        query: Search query
+        max_results: Maximum results to yield across all pages
+        
+    Yields:
+        Paper dicts in relevance order
+    """
+    headers = {"mailto": OPENALEX_EMAIL}
+    client = get_api_http_client()
+    
+    cursor = "*"
+    remaining = max_results
+    while cursor and remaining > 0:
+        await OPENALEX_LIMITER.acquire()
+        response = await client.get(
+            f"{OPENALEX_BASE_URL}/works",
+            params={
+                "search": query,
+                "per_page": min(remaining, OPENALEX_MAX_PER_PAGE),
+                "sort": "relevance_score:desc",
+                "filter": "is_paratext:false",
+                "select": SEARCH_SELECT,
+                "cursor": cursor
+            },
+            headers=headers
+        )
+        response.raise_for_status()
+        
+        data = orjson.loads(response.content)
+        works = data.get("results", [])[:remaining]
+        for work in works:
+            yield _work_to_paper(work)
+        
+        remaining -= len(works)
+        cursor = data.get("meta", {}).get("next_cursor") if works else None
 
 
 async def search_openalex(
@@ -176,63 +388,33 @@ async def search_openalex(
         on_progress: Optional callback for progress updates
         
     Returns:
-        List of paper dicts
+        List of paper dicts; on error, whatever pages arrived before it
     """
-    headers = {"mailto": OPENALEX_EMAIL}
+    cache_key = f"{normalize_text(query)}|{max_results}"
+    cached = _SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            response = await client.get(
-                f"{OPENALEX_BASE_URL}/works",
-                params={
-                    "search": query,
-                    "per_page": min(max_results, 100),
-                    "sort": "relevance_score:desc",
-                    "filter": "is_paratext:false"
-                },
-                headers=headers
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            papers = []
-            
-            for work in data.get("results", []):
-                paper = {
-                    "id": work.get("id", ""),
-                    "title": work.get("title", "Untitled"),
-                    "year": work.get("publication_year"),
-                    "citation_count": work.get("cited_by_count", 0),
-                    "doi": work.get("doi"),
-                    "concepts": [c.get("display_name") for c in work.get("concepts", [])[:5]],
-                    "source": "openalex",
-                    "open_access": work.get("open_access", {}).get("is_oa", False),
-                    "authors": [
-                        a.get("author", {}).get("display_name") 
-                        for a in work.get("authorships", [])[:3]
-                    ],
-                }
-                
-                # Try to reconstruct abstract from inverted index
-                abstract_inv = work.get("abstract_inverted_index")
-                if abstract_inv:
-                    try:
-                        max_pos = max(max(positions) for positions in abstract_inv.values())
-                        words = [""] * (max_pos + 1)
-                        for word, positions in abstract_inv.items():
-                            for pos in positions:
-                                words[pos] = word
-                        paper["abstract"] = " ".join(words)
-                    except:
-                        paper["abstract"] = None
-                else:
-                    paper["abstract"] = None
-                
-                papers.append(paper)
-            
-            return papers
-            
-        except Exception as e:
-            if on_progress:
-                on_progress(f"OpenAlex search error: {str(e)}")
-            return []
+    return await _IN_FLIGHT.do(
+        f"search:{cache_key}",
+        lambda: _fetch_search_results(query, max_results, cache_key, on_progress)
+    )
+
+
+async def _fetch_search_results(
+    query: str,
+    max_results: int,
+    cache_key: str,
+    on_progress: Optional[callable]
+) -> list[dict]:
+    papers = []
+    try:
+        async for paper in iter_openalex(query, max_results):
+            papers.append(paper)
+    except Exception as e:
+        if on_progress:
+            on_progress(f"OpenAlex search error: {str(e)}")
+        return papers
+    
+    _SEARCH_CACHE.set(cache_key, papers)
+    return papers
@@ -6,15 +6,46 @@ No LLM - pure API calls.
 """
 
 import asyncio
-import httpx
-from typing import Optional
+import orjson
+from typing import AsyncIterator, Optional
+from cache import JsonlCache, SingleFlight
+from http_clients import get_api_http_client
+from processors.xml_parser import PubmedStreamParser
+from api_clients.rate_limiter import AsyncRateLimiter
 from config import (
     PUBMED_BASE_URL, 
-    PUBMED_RATE_LIMIT_DELAY, 
-    PUBMED_MAX_RESULTS_PER_QUERY
+    PUBMED_REQUESTS_PER_SECOND,
+    PUBMED_MAX_RESULTS_PER_QUERY,
+    PUBMED_CACHE_PATH,
+    PUBMED_CACHE_TTL,
+    PUBMED_CACHE_MAX_ENTRIES,
+    NCBI_API_KEY
 )
 
 
+# Module-wide: NCBI's limit applies per client IP, not per pipeline run
+PUBMED_LIMITER = AsyncRateLimiter(rate=PUBMED_REQUESTS_PER_SECOND, capacity=PUBMED_REQUESTS_PER_SECOND)
+
+# Planner variants often repeat a query; concurrent duplicates share one esearch
+_SEARCH_IN_FLIGHT = SingleFlight()
+
+# Parsed records by PMID, so overlapping runs skip efetch for papers already seen
+RECORD_CACHE = JsonlCache(PUBMED_CACHE_PATH, ttl=PUBMED_CACHE_TTL, max_entries=PUBMED_CACHE_MAX_ENTRIES)
+
+# Part of every RECORD_CACHE key. Bump when xml_parser or mesh_mapper change
+# the shape of a parsed record, so records from the old version are misses.
+RECORD_VERSION = 1
+
+
+def _record_key(pmid: str) -> str:
+    """RECORD_CACHE key for a PMID under the current record version."""
+    return f"v{RECORD_VERSION}:{pmid}"
+
+
+# Sent with every E-utilities request when configured; unlocks the higher rate limit
+_KEY_PARAMS = {"api_key": NCBI_API_KEY} if NCBI_API_KEY else {}
+
+
 async def search_pubmed(query: str, max_results: int = PUBMED_MAX_RESULTS_PER_QUERY) -> list[str]:
     """
     Search PubMed and return list of PMIDs.
@@ -28,25 +59,36 @@ async def search_pubmed(query: str, max_results: int = PUBMED_MAX_RESULTS_PER_QU
     Returns:
         List of PMID strings
     """
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        params = {
-            "db": "pubmed",
-            "term": query,
-            "retmax": min(max_results, 200),
-            "retmode": "json",
-            "sort": "relevance"
-        }
-        
-        response = await client.get(f"{PUBMED_BASE_URL}/esearch.fcgi", params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        pmids = data.get("esearchresult", {}).get("idlist", [])
-        
-        return pmids
+    # Exact query text: PubMed's boolean operators are case-sensitive
+    retmax = min(max_results, 200)
+    return await _SEARCH_IN_FLIGHT.do(
+        f"{query.strip()}|{retmax}",
+        lambda: _esearch(query, retmax)
+    )
+
+
+async def _esearch(query: str, retmax: int) -> list[str]:
+    client = get_api_http_client()
+    params = {
+        "db": "pubmed",
+        "term": query,
+        "retmax": retmax,
+        "retmode": "json",
+        "sort": "relevance",
+        **_KEY_PARAMS
+    }
+    
+    await PUBMED_LIMITER.acquire()
+    response = await client.get(f"{PUBMED_BASE_URL}/esearch.fcgi", params=params)
+    response.raise_for_status()
+    
+    data = orjson.loads(response.content)
+    pmids = data.get("esearchresult", {}).get("idlist", [])
+    
+    return pmids
 
 
-async def fetch_pubmed_records(pmids: list[str]) -> str:
+async def fetch_pubmed_records(pmids: list[str]) -> bytes:
     """
     Fetch full PubMed records for given PMIDs.
     
@@ -56,29 +98,71 @@ async def fetch_pubmed_records(pmids: list[str]) -> str:
         pmids: List of PMID strings
         
     Returns:
-        Raw XML string containing all records
+        Raw XML bytes containing all records (undecoded; the parser reads bytes)
     """
     if not pmids:
-        return ""
-    
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        params = {
-            "db": "pubmed",
-            "id": ",".join(pmids),
-            "retmode": "xml"
-        }
+        return b""
+    
+    client = get_api_http_client()
+    params = {
+        "db": "pubmed",
+        "id": ",".join(pmids),
+        "retmode": "xml",
+        **_KEY_PARAMS
+    }
+    
+    await PUBMED_LIMITER.acquire()
+    # Large XML payloads - allow longer than the client default
+    response = await client.get(f"{PUBMED_BASE_URL}/efetch.fcgi", params=params, timeout=60.0)
+    response.raise_for_status()
+    
+    return response.content
+
+
+async def iter_pubmed_records(pmids: list[str]) -> AsyncIterator[dict]:
+    """
+    Fetch PubMed records and yield parsed papers while the response streams in.
+    
+    Uses efetch.fcgi like fetch_pubmed_records(), but never holds the full
+    XML text: each article is parsed as soon as its closing tag arrives.
+    
+    Args:
+        pmids: List of PMID strings
         
-        response = await client.get(f"{PUBMED_BASE_URL}/efetch.fcgi", params=params)
+    Yields:
+        Paper dictionaries as produced by processors.xml_parser
+    """
+    if not pmids:
+        return
+    
+    client = get_api_http_client()
+    params = {
+        "db": "pubmed",
+        "id": ",".join(pmids),
+        "retmode": "xml",
+        **_KEY_PARAMS
+    }
+    
+    await PUBMED_LIMITER.acquire()
+    parser = PubmedStreamParser()
+    async with client.stream("GET", f"{PUBMED_BASE_URL}/efetch.fcgi", params=params, timeout=60.0) as response:
         response.raise_for_status()
-        
-        return response.text
+        async for chunk in response.aiter_bytes(65536):
+            # Parsing a chunk takes milliseconds of CPU; keep it off the event loop
+            for paper in await asyncio.to_thread(parser.feed, chunk):
+                yield paper
+
+
+async def fetch_pubmed_papers(pmids: list[str]) -> list[dict]:
+    """Collect iter_pubmed_records() into a list."""
+    return [paper async for paper in iter_pubmed_records(pmids)]
 
 
 async def search_and_fetch(
     query: str, 
     max_results: int = PUBMED_MAX_RESULTS_PER_QUERY,
     on_progress: Optional[callable] = None
-) -> str:
+) -> bytes:
     """
     Combined search and fetch - returns XML for a single query.
     
@@ -88,7 +172,7 @@ async def search_and_fetch(
         on_progress: Optional callback for progress updates
         
     Returns:
-        Raw XML string containing records
+        Raw XML bytes containing records
     """
     if on_progress:
         on_progress(f"Searching PubMed: {query}")
@@ -98,9 +182,6 @@ async def search_and_fetch(
     if on_progress:
         on_progress(f"Found {len(pmids)} papers, fetching records...")
     
-    # Rate limit compliance
-    await asyncio.sleep(PUBMED_RATE_LIMIT_DELAY)
-    
     xml_data = await fetch_pubmed_records(pmids)
     
     return xml_data
@@ -122,18 +203,16 @@ async def search_multiple_queries(
     Returns:
         List of unique PMID strings
     """
-    all_pmids = set()
-    
     for i, query in enumerate(queries):
         if on_progress:
             on_progress(f"Query {i+1}/{len(queries)}: {query}")
-        
-        pmids = await search_pubmed(query, max_per_query)
-        all_pmids.update(pmids)
-        
-        # Rate limit between queries
-        if i < len(queries) - 1:
-            await asyncio.sleep(PUBMED_RATE_LIMIT_DELAY)
+    
+    # Queries run concurrently; PUBMED_LIMITER keeps them within NCBI's limit
+    results = await asyncio.gather(
+        *(search_pubmed(query, max_per_query) for query in queries)
+    )
+    
+    all_pmids = set().union(*results)
     
     if on_progress:
         on_progress(f"Total unique papers found: {len(all_pmids)}")
@@ -145,7 +224,7 @@ async def fetch_in_batches(
     pmids: list[str], 
     batch_size: int = 100,
     on_progress: Optional[callable] = None
-) -> str:
+) -> list[bytes]:
     """
     Fetch PMIDs in batches to avoid overwhelming the API.
     
@@ -155,21 +234,98 @@ async def fetch_in_batches(
         on_progress: Optional callback for progress updates
         
     Returns:
-        Combined XML string of all records
+        One raw XML document per batch, in batch order. They are not joined,
+        so no combined copy is built; parse each with parse_pubmed_xml().
     """
-    xml_parts = []
+    batches = [pmids[i:i + batch_size] for i in range(0, len(pmids), batch_size)]
     
-    for i in range(0, len(pmids), batch_size):
-        batch = pmids[i:i + batch_size]
-        
+    for n, batch in enumerate(batches, 1):
         if on_progress:
-            on_progress(f"Fetching batch {i//batch_size + 1}/{(len(pmids)-1)//batch_size + 1} ({len(batch)} papers)")
+            on_progress(f"Fetching batch {n}/{len(batches)} ({len(batch)} papers)")
+    
+    # Batches run concurrently; gather preserves their order in the output
+    return await asyncio.gather(
+        *(fetch_pubmed_records(batch) for batch in batches)
+    )
+
+
+async def search_and_fetch_multiple(
+    queries: list[str],
+    max_per_query: int = PUBMED_MAX_RESULTS_PER_QUERY,
+    max_total: Optional[int] = None,
+    batch_size: int = 100,
+    on_progress: Optional[callable] = None
+) -> tuple[list[str], list[dict]]:
+    """
+    Search all queries and fetch their parsed records, pipelined per query.
+    
+    Each query's efetch starts as soon as its own esearch returns, so fetches
+    overlap the remaining searches instead of waiting for all of them, and
+    records are parsed as they stream in. PUBMED_LIMITER paces every request.
+    PMIDs are fetched once across queries, and records in RECORD_CACHE are
+    not fetched at all. Each paper lists every query that returned it in
+    "source_queries".
+    
+    Args:
+        queries: List of search query strings
+        max_per_query: Maximum results per query
+        max_total: Cap on unique PMIDs fetched across all queries
+        batch_size: Number of PMIDs per efetch request
+        on_progress: Optional callback for progress updates
         
-        xml_data = await fetch_pubmed_records(batch)
-        xml_parts.append(xml_data)
+    Returns:
+        Tuple of (unique PMIDs fetched, parsed paper dicts)
+    """
+    claimed = []
+    seen = set()
+    source_queries = {}
+    new_records = {}
+    
+    await asyncio.to_thread(RECORD_CACHE.load)
+    
+    async def search_then_fetch(query: str) -> list[list[dict]]:
+        pmids = await search_pubmed(query, max_per_query)
+        for pmid in pmids:
+            source_queries.setdefault(pmid, []).append(query)
         
-        # Rate limit between batches
-        if i + batch_size < len(pmids):
-            await asyncio.sleep(PUBMED_RATE_LIMIT_DELAY)
+        # Claim PMIDs no other query has taken. Nothing awaits between the
+        # check and the update, so concurrent queries cannot claim the same one.
+        new_pmids = [pmid for pmid in pmids if pmid not in seen]
+        if max_total is not None:
+            new_pmids = new_pmids[:max(0, max_total - len(claimed))]
+        seen.update(new_pmids)
+        claimed.extend(new_pmids)
+        
+        # Copies: callers enrich papers in place
+        cached = []
+        to_fetch = []
+        for pmid in new_pmids:
+            record = RECORD_CACHE.get(_record_key(pmid))
+            if record is None:
+                to_fetch.append(pmid)
+            else:
+                cached.append(dict(record))
+        
+        if on_progress:
+            on_progress(f"{query}: {len(pmids)} results, fetching {len(to_fetch)} new ({len(cached)} cached)")
+        
+        batches = [to_fetch[i:i + batch_size] for i in range(0, len(to_fetch), batch_size)]
+        fetched = await asyncio.gather(*(fetch_pubmed_papers(batch) for batch in batches))
+        for batch in fetched:
+            for paper in batch:
+                if paper.get("pmid"):
+                    new_records[_record_key(paper["pmid"])] = dict(paper)
+        return [cached, *fetched]
+    
+    results = await asyncio.gather(*(search_then_fetch(query) for query in queries))
+    
+    if new_records:
+        await asyncio.to_thread(RECORD_CACHE.put_many, new_records)
+    
+    if on_progress:
+        on_progress(f"Total unique papers fetched: {len(claimed)}")
     
-    return "\n".join(xml_parts)
+    papers = [paper for parts in results for batch in parts for paper in batch]
+    for paper in papers:
+        paper["source_queries"] = source_queries.get(paper.get("pmid"), [])
+    return claimed, papers
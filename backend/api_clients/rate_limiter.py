@@ -0,0 +1,36 @@
+"""
+Async Token-Bucket Rate Limiter.
+
+Shared per upstream host so every coroutine draws from the same request
+budget. Unlike a fixed sleep between calls, a lone caller is never delayed
+while budget remains, and concurrent callers run at the full allowed rate.
+"""
+
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket: up to `capacity` requests in a burst, refilled at `rate` per second.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent, then consume one token."""
+        # The lock makes waiters queue in order instead of racing for refills
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
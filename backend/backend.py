@@ -9,10 +9,10 @@ Run with: uvicorn backend:app --reload --port 8000
 """
 
 import asyncio
-import json
 import re
 import sys
 import os
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Dict, Any, Optional
 from enum import Enum
 
@@ -31,7 +31,25 @@ load_dotenv("../.env")
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-app = FastAPI(title="Multi-Agent Research Pipeline")
+from http_clients import get_openai_http_client, close_http_clients
+import sse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_task = None
+    if PROMPT_CACHE_WARM_INTERVAL > 0:
+        warm_task = asyncio.create_task(
+            keep_prompt_caches_warm(llm, llm_fast, PROMPT_CACHE_WARM_INTERVAL)
+        )
+    yield
+    if warm_task is not None:
+        warm_task.cancel()
+    # Release pooled keep-alive connections on shutdown
+    await close_http_clients()
+
+
+app = FastAPI(title="Multi-Agent Research Pipeline", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -47,7 +65,12 @@ app.add_middleware(
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
+# Drug discovery agents with model_tier="fast" (the controller's score triage)
+MODEL_FAST = os.getenv("MODEL_FAST", "gpt-4o-mini")
 MAX_LOOPS = 3
+# Seconds between one-token calls that keep the provider's prompt cache warm
+# for the drug discovery prompts (caches expire after ~5 min idle); 0 disables
+PROMPT_CACHE_WARM_INTERVAL = float(os.getenv("PROMPT_CACHE_WARM_INTERVAL", "0"))
 
 # =============================================================================
 # LLM Instances
@@ -57,14 +80,24 @@ llm = ChatOpenAI(
     model=MODEL_NAME,
     temperature=0.3,
     streaming=True,
-    api_key=OPENAI_API_KEY
+    api_key=OPENAI_API_KEY,
+    http_async_client=get_openai_http_client()
+)
+
+llm_fast = ChatOpenAI(
+    model=MODEL_FAST,
+    temperature=0.3,
+    streaming=True,
+    api_key=OPENAI_API_KEY,
+    http_async_client=get_openai_http_client()
 )
 
 llm_creative = ChatOpenAI(
     model=MODEL_NAME,
     temperature=0.7,
     streaming=True,
-    api_key=OPENAI_API_KEY
+    api_key=OPENAI_API_KEY,
+    http_async_client=get_openai_http_client()
 )
 
 # =============================================================================
@@ -80,27 +113,14 @@ class PipelineType(str, Enum):
 # =============================================================================
 # Note: Drug discovery code has been moved to drug_discovery.py
 
+# Names only - the streamed "thinking" narration lives with the pipeline in
+# gap_finder.NODE_METADATA and is never sent to an LLM
 RESEARCH_GAP_AGENTS = {
-    "query_planner": {
-        "name": "Query Planner",
-        "thinking": "Analyzing research domain... Identifying key concepts and MeSH terms... Formulating comprehensive search strategy... Defining PICO dimensions... Planning systematic literature coverage..."
-    },
-    "data_fetcher": {
-        "name": "Data Fetcher", 
-        "thinking": "Connecting to PubMed E-utilities... Executing search queries... Retrieving paper metadata... Deduplicating results... Enriching with citation data..."
-    },
-    "aggregator": {
-        "name": "Aggregator",
-        "thinking": "Parsing MeSH terms from papers... Mapping to PICO categories... Building frequency distributions... Constructing co-occurrence matrices... Identifying sparse cells..."
-    },
-    "literature_analyzer": {
-        "name": "Literature Analyzer",
-        "thinking": "Analyzing population distributions... Examining intervention coverage... Identifying sparse research combinations... Reviewing temporal publication trends... Scanning abstracts for contradictions... Synthesizing gap patterns..."
-    },
-    "gap_synthesizer": {
-        "name": "Gap Synthesizer",
-        "thinking": "Prioritizing research gaps by impact and feasibility... Formulating testable hypotheses... Designing study approaches... Assessing resource requirements... Generating actionable recommendations..."
-    }
+    "query_planner": {"name": "Query Planner"},
+    "data_fetcher": {"name": "Data Fetcher"},
+    "aggregator": {"name": "Aggregator"},
+    "literature_analyzer": {"name": "Literature Analyzer"},
+    "gap_synthesizer": {"name": "Gap Synthesizer"},
 }
 
 RESEARCH_GAP_SEQUENCE = [
@@ -115,6 +135,7 @@ RESEARCH_GAP_SEQUENCE = [
 # Import drug discovery pipeline
 from drug_discovery import (
     run_drug_discovery_pipeline,
+    keep_prompt_caches_warm,
     DRUG_DISCOVERY_AGENTS,
     DRUG_DISCOVERY_SEQUENCE
 )
@@ -128,7 +149,17 @@ except ImportError as e:
     GAP_FINDER_ERROR = str(e)
 
 
-async def run_research_gap_pipeline(question: str) -> AsyncGenerator[str, None]:
+# gap_finder phase -> (frontend phase, content label). Non-LLM progress
+# ("working") and warnings render as ordinary output text.
+_STREAMED_PHASES = {
+    "thinking": ("thinking", ""),
+    "output": ("output", ""),
+    "working": ("output", ""),
+    "warning": ("output", "Warning: "),
+}
+
+
+async def run_research_gap_pipeline(question: str) -> AsyncGenerator[bytes, None]:
     """Run the 5-agent research gap finder pipeline."""
     
     print(f"[DEBUG] Starting research gap pipeline for: {question}")
@@ -136,11 +167,11 @@ async def run_research_gap_pipeline(question: str) -> AsyncGenerator[str, None]:
     
     if not GAP_FINDER_AVAILABLE:
         print(f"[DEBUG] Gap finder not available: {GAP_FINDER_ERROR}")
-        yield f"data: {json.dumps({'type': 'error', 'message': f'Research gap pipeline not available: {GAP_FINDER_ERROR}'})}\n\n"
+        yield sse.event({'type': 'error', 'message': f'Research gap pipeline not available: {GAP_FINDER_ERROR}'})
         return
     
     iteration = 1
-    yield f"data: {json.dumps({'type': 'iteration_start', 'iteration': iteration})}\n\n"
+    yield sse.event({'type': 'iteration_start', 'iteration': iteration})
     
     try:
         async for event in run_gap_finder_streaming(question):
@@ -150,30 +181,43 @@ async def run_research_gap_pipeline(question: str) -> AsyncGenerator[str, None]:
                 phase = event.get("phase", "working")
                 content = event.get("content", "")
                 
-                # Map phases to frontend expectations
-                if phase == "thinking":
-                    yield f"data: {json.dumps({'agent': agent, 'phase': 'thinking', 'content': content})}\n\n"
-                elif phase == "output":
-                    # Streaming LLM tokens
-                    yield f"data: {json.dumps({'agent': agent, 'phase': 'output', 'content': content})}\n\n"
-                elif phase == "working":
-                    # Non-LLM progress updates
-                    yield f"data: {json.dumps({'agent': agent, 'phase': 'output', 'content': content})}\n\n"
+                streamed = _STREAMED_PHASES.get(phase)
+                if streamed is not None:
+                    # Per-token hot path: one dict lookup, cached envelope
+                    frontend_phase, label = streamed
+                    yield sse.agent_event(agent, frontend_phase, f"{label}{content}" if label else content)
                 elif phase == "complete":
                     full_output = event.get("full_output", content)
-                    yield f"data: {json.dumps({'agent': agent, 'phase': 'complete', 'full_output': full_output})}\n\n"
+                    yield sse.event({'agent': agent, 'phase': 'complete', 'full_output': full_output})
                 elif phase == "error":
-                    yield f"data: {json.dumps({'agent': agent, 'phase': 'complete', 'full_output': f'Error: {content}'})}\n\n"
-                elif phase == "warning":
-                    # Pass through warnings
-                    yield f"data: {json.dumps({'agent': agent, 'phase': 'output', 'content': f'Warning: {content}'})}\n\n"
+                    yield sse.event({'agent': agent, 'phase': 'complete', 'full_output': f'Error: {content}'})
+                elif phase == "gap":
+                    # One completed research gap, ahead of the synthesizer's complete event
+                    yield sse.event({'agent': agent, 'phase': 'gap', 'gap': content})
+            
+            elif event.get("type") == "pipeline_partial":
+                # Early results for display while the LLM stages run. The full
+                # statistics also carry sample abstracts and raw counts, so
+                # only the summary goes over the wire.
+                result = event.get("result", {})
+                statistics = result.get("statistics", {})
+                yield sse.event({
+                    'type': 'pipeline_partial',
+                    'stage': event.get('stage'),
+                    'result': {
+                        'total_papers': result.get('total_papers', 0),
+                        'search_queries': result.get('search_queries', []),
+                        'distributions': statistics.get('distributions', {}),
+                        'understudied': statistics.get('understudied', {})
+                    }
+                })
             
             elif event.get("type") == "pipeline_complete":
-                yield f"data: {json.dumps({'type': 'iteration_end', 'iteration': iteration, 'action': 'complete'})}\n\n"
-                yield f"data: {json.dumps({'type': 'pipeline_complete', 'decision': 'COMPLETE', 'result': event.get('result', {}), 'iterations': iteration})}\n\n"
+                yield sse.event({'type': 'iteration_end', 'iteration': iteration, 'action': 'complete'})
+                yield sse.event({'type': 'pipeline_complete', 'decision': 'COMPLETE', 'result': event.get('result', {}), 'iterations': iteration})
             
             elif event.get("type") == "pipeline_error":
-                yield f"data: {json.dumps({'type': 'error', 'message': event.get('error', 'Unknown error')})}\n\n"
+                yield sse.event({'type': 'error', 'message': event.get('error', 'Unknown error')})
             
             elif event.get("type") == "pipeline_start":
                 # Already sent iteration_start
@@ -183,7 +227,7 @@ async def run_research_gap_pipeline(question: str) -> AsyncGenerator[str, None]:
         print(f"[DEBUG] Exception in pipeline: {e}")
         import traceback
         traceback.print_exc()
-        yield f"data: {json.dumps({'type': 'error', 'message': f'Pipeline error: {str(e)}'})}\n\n"
+        yield sse.event({'type': 'error', 'message': f'Pipeline error: {str(e)}'})
 
 
 # =============================================================================
@@ -206,7 +250,7 @@ async def stream_pipeline(request: PipelineRequest):
     if pipeline_type == "research_gap":
         generator = run_research_gap_pipeline(request.question)
     else:
-        generator = run_drug_discovery_pipeline(request.question, llm, MAX_LOOPS)
+        generator = run_drug_discovery_pipeline(request.question, llm, MAX_LOOPS, fast_llm=llm_fast)
     
     return StreamingResponse(
         generator,
@@ -229,7 +273,7 @@ async def list_pipelines():
                 "id": "drug_discovery",
                 "name": "Drug Discovery Pipeline",
                 "description": "6-agent hypothesis generation with dynamic routing",
-                "agents": [{"id": k, "name": v["name"]} for k, v in DRUG_DISCOVERY_AGENTS.items()]
+                "agents": [{"id": k, "name": v.name} for k, v in DRUG_DISCOVERY_AGENTS.items()]
             },
             {
                 "id": "research_gap",
@@ -0,0 +1,308 @@
+"""
+Shared in-process caches for LLM and API responses.
+
+Exact-match lookups are pure Python. JsonlCache persists API lookups and
+LLM responses to disk across restarts. The semantic cache makes one
+embedding call per lookup and compares vectors in memory. SingleFlight
+covers the window before a cache is populated, when identical concurrent
+requests would otherwise each make the same LLM call.
+"""
+
+import asyncio
+import copy
+import hashlib
+import math
+import operator
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+from langchain_openai import OpenAIEmbeddings
+from config import OPENAI_API_KEY, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+
+
+# =============================================================================
+# Key Helpers
+# =============================================================================
+
+def normalize_text(text: str) -> str:
+    """Collapse case and whitespace so trivially different inputs share a key."""
+    return " ".join(text.lower().split())
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Build a compact, stable cache key from arbitrary JSON-serializable parts.
+
+    Args:
+        parts: Values that together identify a request (strings, dicts, lists)
+
+    Returns:
+        32-character hex digest
+    """
+    payload = orjson.dumps(
+        parts,
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        default=str
+    )
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+# =============================================================================
+# LRU Cache
+# =============================================================================
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache with optional expiry.
+
+    Values are deep-copied on the way in and out so callers can freely
+    mutate results without corrupting the cached copy. A lock guards the
+    LRU bookkeeping because prompt formatting also touches caches from
+    worker threads (asyncio.to_thread). With a ttl, entries older than ttl
+    seconds are treated as misses and dropped when next looked up.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a copy of the cached value, or None on a miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a copy of value, evicting the oldest entry when full."""
+        value = copy.deepcopy(value)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else math.inf
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+
+# =============================================================================
+# On-Disk Cache
+# =============================================================================
+
+class JsonlCache:
+    """
+    Append-only on-disk cache, one {"key", "value", "t"} object per line.
+
+    The whole file is read into memory on first load(); later lines win, so
+    re-putting a key overrides it. Unparseable lines (e.g. a write torn by a
+    crash) are skipped. With a ttl, entries older than ttl seconds (wall
+    clock, since they outlive the process) are misses; with max_entries,
+    only the newest entries are kept. Dropped entries are compacted out of
+    the file on load. File I/O is blocking - call load() and put_many()
+    through asyncio.to_thread from async code.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: Optional[dict[str, tuple[float, Any]]] = None
+        self._lock = threading.Lock()
+
+    def _expired(self, written_at: float) -> bool:
+        return self.ttl is not None and time.time() - written_at > self.ttl
+
+    def load(self) -> None:
+        """Read the file into memory (no-op after the first call)."""
+        with self._lock:
+            if self._data is not None:
+                return
+            data = {}
+            lines = 0
+            try:
+                with open(self.path, "rb") as f:
+                    for line in f:
+                        lines += 1
+                        try:
+                            record = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            continue
+                        # Re-insert so dict order is write order, oldest first
+                        data.pop(record["key"], None)
+                        data[record["key"]] = (record.get("t", 0.0), record["value"])
+            except FileNotFoundError:
+                pass
+            
+            if self.ttl is not None:
+                data = {k: entry for k, entry in data.items() if not self._expired(entry[0])}
+            if self.max_entries is not None and len(data) > self.max_entries:
+                data = dict(list(data.items())[-self.max_entries:])
+            self._data = data
+            
+            if len(data) < lines:
+                self._rewrite()
+
+    def _rewrite(self) -> None:
+        """Replace the file with one line per live entry. Caller holds the lock."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(
+                orjson.dumps({"key": key, "value": value, "t": written_at}) + b"\n"
+                for key, (written_at, value) in self._data.items()
+            ))
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the stored value, or None on a miss. Requires load()."""
+        entry = self._data.get(key)
+        if entry is None or self._expired(entry[0]):
+            return None
+        return entry[1]
+
+    def put_many(self, items: dict[str, Any]) -> None:
+        """Store and append several entries in one write."""
+        if not items:
+            return
+        written_at = time.time()
+        payload = b"".join(
+            orjson.dumps({"key": key, "value": value, "t": written_at}) + b"\n"
+            for key, value in items.items()
+        )
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(payload)
+            for key, value in items.items():
+                self._data.pop(key, None)
+                self._data[key] = (written_at, value)
+            if self.max_entries is not None:
+                while len(self._data) > self.max_entries:
+                    del self._data[next(iter(self._data))]
+
+    def __len__(self) -> int:
+        return len(self._data or {})
+
+
+# =============================================================================
+# Semantic Cache
+# =============================================================================
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over query embeddings.
+
+    Paraphrased inputs ("smoking cessation in Latinos" vs "tobacco cessation
+    among Hispanic adults") map to nearby unit vectors, so a cosine
+    similarity above the threshold reuses the stored value. Entries are
+    kept in insertion order and the oldest is dropped when full; a linear
+    scan over a few hundred small vectors costs well under a millisecond
+    compared to the LLM call it replaces. With a ttl, entries older than
+    ttl seconds are never returned.
+    """
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 256, ttl: Optional[float] = None):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: list[tuple[list[float], Any, float]] = []
+        self._embeddings: Optional[OpenAIEmbeddings] = None
+
+    async def embed(self, text: str) -> list[float]:
+        """Embed text and return it as a unit vector."""
+        if self._embeddings is None:
+            self._embeddings = OpenAIEmbeddings(
+                model=EMBEDDING_MODEL,
+                dimensions=EMBEDDING_DIMENSIONS,
+                api_key=OPENAI_API_KEY
+            )
+        vector = await self._embeddings.aembed_query(text)
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def lookup(self, vector: list[float]) -> Optional[Any]:
+        """Return a copy of the closest unexpired value above the threshold, or None."""
+        now = time.monotonic()
+        best_score = self.threshold
+        best_value = None
+        for stored, value, expires_at in self._entries:
+            if expires_at < now:
+                continue
+            score = sum(map(operator.mul, stored, vector))
+            if score >= best_score:
+                best_score = score
+                best_value = value
+        return copy.deepcopy(best_value) if best_value is not None else None
+
+    def insert(self, vector: list[float], value: Any) -> None:
+        """Store a copy of value under vector, dropping the oldest entry when full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else math.inf
+        self._entries.append((vector, copy.deepcopy(value), expires_at))
+        if len(self._entries) > self.maxsize:
+            self._entries.pop(0)
+
+
+# =============================================================================
+# Request Coalescing
+# =============================================================================
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight task.
+
+    The first caller starts the work as a task; callers arriving before it
+    finishes await the same task. The task is shielded, so a caller that
+    disconnects does not cancel the work for everyone else. Each caller
+    receives its own deep copy of the result.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() unless a call with the same key is already in flight.
+
+        Args:
+            key: Identity of the request (normally its cache key)
+            fn: Zero-argument coroutine function doing the actual work
+
+        Returns:
+            The result of the single shared call
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _release(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every waiter went away
+
+    def __len__(self) -> int:
+        return len(self._inflight)
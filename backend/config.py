@@ -14,13 +14,33 @@ load_dotenv("../.env")
 
 # PubMed E-utilities
 PUBMED_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-PUBMED_RATE_LIMIT_DELAY = 0.35  # seconds between requests (3 req/sec limit)
+# An NCBI API key raises the per-IP limit from 3 to 10 requests/second
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+PUBMED_REQUESTS_PER_SECOND = 10 if NCBI_API_KEY else 3
 PUBMED_MAX_RESULTS_PER_QUERY = 100
+# PMID -> parsed record cache; MeSH indexing is added after publication, so entries expire
+PUBMED_CACHE_PATH = os.getenv(
+    "PUBMED_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "pubmed_records.jsonl")
+)
+PUBMED_CACHE_TTL = 30 * 24 * 3600
+PUBMED_CACHE_MAX_ENTRIES = 20000
 
 # OpenAlex
 OPENALEX_BASE_URL = "https://api.openalex.org"
 OPENALEX_EMAIL = "research-agent@example.com"  # For polite pool
 OPENALEX_BATCH_SIZE = 50
+OPENALEX_MAX_CONCURRENCY = 10  # Parallel DOI batch requests
+OPENALEX_REQUESTS_PER_SECOND = 10  # Polite pool limit
+# DOI -> metadata cache; citation counts drift, so entries expire, and DOIs
+# OpenAlex has not indexed yet are re-checked sooner
+OPENALEX_CACHE_PATH = os.getenv(
+    "OPENALEX_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "openalex_dois.jsonl")
+)
+OPENALEX_CACHE_TTL = 7 * 24 * 3600
+OPENALEX_CACHE_MISS_TTL = 24 * 3600
+OPENALEX_CACHE_MAX_ENTRIES = 50000
 
 # =============================================================================
 # LLM Settings
@@ -28,8 +48,52 @@ OPENALEX_BATCH_SIZE = 50
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
-LLM_TEMPERATURE = 0.3
+
+# Per-agent model tiers - the planner's constrained JSON task runs fine on a
+# small model; synthesis keeps the flagship and doubles as the fallback tier
+MODEL_PLANNER = os.getenv("MODEL_PLANNER", "gpt-4o-mini")
+MODEL_ANALYZER = os.getenv("MODEL_ANALYZER", MODEL_NAME)
+MODEL_SYNTHESIZER = os.getenv("MODEL_SYNTHESIZER", MODEL_NAME)
+
+# Upper bound on system + user prompt tokens; sample abstracts are dropped to fit
+MAX_PROMPT_TOKENS = 8000
+# Structured-JSON agents run near-deterministically; creativity is reserved
+# for the optional per-gap hypothesis refinement
+LLM_TEMPERATURE = 0.2
 LLM_TEMPERATURE_CREATIVE = 0.7
+LLM_TOP_P = 0.9
+LLM_SEED = 1234  # Fixed seed - identical prompts give (near) identical outputs
+# Retries for rate limits, timeouts and 5xx, with the OpenAI client's
+# exponential backoff (0.5s doubling to 8s, jittered)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+# Semantic cache - reuse results for paraphrased queries (costs one embedding call)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = 256  # Truncated embeddings keep lookups cheap
+# Exact-match replay of drug discovery agent responses; set to false for benchmarking
+DRUG_DISCOVERY_CACHE_ENABLED = os.getenv("DRUG_DISCOVERY_CACHE_ENABLED", "true").lower() == "true"
+# Send each drug discovery agent's OUTPUT FORMAT skeleton as an OpenAI Predicted
+# Output. Matching spans decode faster; rejected prediction tokens are billed
+PREDICTED_OUTPUTS_ENABLED = os.getenv("PREDICTED_OUTPUTS_ENABLED", "false").lower() == "true"
+# Fixed pauses between agent phases so the UI animation is easy to follow;
+# off by default since they add seconds of idle time to every run
+UI_PACING_ENABLED = os.getenv("UI_PACING_ENABLED", "false").lower() == "true"
+# While the gap finder fetches papers, send the analyzer and synthesizer system
+# prompts with a one-token call so their real calls hit the provider's prompt cache
+PROMPT_PREWARM_ENABLED = os.getenv("PROMPT_PREWARM_ENABLED", "false").lower() == "true"
+# Answer the gap finder's analyzer and synthesizer stages with one combined LLM
+# call - saves a round trip and a prompt, at some cost in synthesis depth
+FUSED_SYNTHESIS_ENABLED = os.getenv("FUSED_SYNTHESIS_ENABLED", "false").lower() == "true"
+# On-disk replay of identical gap finder LLM calls (planner, analyzer, synthesizer)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm_responses.jsonl")
+)
+LLM_CACHE_TTL = 7 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 5000
 
 # =============================================================================
 # Pipeline Settings
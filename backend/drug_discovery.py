@@ -8,22 +8,105 @@ Each scoring agent has explicit rubrics to ensure consistent, justified scores.
 """
 
 import asyncio
-import json
+import os
 import re
-from typing import AsyncGenerator, Dict, Any
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncGenerator, Dict, Any, Literal, Optional
 
+import orjson
 from langchain_core.messages import SystemMessage, HumanMessage
 
+import sse
+from agents.schemas import AgentScore
+from cache import LRUCache, SemanticCache, make_key
+from config import (
+    DRUG_DISCOVERY_CACHE_ENABLED, PREDICTED_OUTPUTS_ENABLED,
+    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD
+)
+
 
 # =============================================================================
 # Drug Discovery Agent Configurations
 # =============================================================================
 
-DRUG_DISCOVERY_AGENTS = {
-    "target_hypothesis": {
-        "name": "Target Hypothesis",
-        "thinking": "Deconstructing research question into core components... Identifying potential molecular targets based on disease biology... Evaluating target classes (kinases, GPCRs, ion channels, PPIs)... Considering mechanism of action options (inhibition, degradation, activation)... Assessing biological rationale and causal linkage to disease... Formulating specific, testable hypothesis with measurable endpoints...",
-        "prompt": """You are a senior drug discovery scientist with 20+ years of experience in target identification and validation.
+# Shared by every scoring agent; only the band labels/descriptions and the
+# score components differ
+SCORE_BANDS = ["0.85-1.0", "0.70-0.84", "0.55-0.69", "0.40-0.54", "0.25-0.39", "0.0-0.24"]
+
+# Tail of a response sent to extract_score() when the score line is missing
+SCORE_EXTRACTION_CHARS = 4000
+
+# Evidence below this ("Insufficient" band) skips preclinical design
+EARLY_EXIT_THRESHOLD = 0.25
+
+
+def band_code(label: str) -> str:
+    """Compact enum form of a rubric band label, e.g. "Highly Druggable" -> "HIGHLY_DRUGGABLE"."""
+    return label.upper().replace(" ", "_")
+
+
+def scoring_rubric(
+    score_key: str,
+    bands: list[tuple[str, str]],
+    components: list[str],
+    overall: str = "average of the three"
+) -> str:
+    """
+    Render the SCORING RUBRIC section that closes each scoring agent's prompt.
+
+    The model reads the full band definitions but answers with a single
+    compact JSON score line, which parse_score() reads first.
+
+    Args:
+        score_key: Score label the agent must output, e.g. "NOVELTY_SCORE"
+        bands: (label, description) per entry of SCORE_BANDS, highest first
+        components: Factors the overall score is derived from
+        overall: How the overall score is derived from the components
+
+    Returns:
+        Rubric text ending with the required score line format
+    """
+    band_lines = "\n\n".join(
+        f"{score_range} ({band_code(label)}): {description}"
+        for score_range, (label, description) in zip(SCORE_BANDS, bands, strict=True)
+    )
+    band_options = " | ".join(f'"{band_code(label)}"' for label, _ in bands)
+    return f"""=== SCORING RUBRIC ===
+Use this rubric to assign your {score_key}:
+
+{band_lines}
+
+Weigh {", ".join(components)} (each 0-1); overall score = {overall}.
+
+End your response with exactly one line in this format (do not restate the rubric):
+{score_key}: {{"score": <overall 0.0-1.0>, "band": {band_options}, "justification": "<one sentence citing the rubric>"}}"""
+
+
+@dataclass(frozen=True, slots=True)
+class AgentSpec:
+    """Static configuration of one drug discovery agent."""
+    name: str
+    # Agents whose state fields build_drug_discovery_input() reads
+    depends_on: tuple[str, ...]
+    # Display-only narration streamed to the UI; never part of an LLM message
+    thinking: str
+    # System prompt body; scoring agents append scoring_rubric(**rubric)
+    prompt: str
+    rubric: Optional[Dict[str, Any]] = None
+    # "fast" agents run on the pipeline's smaller model when one is given
+    model_tier: Literal["primary", "fast"] = "primary"
+    # Per-run template sent ahead of the user message (controller only)
+    prompt_suffix: Optional[str] = None
+
+
+DRUG_DISCOVERY_AGENTS: Dict[str, AgentSpec] = {
+    "target_hypothesis": AgentSpec(
+        name="Target Hypothesis",
+        depends_on=(),
+        thinking="Deconstructing research question into core components... Identifying potential molecular targets based on disease biology... Evaluating target classes (kinases, GPCRs, ion channels, PPIs)... Considering mechanism of action options (inhibition, degradation, activation)... Assessing biological rationale and causal linkage to disease... Formulating specific, testable hypothesis with measurable endpoints...",
+        prompt="""You are a senior drug discovery scientist with 20+ years of experience in target identification and validation.
 
 TASK: Transform the research question into a rigorous, structured drug discovery hypothesis.
 
@@ -76,12 +159,13 @@ VALIDATION CRITERIA:
 - Primary endpoint: [What you would measure]
 - Success threshold: [Quantitative if possible]
 - Timeline: [Expected time to validate]"""
-    },
+    ),
 
-    "literature_evidence": {
-        "name": "Literature Evidence",
-        "thinking": "Querying knowledge base for target biology and expression data... Analyzing genetic evidence (GWAS, CRISPR screens, Mendelian genetics)... Reviewing preclinical proof-of-concept studies... Examining clinical trial history for this target class... Identifying failed programs and understanding why they failed... Cataloging known tool compounds and their properties... Assessing strength of causal evidence vs correlative observations...",
-        "prompt": """You are a biomedical literature expert with deep expertise in translating scientific evidence to drug discovery decisions.
+    "literature_evidence": AgentSpec(
+        name="Literature Evidence",
+        depends_on=("target_hypothesis",),
+        thinking="Querying knowledge base for target biology and expression data... Analyzing genetic evidence (GWAS, CRISPR screens, Mendelian genetics)... Reviewing preclinical proof-of-concept studies... Examining clinical trial history for this target class... Identifying failed programs and understanding why they failed... Cataloging known tool compounds and their properties... Assessing strength of causal evidence vs correlative observations...",
+        prompt="""You are a biomedical literature expert with deep expertise in translating scientific evidence to drug discovery decisions.
 
 TASK: Provide a comprehensive evidence assessment for this drug discovery hypothesis.
 
@@ -129,34 +213,27 @@ EVIDENCE SYNTHESIS:
 EVIDENCE ASSESSMENT:
 [2-3 sentence synthesis of overall evidence strength and key concerns]
 
-=== SCORING RUBRIC ===
-Use this rubric to assign your EVIDENCE_CONFIDENCE score:
-
-0.85-1.0 (Excellent): Strong human genetic evidence (GWAS with p<5e-8, Mendelian disease link, or validated CRISPR essentiality). Clinical proof-of-concept exists. Clear causal mechanism established.
-
-0.70-0.84 (Strong): Moderate genetic evidence OR strong mechanistic data with animal model validation. Some clinical data exists (even if failed, lessons learned). Well-understood biology.
-
-0.55-0.69 (Moderate): Limited genetic evidence but solid preclinical rationale. Animal models show efficacy. Mechanism understood but not fully validated in humans. Some knowledge gaps.
-
-0.40-0.54 (Weak): Correlative evidence only (expression changes, no genetic link). Preclinical data inconsistent or limited. Significant translation concerns. Major knowledge gaps.
-
-0.25-0.39 (Poor): Minimal supporting evidence. Target-disease link speculative. No genetic validation. Conflicting preclinical data.
-
-0.0-0.24 (Insufficient): No credible evidence. Hypothesis based on theory only. No experimental support.
-
-EVIDENCE_CONFIDENCE: [0.0-1.0]
-- Genetic evidence: [0-1] 
-- Mechanistic understanding: [0-1]
-- Clinical precedent: [0-1]
-- Overall: [weighted average - genetic evidence counts 2x]
-
-Justification: [One sentence explaining why you assigned this score based on the rubric above]"""
-    },
-
-    "druggability": {
-        "name": "Druggability",
-        "thinking": "Analyzing target structure from PDB/AlphaFold... Evaluating binding site characteristics (size, depth, hydrophobicity)... Assessing protein family and selectivity landscape... Considering target localization (intracellular, membrane, secreted)... Evaluating historical success rate for this target class... Analyzing patent landscape and freedom to operate... Determining optimal therapeutic modality...",
-        "prompt": """You are a medicinal chemistry and structural biology expert specializing in druggability assessment.
+""",
+        rubric=dict(
+            score_key="EVIDENCE_CONFIDENCE",
+            bands=[
+                ("Excellent", "Strong human genetic evidence (GWAS with p<5e-8, Mendelian disease link, or validated CRISPR essentiality). Clinical proof-of-concept exists. Clear causal mechanism established."),
+                ("Strong", "Moderate genetic evidence OR strong mechanistic data with animal model validation. Some clinical data exists (even if failed, lessons learned). Well-understood biology."),
+                ("Moderate", "Limited genetic evidence but solid preclinical rationale. Animal models show efficacy. Mechanism understood but not fully validated in humans. Some knowledge gaps."),
+                ("Weak", "Correlative evidence only (expression changes, no genetic link). Preclinical data inconsistent or limited. Significant translation concerns. Major knowledge gaps."),
+                ("Poor", "Minimal supporting evidence. Target-disease link speculative. No genetic validation. Conflicting preclinical data."),
+                ("Insufficient", "No credible evidence. Hypothesis based on theory only. No experimental support."),
+            ],
+            components=["Genetic evidence", "Mechanistic understanding", "Clinical precedent"],
+            overall="weighted average - genetic evidence counts 2x"
+        )
+    ),
+
+    "druggability": AgentSpec(
+        name="Druggability",
+        depends_on=("target_hypothesis",),
+        thinking="Analyzing target structure from PDB/AlphaFold... Evaluating binding site characteristics (size, depth, hydrophobicity)... Assessing protein family and selectivity landscape... Considering target localization (intracellular, membrane, secreted)... Evaluating historical success rate for this target class... Analyzing patent landscape and freedom to operate... Determining optimal therapeutic modality...",
+        prompt="""You are a medicinal chemistry and structural biology expert specializing in druggability assessment.
 
 TASK: Evaluate whether this target can be effectively modulated by a drug and recommend the optimal approach.
 
@@ -224,34 +301,26 @@ DRUGGABILITY ASSESSMENT:
 CRITICAL CONCERNS:
 - [Any potential deal-breakers]
 
-=== SCORING RUBRIC ===
-Use this rubric to assign your DRUGGABILITY_SCORE:
-
-0.85-1.0 (Highly Druggable): Well-defined binding pocket with existing drug-like ligands. Multiple approved drugs in same target class. Clear path to selectivity. Established modality works well.
-
-0.70-0.84 (Druggable): Good structural knowledge with identifiable binding site. Tool compounds exist with reasonable potency (<100nM). Selectivity achievable based on precedent. One or more viable modalities.
-
-0.55-0.69 (Moderately Druggable): Structure available but binding site challenging (shallow, flexible, or polar). Limited chemical matter. Selectivity concerns but potentially addressable. May require novel modality.
-
-0.40-0.54 (Challenging): Poor binding site characteristics OR significant selectivity hurdles. No good tool compounds. Limited precedent for this target class. Requires significant innovation.
-
-0.25-0.39 (Difficult): Intrinsically disordered regions, flat PPI interface, or intracellular localization blocking biologics. Historical failures in this target class. No clear modality path.
-
-0.0-0.24 (Undruggable): No identifiable binding site. Transcription factor without cofactor pocket. Essential protein where any modulation causes toxicity. No viable modality.
-
-DRUGGABILITY_SCORE: [0.0-1.0]
-- Structural tractability: [0-1]
-- Selectivity achievability: [0-1]
-- Modality feasibility: [0-1]
-- Overall: [average of above three]
-
-Justification: [One sentence explaining why you assigned this score based on the rubric above]"""
-    },
-
-    "novelty": {
-        "name": "Novelty Analysis",
-        "thinking": "Mapping competitive landscape across pharma and biotech... Analyzing clinical trial databases for active programs... Reviewing patent filings and IP landscape... Identifying differentiation opportunities... Assessing first-mover vs fast-follower tradeoffs... Evaluating white space for novel mechanisms... Determining freedom to operate and IP strategy...",
-        "prompt": """You are a drug discovery strategist and competitive intelligence expert.
+""",
+        rubric=dict(
+            score_key="DRUGGABILITY_SCORE",
+            bands=[
+                ("Highly Druggable", "Well-defined binding pocket with existing drug-like ligands. Multiple approved drugs in same target class. Clear path to selectivity. Established modality works well."),
+                ("Druggable", "Good structural knowledge with identifiable binding site. Tool compounds exist with reasonable potency (<100nM). Selectivity achievable based on precedent. One or more viable modalities."),
+                ("Moderately Druggable", "Structure available but binding site challenging (shallow, flexible, or polar). Limited chemical matter. Selectivity concerns but potentially addressable. May require novel modality."),
+                ("Challenging", "Poor binding site characteristics OR significant selectivity hurdles. No good tool compounds. Limited precedent for this target class. Requires significant innovation."),
+                ("Difficult", "Intrinsically disordered regions, flat PPI interface, or intracellular localization blocking biologics. Historical failures in this target class. No clear modality path."),
+                ("Undruggable", "No identifiable binding site. Transcription factor without cofactor pocket. Essential protein where any modulation causes toxicity. No viable modality."),
+            ],
+            components=["Structural tractability", "Selectivity achievability", "Modality feasibility"]
+        )
+    ),
+
+    "novelty": AgentSpec(
+        name="Novelty Analysis",
+        depends_on=("target_hypothesis",),
+        thinking="Mapping competitive landscape across pharma and biotech... Analyzing clinical trial databases for active programs... Reviewing patent filings and IP landscape... Identifying differentiation opportunities... Assessing first-mover vs fast-follower tradeoffs... Evaluating white space for novel mechanisms... Determining freedom to operate and IP strategy...",
+        prompt="""You are a drug discovery strategist and competitive intelligence expert.
 
 TASK: Assess the novelty, differentiation potential, and competitive positioning of this hypothesis.
 
@@ -328,34 +397,26 @@ COMPETITIVE INTELLIGENCE:
 STRATEGIC ASSESSMENT:
 [2-3 sentences on competitive positioning and timing]
 
-=== SCORING RUBRIC ===
-Use this rubric to assign your NOVELTY_SCORE:
-
-0.85-1.0 (Highly Novel): First-in-class target with no competition. Clear white space with strong scientific rationale. Open IP landscape. Potential to define new treatment paradigm.
-
-0.70-0.84 (Novel): Best-in-class opportunity with clear differentiation. Few competitors (<3 clinical programs). Novel mechanism or modality vs existing approaches. Good IP position.
-
-0.55-0.69 (Moderately Novel): Validated target with room for differentiation. Moderate competition (3-5 programs). Some white space in indication or mechanism. Workable IP situation.
-
-0.40-0.54 (Limited Novelty): Fast-follower opportunity. Crowded space (5-10 programs) but differentiation possible. Must out-execute competitors. IP constraints may exist.
-
-0.25-0.39 (Low Novelty): Me-too approach. Highly competitive (>10 programs). Limited differentiation potential. Significant IP barriers. Late entrant disadvantage.
-
-0.0-0.24 (No Novelty): Multiple approved drugs exist. Saturated market. No clear differentiation. Blocked by patents. No strategic rationale for entry.
-
-NOVELTY_SCORE: [0.0-1.0]
-- Differentiation potential: [0-1]
-- White space availability: [0-1]  
-- Timing advantage: [0-1]
-- Overall: [average of above three]
-
-Justification: [One sentence explaining why you assigned this score based on the rubric above]"""
-    },
-
-    "preclinical_design": {
-        "name": "Preclinical Design",
-        "thinking": "Designing target validation strategy (genetic and pharmacological)... Selecting appropriate cell line models based on target expression and disease relevance... Identifying translational biomarkers for target engagement and pathway modulation... Planning in vivo efficacy studies with relevant disease models... Establishing go/no-go criteria with quantitative thresholds... Anticipating safety liabilities based on target biology... Creating critical path with decision points...",
-        "prompt": """You are a preclinical drug discovery scientist with expertise in experimental design and translational research.
+""",
+        rubric=dict(
+            score_key="NOVELTY_SCORE",
+            bands=[
+                ("Highly Novel", "First-in-class target with no competition. Clear white space with strong scientific rationale. Open IP landscape. Potential to define new treatment paradigm."),
+                ("Novel", "Best-in-class opportunity with clear differentiation. Few competitors (<3 clinical programs). Novel mechanism or modality vs existing approaches. Good IP position."),
+                ("Moderately Novel", "Validated target with room for differentiation. Moderate competition (3-5 programs). Some white space in indication or mechanism. Workable IP situation."),
+                ("Limited Novelty", "Fast-follower opportunity. Crowded space (5-10 programs) but differentiation possible. Must out-execute competitors. IP constraints may exist."),
+                ("Low Novelty", "Me-too approach. Highly competitive (>10 programs). Limited differentiation potential. Significant IP barriers. Late entrant disadvantage."),
+                ("No Novelty", "Multiple approved drugs exist. Saturated market. No clear differentiation. Blocked by patents. No strategic rationale for entry."),
+            ],
+            components=["Differentiation potential", "White space availability", "Timing advantage"]
+        )
+    ),
+
+    "preclinical_design": AgentSpec(
+        name="Preclinical Design",
+        depends_on=("literature_evidence", "druggability", "novelty"),
+        thinking="Designing target validation strategy (genetic and pharmacological)... Selecting appropriate cell line models based on target expression and disease relevance... Identifying translational biomarkers for target engagement and pathway modulation... Planning in vivo efficacy studies with relevant disease models... Establishing go/no-go criteria with quantitative thresholds... Anticipating safety liabilities based on target biology... Creating critical path with decision points...",
+        prompt="""You are a preclinical drug discovery scientist with expertise in experimental design and translational research.
 
 TASK: Design a rigorous experimental plan to validate this hypothesis with clear decision criteria.
 
@@ -458,48 +519,32 @@ RESOURCE REQUIREMENTS:
 FEASIBILITY ASSESSMENT:
 [2-3 sentences on overall feasibility and key risks]
 
-=== SCORING RUBRIC ===
-Use this rubric to assign your FEASIBILITY_SCORE:
-
-0.85-1.0 (Highly Feasible): Standard assays and models readily available. Tool compounds exist. Clear biomarkers identified. Straightforward path with <12 months to key decision. Low technical risk.
-
-0.70-0.84 (Feasible): Most assays established, some optimization needed. Relevant models available. Reasonable biomarker strategy. 12-18 month timeline. Moderate technical risk.
-
-0.55-0.69 (Moderately Feasible): Some assays need development. Animal models imperfect but usable. Biomarker strategy needs work. 18-24 month timeline. Notable technical hurdles.
-
-0.40-0.54 (Challenging): Significant assay development required. Limited model options. Biomarker gaps. >24 month timeline. High technical risk. Requires specialized expertise.
-
-0.25-0.39 (Difficult): Major technical barriers. No good disease models. No validated biomarkers. Unclear timeline. Very high risk. May require technology breakthrough.
-
-0.0-0.24 (Not Feasible): No path to validation with current technology. Models don't exist. Cannot measure relevant endpoints. Prohibitive resource requirements.
-
-FEASIBILITY_SCORE: [0.0-1.0]
-- Technical feasibility: [0-1]
-- Resource availability: [0-1]
-- Timeline realism: [0-1]
-- Overall: [average of above three]
-
-Justification: [One sentence explaining why you assigned this score based on the rubric above]"""
-    },
-
-    "controller": {
-        "name": "Controller",
-        "thinking": "Aggregating scores across all dimensions... Identifying weakest link in the hypothesis chain... Evaluating whether deficiencies are addressable through iteration... Weighing evidence strength against druggability and novelty... Determining if hypothesis merits resource investment... Making portfolio-level go/no-go recommendation...",
-        "prompt": """You are a drug discovery portfolio manager responsible for resource allocation decisions.
+""",
+        rubric=dict(
+            score_key="FEASIBILITY_SCORE",
+            bands=[
+                ("Highly Feasible", "Standard assays and models readily available. Tool compounds exist. Clear biomarkers identified. Straightforward path with <12 months to key decision. Low technical risk."),
+                ("Feasible", "Most assays established, some optimization needed. Relevant models available. Reasonable biomarker strategy. 12-18 month timeline. Moderate technical risk."),
+                ("Moderately Feasible", "Some assays need development. Animal models imperfect but usable. Biomarker strategy needs work. 18-24 month timeline. Notable technical hurdles."),
+                ("Challenging", "Significant assay development required. Limited model options. Biomarker gaps. >24 month timeline. High technical risk. Requires specialized expertise."),
+                ("Difficult", "Major technical barriers. No good disease models. No validated biomarkers. Unclear timeline. Very high risk. May require technology breakthrough."),
+                ("Not Feasible", "No path to validation with current technology. Models don't exist. Cannot measure relevant endpoints. Prohibitive resource requirements."),
+            ],
+            components=["Technical feasibility", "Resource availability", "Timeline realism"]
+        )
+    ),
+
+    "controller": AgentSpec(
+        name="Controller",
+        depends_on=("literature_evidence", "druggability", "novelty", "preclinical_design"),
+        # Classifies four pre-computed scores into GO/NO_GO/LOOP
+        model_tier="fast",
+        thinking="Aggregating scores across all dimensions... Identifying weakest link in the hypothesis chain... Evaluating whether deficiencies are addressable through iteration... Weighing evidence strength against druggability and novelty... Determining if hypothesis merits resource investment... Making portfolio-level go/no-go recommendation...",
+        prompt="""You are a drug discovery portfolio manager responsible for resource allocation decisions.
 
 TASK: Evaluate all evidence and make a go/no-go decision or request refinement.
 
-SCORES FROM EVALUATION:
-- Evidence Confidence: {evidence_score}
-- Druggability Score: {druggability_score}
-- Novelty Score: {novelty_score}
-- Feasibility Score: {feasibility_score}
-
-Loops used: {loops_used} of {max_loops}
-Remaining loops: {remaining_loops}
-
-DECISION FRAMEWORK:
-{loop_rules}
+The scores from evaluation, your loop budget, and the decision framework for this run are given in the user message.
 
 SCORE INTERPRETATION:
 - 0.70+: Strong - no concerns
@@ -512,10 +557,10 @@ OUTPUT FORMAT:
 PORTFOLIO ANALYSIS:
 
 Score Summary:
-- Evidence: {evidence_score} [Strong >=0.70, Adequate >=0.55, Weak >=0.40, Critical <0.40]
-- Druggability: {druggability_score} [Strong >=0.70, Adequate >=0.55, Weak >=0.40, Critical <0.40]
-- Novelty: {novelty_score} [Strong >=0.70, Adequate >=0.55, Weak >=0.40, Critical <0.40]
-- Feasibility: {feasibility_score} [Strong >=0.70, Adequate >=0.55, Weak >=0.40, Critical <0.40]
+- Evidence: [score] [Strong >=0.70, Adequate >=0.55, Weak >=0.40, Critical <0.40]
+- Druggability: [score] [Strong >=0.70, Adequate >=0.55, Weak >=0.40, Critical <0.40]
+- Novelty: [score] [Strong >=0.70, Adequate >=0.55, Weak >=0.40, Critical <0.40]
+- Feasibility: [score] [Strong >=0.70, Adequate >=0.55, Weak >=0.40, Critical <0.40]
 
 Composite Score: [Average of all four scores]
 
@@ -535,8 +580,21 @@ REASONING:
 NEXT STEPS:
 [If GO: Key milestones and success criteria]
 [If NO_GO: What would need to change to reconsider]
-[If LOOP: Specific guidance for the target agent on what to improve]"""
-    }
+[If LOOP: Specific guidance for the target agent on what to improve]""",
+        # Per-run values go in the user message so the system prompt stays
+        # byte-identical across calls and is served from the provider's prompt cache
+        prompt_suffix="""SCORES FROM EVALUATION:
+- Evidence Confidence: {evidence_score}
+- Druggability Score: {druggability_score}
+- Novelty Score: {novelty_score}
+- Feasibility Score: {feasibility_score}
+
+Loops used: {loops_used} of {max_loops}
+Remaining loops: {remaining_loops}
+
+DECISION FRAMEWORK:
+{loop_rules}"""
+    )
 }
 
 DRUG_DISCOVERY_SEQUENCE = [
@@ -549,32 +607,287 @@ DRUG_DISCOVERY_SEQUENCE = [
 ]
 
 
+def schedule_waves(sequence: list[str]) -> tuple[tuple[str, ...], ...]:
+    """
+    Group agents into waves that can run concurrently.
+
+    Each agent goes in the first wave after all of its depends_on agents;
+    agents within a wave keep their order from sequence.
+
+    Args:
+        sequence: Agent ids in display order; dependencies must come first
+
+    Returns:
+        Waves in execution order, each a tuple of agent ids
+    """
+    wave_of = {}
+    for agent_id in sequence:
+        deps = DRUG_DISCOVERY_AGENTS[agent_id].depends_on
+        wave_of[agent_id] = max((wave_of[dep] + 1 for dep in deps), default=0)
+    
+    waves = [[] for _ in range(max(wave_of.values(), default=-1) + 1)]
+    for agent_id in sequence:
+        waves[wave_of[agent_id]].append(agent_id)
+    return tuple(tuple(wave) for wave in waves)
+
+
+# The dependency graph from AgentSpec.depends_on, flattened into parallel
+# groups: (target_hypothesis,), (literature_evidence, druggability, novelty),
+# (preclinical_design,), (controller,)
+DRUG_DISCOVERY_DAG = schedule_waves(DRUG_DISCOVERY_SEQUENCE)
+
+# Group index of each agent, for LOOP targets and early exit
+DRUG_DISCOVERY_WAVE_OF = {
+    agent_id: wave_idx
+    for wave_idx, wave in enumerate(DRUG_DISCOVERY_DAG)
+    for agent_id in wave
+}
+
+
+@lru_cache(maxsize=None)
+def get_agent_prompt(agent_id: str) -> str:
+    """
+    Assemble an agent's system prompt on first use.
+
+    Scoring agents store their rubric as scoring_rubric() arguments, so
+    only the agents a request actually runs pay for rendering. The result
+    is interned: every call shares one string object, keeping the prompt
+    byte-identical (and cheap to hash) across requests.
+
+    Args:
+        agent_id: Key into DRUG_DISCOVERY_AGENTS
+
+    Returns:
+        Full system prompt
+    """
+    spec = DRUG_DISCOVERY_AGENTS[agent_id]
+    prompt = spec.prompt
+    if spec.rubric is not None:
+        prompt += scoring_rubric(**spec.rubric)
+    return sys.intern(prompt)
+
+
+@lru_cache(maxsize=None)
+def get_output_skeleton(agent_id: str) -> str:
+    """
+    The OUTPUT FORMAT section of an agent's prompt, used as a predicted output.
+
+    Responses reproduce its section headers and field labels verbatim, so
+    those spans are accepted from the prediction instead of being decoded
+    token by token.
+
+    Args:
+        agent_id: Key into DRUG_DISCOVERY_AGENTS
+
+    Returns:
+        Skeleton text, or "" if the prompt has no OUTPUT FORMAT section
+    """
+    _, found, skeleton = DRUG_DISCOVERY_AGENTS[agent_id].prompt.partition("OUTPUT FORMAT:")
+    return skeleton.strip() if found else ""
+
+
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+
+def compile_template(template: str) -> tuple[list[str], list[str]]:
+    """
+    Split a {name}-placeholder template into literal chunks and field names.
+
+    Args:
+        template: Template text; placeholders are bare {name} with no format spec
+
+    Returns:
+        (chunks, fields) with len(chunks) == len(fields) + 1
+    """
+    parts = _PLACEHOLDER_RE.split(template)
+    return parts[0::2], parts[1::2]
+
+
+# {loop_rules} for the controller's last allowed decision
+CONTROLLER_FINAL_RULES = "You have NO remaining loops. You MUST choose GO or NO_GO only."
+
+# {loop_rules} while loops remain, after "You have N loop(s) remaining."
+CONTROLLER_LOOP_RULES = """
+
+Decision Guidelines:
+- All scores >= 0.55: Consider GO (adequate across all dimensions)
+- Any score < 0.40: Critical weakness - LOOP to improve or NO_GO if unfixable
+- Scores 0.40-0.54: Weak but potentially acceptable - use judgment
+
+LOOP targets:
+- Low evidence -> LOOP to literature_evidence (re-evaluate with different framing)
+- Low druggability or novelty -> LOOP to target_hypothesis (consider different target/mechanism)
+- Low feasibility -> LOOP to preclinical_design (simplify experimental plan)
+
+Choose NO_GO only if the hypothesis is fundamentally flawed and cannot be salvaged."""
+
+# Parsed once; render_controller_context() only joins strings per call
+_CONTROLLER_CHUNKS, _CONTROLLER_FIELDS = compile_template(
+    DRUG_DISCOVERY_AGENTS["controller"].prompt_suffix
+)
+
+
+def render_controller_context(values: Dict[str, Any]) -> str:
+    """Fill the controller's prompt_suffix with per-run scores and loop rules."""
+    chunks = _CONTROLLER_CHUNKS
+    out = [chunks[0]]
+    for field, chunk in zip(_CONTROLLER_FIELDS, chunks[1:]):
+        out.append(str(values[field]))
+        out.append(chunk)
+    return "".join(out)
+
+
 # =============================================================================
 # Helper Functions
 # =============================================================================
 
+_OVERALL_RE = re.compile(r'Overall[:\s]+([0-1]\.\d+)', re.IGNORECASE)
+_DECIMAL_RE = re.compile(r'(\d+\.\d+)')
+# DECISION and the LOOP_TARGET line after it, in one pass over upper-cased text
+_CONTROLLER_RE = re.compile(r'DECISION:\s*(GO|NO_GO|NO-GO|LOOP)(?:.*?LOOP_TARGET:\s*(\w+))?', re.DOTALL)
+# First alias contained in the LOOP_TARGET value wins; low druggability or
+# novelty means re-thinking the target
+_LOOP_TARGET_ALIASES = (
+    ("hypothesis", "target_hypothesis"),
+    ("target", "target_hypothesis"),
+    ("evidence", "literature_evidence"),
+    ("literature", "literature_evidence"),
+    ("preclinical", "preclinical_design"),
+    ("design", "preclinical_design"),
+    ("feasibility", "preclinical_design"),
+    ("druggability", "target_hypothesis"),
+    ("novelty", "target_hypothesis"),
+)
+
+
+def _resolve_loop_target(target: str) -> str:
+    """Map a lowercased LOOP_TARGET value to the agent to re-run."""
+    return next(
+        (agent_id for alias, agent_id in _LOOP_TARGET_ALIASES if alias in target),
+        "target_hypothesis"
+    )
+
+
+# The values the prompt asks for (agent ids, "none") and bare aliases resolve
+# by one dict lookup; anything else falls back to the substring scan
+_LOOP_TARGET_MAP = {
+    word: _resolve_loop_target(word)
+    for word in (
+        *(alias for alias, _ in _LOOP_TARGET_ALIASES),
+        *{agent_id for _, agent_id in _LOOP_TARGET_ALIASES},
+        "none",
+    )
+}
+
+
+@lru_cache(maxsize=None)
+def _score_line_re(key: str) -> re.Pattern:
+    """Compiled pattern for the JSON score line of one score key."""
+    return re.compile(rf'{re.escape(key)}:\s*(\{{.*\}})')
+
+
+@lru_cache(maxsize=None)
+def _score_key_scanner(key: str) -> tuple[tuple[str, ...], str, re.Pattern]:
+    """
+    One pattern matching every spelling of a score key, for a single pass.
+
+    Spelling i (in priority order) is captured as group k<i>, and an
+    immediately following "0.xx" value as group v<i>. Also returns the
+    lowercased spellings and their shared stem.
+    """
+    search_keys = list(dict.fromkeys(
+        (key, key.replace("_", " "), key.replace("_SCORE", ""), key.replace("_CONFIDENCE", ""))
+    ))
+    # Factor out the shared stem ("NOVELTY"): sre has no multi-literal
+    # search, so a bare alternation would be slower than separate passes.
+    # Longest suffix first, so a shorter spelling never shadows a longer one
+    stem = os.path.commonprefix(search_keys)
+    alternatives = sorted(range(len(search_keys)), key=lambda i: -len(search_keys[i]))
+    pattern = re.escape(stem) + "(?:" + "|".join(
+        rf'(?P<k{i}>{re.escape(search_keys[i][len(stem):])})(?:[:\s]+(?P<v{i}>[0-1]\.?\d*))?'
+        for i in alternatives
+    ) + ")"
+    return tuple(k.lower() for k in search_keys), stem.lower(), re.compile(pattern, re.IGNORECASE)
+
+
+def parse_score_line(text: str, key: str) -> Optional[float]:
+    """Read the compact JSON score line requested by scoring_rubric(), or None if absent/malformed."""
+    json_match = _score_line_re(key).search(text)
+    if not json_match:
+        return None
+    try:
+        val = float(orjson.loads(json_match.group(1))["score"])
+    except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
+    return min(1.0, max(0.0, val))
+
+
+async def extract_score(model, key: str, text: str) -> Optional[float]:
+    """
+    Recover a score with a schema-constrained call when the score line is missing.
+
+    Args:
+        model: Chat model to run the extraction on (the fast tier)
+        key: Score label, e.g. "NOVELTY_SCORE"
+        text: The agent's full response
+
+    Returns:
+        Score clamped to 0-1, or None if the call fails
+    """
+    messages = [
+        SystemMessage(content=f"Extract the final {key} (0.0-1.0), its rubric band, and a one-sentence justification from this assessment."),
+        # The score discussion sits at the end of the response
+        HumanMessage(content=text[-SCORE_EXTRACTION_CHARS:])
+    ]
+    try:
+        structured = model.with_structured_output(AgentScore, method="json_schema", strict=True)
+        result = await structured.ainvoke(messages)
+    except Exception:
+        return None
+    return min(1.0, max(0.0, result.score))
+
+
 def parse_score(text: str, key: str) -> float:
     """Extract a score from text with improved parsing."""
-    search_keys = [key, key.replace("_", " "), key.replace("_SCORE", ""), key.replace("_CONFIDENCE", "")]
+    val = parse_score_line(text, key)
+    if val is not None:
+        return val
+    
+    # One scan records, per spelling, its first position and first value
+    search_keys, stem, scanner = _score_key_scanner(key)
+    n_keys = len(search_keys)
+    first_pos: Dict[int, int] = {}
+    first_value: Dict[int, str] = {}
+    # Every spelling starts with the stem, and a substring test is far
+    # cheaper than a case-insensitive regex scan that would find nothing
+    matches = scanner.finditer(text) if stem in text.lower() else ()
+    for match in matches:
+        i = int(match.lastgroup[1:])  # k<i>, or v<i> when a value followed
+        # A shorter spelling also occurs wherever a key it prefixes does
+        matched_key = text[match.start():match.end(f"k{i}")].lower()
+        for j in range(n_keys):
+            if j not in first_pos and matched_key.startswith(search_keys[j]):
+                first_pos[j] = match.start()
+        if match.group(f"v{i}") is not None:
+            first_value.setdefault(i, match.group(f"v{i}"))
+            if i == 0:
+                break  # Highest-priority value found; nothing later can win
     
     # Try exact pattern match first
-    for search_key in search_keys:
-        pattern = rf'{re.escape(search_key)}[:\s]+([0-1]\.?\d*)'
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
+    for i in range(n_keys):
+        if i in first_value:
             try:
-                val = float(match.group(1))
+                val = float(first_value[i])
                 return min(1.0, max(0.0, val))
             except ValueError:
                 continue
     
     # Try finding "Overall: X.XX" pattern near the key
-    for search_key in search_keys:
-        pos = text.lower().find(search_key.lower())
-        if pos != -1:
+    for i in range(n_keys):
+        if i in first_pos:
             # Look for "Overall:" within 200 chars after the key
-            snippet = text[pos:pos+200]
-            overall_match = re.search(r'Overall[:\s]+([0-1]\.\d+)', snippet, re.IGNORECASE)
+            snippet = text[first_pos[i]:first_pos[i]+200]
+            overall_match = _OVERALL_RE.search(snippet)
             if overall_match:
                 try:
                     val = float(overall_match.group(1))
@@ -583,12 +896,10 @@ def parse_score(text: str, key: str) -> float:
                     pass
     
     # Fallback: find any decimal near the key
-    text_lower = text.lower()
-    for search_key in search_keys:
-        pos = text_lower.find(search_key.lower())
-        if pos != -1:
-            snippet = text[pos:pos+50]
-            decimals = re.findall(r'(\d+\.\d+)', snippet)
+    for i in range(n_keys):
+        if i in first_pos:
+            snippet = text[first_pos[i]:first_pos[i]+50]
+            decimals = _DECIMAL_RE.findall(snippet)
             if decimals:
                 val = float(decimals[0])
                 if val <= 1.0:
@@ -599,36 +910,23 @@ def parse_score(text: str, key: str) -> float:
 
 def parse_controller_decision(text: str) -> tuple:
     """Parse controller output."""
-    text_upper = text.upper()
+    # A case-sensitive search on an upper() copy is faster than re.IGNORECASE
+    match = _CONTROLLER_RE.search(text.upper())
+    if not match:
+        return "GO", None
     
-    decision = "GO"
-    decision_match = re.search(r'DECISION:\s*(GO|NO_GO|NO-GO|LOOP)', text_upper)
-    if decision_match:
-        d = decision_match.group(1)
-        if d == "LOOP":
-            decision = "LOOP"
-        elif "NO" in d:
-            decision = "NO_GO"
-        else:
-            decision = "GO"
+    d = match.group(1)
+    if d == "LOOP":
+        decision = "LOOP"
+    elif "NO" in d:
+        decision = "NO_GO"
+    else:
+        decision = "GO"
     
     loop_target = None
     if decision == "LOOP":
-        target_match = re.search(r'LOOP_TARGET:\s*(\w+)', text, re.IGNORECASE)
-        if target_match:
-            target = target_match.group(1).lower()
-            if "hypothesis" in target or "target" in target:
-                loop_target = "target_hypothesis"
-            elif "evidence" in target or "literature" in target:
-                loop_target = "literature_evidence"
-            elif "preclinical" in target or "design" in target or "feasibility" in target:
-                loop_target = "preclinical_design"
-            elif "druggability" in target:
-                loop_target = "target_hypothesis"  # Re-think target if druggability is the issue
-            elif "novelty" in target:
-                loop_target = "target_hypothesis"  # Re-think target if novelty is the issue
-        if not loop_target:
-            loop_target = "target_hypothesis"
+        target = (match.group(2) or "").lower()
+        loop_target = _LOOP_TARGET_MAP.get(target) or _resolve_loop_target(target)
     
     return decision, loop_target
 
@@ -645,24 +943,20 @@ def build_drug_discovery_input(agent_id: str, state: Dict[str, Any]) -> str:
         return f"Evaluate this drug discovery hypothesis:\n\n{state['hypothesis']}"
     
     elif agent_id == "druggability":
-        return f"HYPOTHESIS:\n{state['hypothesis']}\n\nEVIDENCE CONTEXT:\n{state['evidence'][:2000]}"
+        return f"Assess the druggability of this hypothesis:\n\nHYPOTHESIS:\n{state['hypothesis']}"
     
     elif agent_id == "novelty":
-        ev_score = state['evidence_score'] if state['evidence_score'] is not None else 0.5
-        dr_score = state['druggability_score'] if state['druggability_score'] is not None else 0.5
-        return f"HYPOTHESIS:\n{state['hypothesis']}\n\nCONTEXT:\n- Evidence confidence: {ev_score:.2f}\n- Druggability score: {dr_score:.2f}"
+        return f"Assess the novelty of this hypothesis:\n\nHYPOTHESIS:\n{state['hypothesis']}"
     
     elif agent_id == "preclinical_design":
-        ev_score = state['evidence_score'] if state['evidence_score'] is not None else 0.5
-        dr_score = state['druggability_score'] if state['druggability_score'] is not None else 0.5
-        nv_score = state['novelty_score'] if state['novelty_score'] is not None else 0.5
+        scores = scores_or_default(state)
         inp = f"""HYPOTHESIS:
 {state['hypothesis']}
 
 CONTEXT:
-- Evidence confidence: {ev_score:.2f}
-- Druggability score: {dr_score:.2f}
-- Novelty score: {nv_score:.2f}
+- Evidence confidence: {scores['evidence']:.2f}
+- Druggability score: {scores['druggability']:.2f}
+- Novelty score: {scores['novelty']:.2f}
 
 DRUGGABILITY ASSESSMENT:
 {state['druggability'][:1500]}"""
@@ -676,171 +970,366 @@ DRUGGABILITY ASSESSMENT:
     return state["question"]
 
 
-def update_drug_discovery_state(agent_id: str, output: str, state: Dict[str, Any]):
-    """Update state after drug discovery agent runs."""
+# (score name, state field) in display order
+SCORE_FIELDS = (
+    ("evidence", "evidence_score"),
+    ("druggability", "druggability_score"),
+    ("novelty", "novelty_score"),
+    ("feasibility", "feasibility_score"),
+)
+
+# (text, score) state fields written by each scoring agent
+AGENT_STATE_FIELDS = {
+    "literature_evidence": ("evidence", "evidence_score"),
+    "druggability": ("druggability", "druggability_score"),
+    "novelty": ("novelty", "novelty_score"),
+    "preclinical_design": ("preclinical", "feasibility_score"),
+}
+
+
+def format_score(score: Optional[float]) -> str:
+    """Render a score for the controller; None means the agent was skipped."""
+    return f"{score:.2f}" if score is not None else "N/A (not assessed)"
+
+
+def update_drug_discovery_state(
+    agent_id: str,
+    output: str,
+    state: Dict[str, Any],
+    score: Optional[float] = None
+):
+    """Update state after drug discovery agent runs; score overrides parsing the output."""
     if agent_id == "target_hypothesis":
         state["hypothesis"] = output
     elif agent_id == "literature_evidence":
         state["evidence"] = output
-        state["evidence_score"] = parse_score(output, "EVIDENCE_CONFIDENCE")
+        state["evidence_score"] = score if score is not None else parse_score(output, "EVIDENCE_CONFIDENCE")
     elif agent_id == "druggability":
         state["druggability"] = output
-        state["druggability_score"] = parse_score(output, "DRUGGABILITY_SCORE")
+        state["druggability_score"] = score if score is not None else parse_score(output, "DRUGGABILITY_SCORE")
     elif agent_id == "novelty":
         state["novelty"] = output
-        state["novelty_score"] = parse_score(output, "NOVELTY_SCORE")
+        state["novelty_score"] = score if score is not None else parse_score(output, "NOVELTY_SCORE")
     elif agent_id == "preclinical_design":
         state["preclinical"] = output
-        state["feasibility_score"] = parse_score(output, "FEASIBILITY_SCORE")
+        state["feasibility_score"] = score if score is not None else parse_score(output, "FEASIBILITY_SCORE")
 
 
 def get_drug_discovery_scores(state: Dict[str, Any]) -> Dict[str, float]:
     """Return only scores that have been computed."""
-    scores = {}
-    if state["evidence_score"] is not None:
-        scores["evidence"] = state["evidence_score"]
-    if state["druggability_score"] is not None:
-        scores["druggability"] = state["druggability_score"]
-    if state["novelty_score"] is not None:
-        scores["novelty"] = state["novelty_score"]
-    if state["feasibility_score"] is not None:
-        scores["feasibility"] = state["feasibility_score"]
-    return scores
+    return {name: state[field] for name, field in SCORE_FIELDS if state[field] is not None}
+
+
+def scores_or_default(state: Dict[str, Any], default: float = 0.5) -> Dict[str, float]:
+    """Return every score, with default standing in for any not yet computed."""
+    return {
+        name: state[field] if state[field] is not None else default
+        for name, field in SCORE_FIELDS
+    }
+
+
+# =============================================================================
+# Response Caching
+# =============================================================================
+
+# Popular targets (EGFR, KRAS G12C, ...) recur across users, so agent
+# responses are reused for near-identical inputs when SEMANTIC_CACHE_ENABLED.
+# One cache per agent keeps responses from crossing agents. Evaluation agents
+# see only the hypothesis and tolerate a looser match; the controller is never
+# cached because its decision hinges on the exact scores.
+RESPONSE_CACHE_THRESHOLDS = {
+    "target_hypothesis": SEMANTIC_CACHE_THRESHOLD,
+    "literature_evidence": 0.92,
+    "druggability": 0.92,
+    "novelty": 0.92,
+    "preclinical_design": SEMANTIC_CACHE_THRESHOLD,
+}
+RESPONSE_CACHE_TTL = 24 * 3600
+
+_RESPONSE_CACHES = {
+    agent_id: SemanticCache(threshold=threshold, ttl=RESPONSE_CACHE_TTL)
+    for agent_id, threshold in RESPONSE_CACHE_THRESHOLDS.items()
+}
+
+# Exact replay of identical calls (retries, repeated questions, eval re-runs),
+# checked before the semantic caches and covering every agent
+_EXACT_RESPONSE_CACHE = LRUCache(maxsize=4096)
+
+
+# =============================================================================
+# Provider Prompt Cache Warming
+# =============================================================================
+
+async def warm_prompt_caches(llm, fast_llm=None) -> None:
+    """
+    Send each agent's system prompt with a one-token completion so the
+    provider's prefix cache holds it before the next real run.
+
+    Failures are ignored: a cold cache only costs latency.
+    """
+    models = {"primary": llm, "fast": fast_llm or llm}
+
+    async def warm(agent_id: str):
+        model = models[DRUG_DISCOVERY_AGENTS[agent_id].model_tier].bind(max_tokens=1)
+        messages = [SystemMessage(content=get_agent_prompt(agent_id)), HumanMessage(content="ping")]
+        try:
+            await model.ainvoke(messages)
+        except Exception:
+            pass
+
+    await asyncio.gather(*(warm(agent_id) for agent_id in DRUG_DISCOVERY_AGENTS))
+
+
+async def keep_prompt_caches_warm(llm, fast_llm=None, interval: float = 240) -> None:
+    """Warm the prompt caches now and every interval seconds until cancelled."""
+    while True:
+        await warm_prompt_caches(llm, fast_llm)
+        await asyncio.sleep(interval)
 
 
 # =============================================================================
 # Pipeline Runner
 # =============================================================================
 
+# Thinking narration is static, so its SSE frames are encoded once
+_THINKING_FRAMES = {
+    agent_id: sse.agent_event(agent_id, 'thinking', spec.thinking)
+    for agent_id, spec in DRUG_DISCOVERY_AGENTS.items()
+}
+
+# Every value is immutable, so a shallow copy gives each run its own state
+_INITIAL_STATE: Dict[str, Any] = {
+    "question": "",
+    "hypothesis": "",
+    "evidence": "",
+    "evidence_score": None,
+    "druggability": "",
+    "druggability_score": None,
+    "novelty": "",
+    "novelty_score": None,
+    "preclinical": "",
+    "feasibility_score": None,
+    "loops_used": 0,
+    "feedback": "",
+}
+
+
+async def merge_streams(streams: list[AsyncGenerator[bytes, None]]) -> AsyncGenerator[bytes, None]:
+    """Interleave several event streams, yielding each event as soon as it is produced."""
+    if len(streams) == 1:
+        async for item in streams[0]:
+            yield item
+        return
+    
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    
+    async def pump(stream: AsyncGenerator[bytes, None]):
+        try:
+            async for item in stream:
+                await queue.put(item)
+        finally:
+            await queue.put(finished)
+    
+    tasks = [asyncio.create_task(pump(stream)) for stream in streams]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is finished:
+                remaining -= 1
+            else:
+                yield item
+        await asyncio.gather(*tasks)  # Re-raise the first agent failure
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
 async def run_drug_discovery_pipeline(
     question: str,
     llm,
-    max_loops: int = 3
-) -> AsyncGenerator[str, None]:
-    """Run the 6-agent drug discovery pipeline with dynamic routing."""
+    max_loops: int = 3,
+    fast_llm=None
+) -> AsyncGenerator[bytes, None]:
+    """
+    Run the 6-agent drug discovery pipeline with dynamic routing.
     
-    state: Dict[str, Any] = {
-        "question": question,
-        "hypothesis": "",
-        "evidence": "",
-        "evidence_score": None,
-        "druggability": "",
-        "druggability_score": None,
-        "novelty": "",
-        "novelty_score": None,
-        "preclinical": "",
-        "feasibility_score": None,
-        "loops_used": 0,
-        "feedback": "",
-    }
+    Agents run in DRUG_DISCOVERY_DAG order, one group at a time: the three evaluation agents only
+    read the hypothesis, so they stream concurrently and their events
+    interleave (the frontend tracks output per agent). Agents with
+    model_tier "fast" use fast_llm when given, otherwise llm.
+    """
+    models = {"primary": llm, "fast": fast_llm or llm}
     
-    agent_idx = 0
+    state = _INITIAL_STATE.copy()
+    state["question"] = question
+    outputs: Dict[str, str] = {}
+    
+    wave_idx = 0
     iteration_num = 1
     
-    yield f"data: {json.dumps({'type': 'iteration_start', 'iteration': iteration_num})}\n\n"
+    yield sse.event({'type': 'iteration_start', 'iteration': iteration_num})
     
-    async def stream_llm(system: str, user: str) -> AsyncGenerator[str, None]:
-        """Stream LLM response."""
+    async def stream_llm(model, system: str, user: str, prediction: str = "") -> AsyncGenerator[str, None]:
+        """Stream LLM response, optionally with a predicted output."""
         messages = [SystemMessage(content=system), HumanMessage(content=user)]
-        async for chunk in llm.astream(messages):
+        if prediction:
+            model = model.bind(prediction={"type": "content", "content": prediction})
+        async for chunk in model.astream(messages):
             if chunk.content:
                 yield chunk.content
     
-    while agent_idx < len(DRUG_DISCOVERY_SEQUENCE):
-        agent_id = DRUG_DISCOVERY_SEQUENCE[agent_idx]
-        config = DRUG_DISCOVERY_AGENTS[agent_id]
+    async def run_agent(agent_id: str) -> AsyncGenerator[bytes, None]:
+        """Run one agent, yielding its thinking, output and complete events."""
+        spec = DRUG_DISCOVERY_AGENTS[agent_id]
         
         # Thinking phase
-        yield f"data: {json.dumps({'agent': agent_id, 'phase': 'thinking', 'content': config['thinking']})}\n\n"
-        await asyncio.sleep(0.8)
+        yield _THINKING_FRAMES[agent_id]
+        await sse.pace(0.8)
         
         # Build prompts
         user_input = build_drug_discovery_input(agent_id, state)
-        system_prompt = config["prompt"]
+        system_prompt = get_agent_prompt(agent_id)
         
         if agent_id == "controller":
             remaining = max_loops - state["loops_used"]
             
-            ev_score = state["evidence_score"] if state["evidence_score"] is not None else 0.5
-            dr_score = state["druggability_score"] if state["druggability_score"] is not None else 0.5
-            nv_score = state["novelty_score"] if state["novelty_score"] is not None else 0.5
-            fe_score = state["feasibility_score"] if state["feasibility_score"] is not None else 0.5
-            
             if remaining <= 0:
-                loop_rules = "You have NO remaining loops. You MUST choose GO or NO_GO only."
+                loop_rules = CONTROLLER_FINAL_RULES
             else:
-                loop_rules = f"""You have {remaining} loop(s) remaining.
-
-Decision Guidelines:
-- All scores >= 0.55: Consider GO (adequate across all dimensions)
-- Any score < 0.40: Critical weakness - LOOP to improve or NO_GO if unfixable
-- Scores 0.40-0.54: Weak but potentially acceptable - use judgment
-
-LOOP targets:
-- Low evidence -> LOOP to literature_evidence (re-evaluate with different framing)
-- Low druggability or novelty -> LOOP to target_hypothesis (consider different target/mechanism)
-- Low feasibility -> LOOP to preclinical_design (simplify experimental plan)
-
-Choose NO_GO only if the hypothesis is fundamentally flawed and cannot be salvaged."""
+                loop_rules = f"You have {remaining} loop(s) remaining.{CONTROLLER_LOOP_RULES}"
             
-            system_prompt = system_prompt.format(
-                evidence_score=f"{ev_score:.2f}",
-                druggability_score=f"{dr_score:.2f}",
-                novelty_score=f"{nv_score:.2f}",
-                feasibility_score=f"{fe_score:.2f}",
-                loops_used=state["loops_used"],
-                max_loops=max_loops,
-                remaining_loops=remaining,
-                loop_rules=loop_rules
+            run_context = render_controller_context({
+                "evidence_score": format_score(state["evidence_score"]),
+                "druggability_score": format_score(state["druggability_score"]),
+                "novelty_score": format_score(state["novelty_score"]),
+                "feasibility_score": format_score(state["feasibility_score"]),
+                "loops_used": state["loops_used"],
+                "max_loops": max_loops,
+                "remaining_loops": remaining,
+                "loop_rules": loop_rules
+            })
+            user_input = f"{run_context}\n\n{user_input}"
+        
+        model = models[spec.model_tier]
+        
+        # loops_used is part of the key: a re-run after LOOP must not replay
+        # the answer the controller just rejected
+        exact_key = None
+        cached_output = None
+        if DRUG_DISCOVERY_CACHE_ENABLED:
+            exact_key = make_key(
+                agent_id, getattr(model, "model_name", None),
+                system_prompt, user_input, state["loops_used"]
             )
+            cached_output = _EXACT_RESPONSE_CACHE.get(exact_key)
         
-        # Stream output
-        full_output = ""
-        async for token in stream_llm(system_prompt, user_input):
-            full_output += token
-            yield f"data: {json.dumps({'agent': agent_id, 'phase': 'output', 'content': token})}\n\n"
+        # Refinement loops exist to get a different answer, so only the
+        # first pass may be served from (or populate) the response cache
+        response_cache = None
+        if SEMANTIC_CACHE_ENABLED and state["loops_used"] == 0:
+            response_cache = _RESPONSE_CACHES.get(agent_id)
+        
+        input_vector = None
+        if cached_output is None and response_cache is not None:
+            try:
+                input_vector = await response_cache.embed(user_input)
+            except Exception:
+                input_vector = None  # Embedding outage - fall through to the LLM
+            if input_vector is not None:
+                cached_output = response_cache.lookup(input_vector)
+        
+        if cached_output is not None:
+            full_output = cached_output
+            yield sse.agent_event(agent_id, 'output', full_output)
+        else:
+            # Stream output
+            chunks = []
+            prediction = get_output_skeleton(agent_id) if PREDICTED_OUTPUTS_ENABLED else ""
+            async for chunk in sse.coalesce(stream_llm(model, system_prompt, user_input, prediction)):
+                chunks.append(chunk)
+                yield sse.agent_event(agent_id, 'output', chunk)
+            full_output = "".join(chunks)
+            if exact_key is not None:
+                _EXACT_RESPONSE_CACHE.set(exact_key, full_output)
+            if input_vector is not None:
+                response_cache.insert(input_vector, full_output)
+        
+        # A missing score line would otherwise fall through to regex
+        # heuristics (or the 0.55 default) and can trigger a needless LOOP
+        score = None
+        if spec.rubric is not None:
+            score_key = spec.rubric["score_key"]
+            score = parse_score_line(full_output, score_key)
+            if score is None:
+                score = await extract_score(models["fast"], score_key, full_output)
         
         # Update state
-        update_drug_discovery_state(agent_id, full_output, state)
+        update_drug_discovery_state(agent_id, full_output, state, score)
+        outputs[agent_id] = full_output
         scores = get_drug_discovery_scores(state)
         
         # Complete phase
-        yield f"data: {json.dumps({'agent': agent_id, 'phase': 'complete', 'full_output': full_output, 'scores': scores})}\n\n"
-        await asyncio.sleep(0.2)
+        yield sse.event({'agent': agent_id, 'phase': 'complete', 'full_output': full_output, 'scores': scores})
+        await sse.pace(0.2)
+    
+    while wave_idx < len(DRUG_DISCOVERY_DAG):
+        wave = DRUG_DISCOVERY_DAG[wave_idx]
+        
+        async for chunk in merge_streams([run_agent(agent_id) for agent_id in wave]):
+            yield chunk
+        
+        # Insufficient evidence is a certain NO_GO or LOOP - skip straight to
+        # the controller instead of designing experiments for it
+        if (
+            "literature_evidence" in wave
+            and state["evidence_score"] is not None
+            and state["evidence_score"] < EARLY_EXIT_THRESHOLD
+        ):
+            controller_wave = DRUG_DISCOVERY_WAVE_OF["controller"]
+            for skipped_wave in DRUG_DISCOVERY_DAG[wave_idx + 1:controller_wave]:
+                for agent_id in skipped_wave:
+                    text_field, score_field = AGENT_STATE_FIELDS[agent_id]
+                    state[text_field] = ""
+                    state[score_field] = None  # Drop any score from an earlier iteration
+                    yield sse.event({
+                        'agent': agent_id, 'phase': 'complete',
+                        'full_output': f"Skipped: evidence confidence {state['evidence_score']:.2f} is below {EARLY_EXIT_THRESHOLD:.2f}.",
+                        'scores': get_drug_discovery_scores(state)
+                    })
+            wave_idx = controller_wave
+            continue
         
         # Controller routing
-        if agent_id == "controller":
-            decision, loop_target = parse_controller_decision(full_output)
+        if "controller" in wave:
+            scores = get_drug_discovery_scores(state)
+            decision, loop_target = parse_controller_decision(outputs["controller"])
             remaining = max_loops - state["loops_used"]
             
             if decision == "LOOP" and loop_target and remaining > 0:
                 state["loops_used"] += 1
                 iteration_num += 1
                 
-                try:
-                    loop_idx = DRUG_DISCOVERY_SEQUENCE.index(loop_target)
+                loop_wave = DRUG_DISCOVERY_WAVE_OF.get(loop_target)
+                if loop_wave is not None:
                     state["feedback"] = f"Iteration {iteration_num}: Controller requested refinement due to low scores. Focus on improving the weakest aspects."
                     
-                    yield f"data: {json.dumps({'type': 'loop', 'from': 'controller', 'to': loop_target, 'iteration': iteration_num})}\n\n"
-                    yield f"data: {json.dumps({'type': 'iteration_end', 'iteration': iteration_num-1, 'action': 'loop', 'scores': scores})}\n\n"
-                    yield f"data: {json.dumps({'type': 'iteration_start', 'iteration': iteration_num})}\n\n"
+                    yield sse.event({'type': 'loop', 'from': 'controller', 'to': loop_target, 'iteration': iteration_num})
+                    yield sse.event({'type': 'iteration_end', 'iteration': iteration_num-1, 'action': 'loop', 'scores': scores})
+                    yield sse.event({'type': 'iteration_start', 'iteration': iteration_num})
                     
-                    agent_idx = loop_idx
-                    await asyncio.sleep(0.5)
+                    # Re-run the target's whole wave and everything after it
+                    wave_idx = loop_wave
+                    await sse.pace(0.5)
                     continue
-                except ValueError:
-                    pass
             
             if decision == "LOOP" and remaining <= 0:
-                ev = state["evidence_score"] if state["evidence_score"] is not None else 0.5
-                dr = state["druggability_score"] if state["druggability_score"] is not None else 0.5
-                nv = state["novelty_score"] if state["novelty_score"] is not None else 0.5
-                fe = state["feasibility_score"] if state["feasibility_score"] is not None else 0.5
-                avg_score = (ev + dr + nv + fe) / 4
+                avg_score = sum(scores_or_default(state).values()) / len(SCORE_FIELDS)
                 decision = "GO" if avg_score >= 0.50 else "NO_GO"
             
-            yield f"data: {json.dumps({'type': 'iteration_end', 'iteration': iteration_num, 'action': decision.lower(), 'scores': scores})}\n\n"
-            yield f"data: {json.dumps({'type': 'pipeline_complete', 'decision': decision, 'scores': scores, 'iterations': iteration_num})}\n\n"
+            yield sse.event({'type': 'iteration_end', 'iteration': iteration_num, 'action': decision.lower(), 'scores': scores})
+            yield sse.event({'type': 'pipeline_complete', 'decision': decision, 'scores': scores, 'iterations': iteration_num})
             break
         
-        agent_idx += 1
\ No newline at end of file
+        wave_idx += 1
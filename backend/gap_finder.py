@@ -20,12 +20,17 @@ Usage:
 """
 
 import asyncio
-import json
+import heapq
+import logging
 import re
 import sys
 import os
-from typing import TypedDict, AsyncGenerator, Optional
-from dataclasses import dataclass
+from typing import AsyncGenerator, Optional
+from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import itemgetter
+
+import orjson
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -34,30 +39,73 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from langgraph.graph import StateGraph, END
 
 # LangChain imports for streaming
+from openai import RateLimitError
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+# Local imports - SSE helpers and caching
+import sse
+from cache import JsonlCache, make_key
 
 # Local imports - API clients
-from api_clients.pubmed import search_multiple_queries, fetch_in_batches
+from http_clients import get_openai_http_client
+from api_clients.pubmed import search_and_fetch_multiple
 from api_clients.openalex import enrich_papers_by_doi
 
 # Local imports - Processors
-from processors.xml_parser import parse_pubmed_xml, deduplicate_papers
+from processors.xml_parser import deduplicate_papers
 from processors.aggregator import generate_statistics_summary
 
 # Local imports - LLM Agents (for prompts and non-streaming functions)
 from agents.query_planner import SYSTEM_PROMPT as QP_SYSTEM_PROMPT, THINKING_TEXT as QP_THINKING
 from agents.literature_analyzer import SYSTEM_PROMPT as LA_SYSTEM_PROMPT, THINKING_TEXT as LA_THINKING, format_statistics_for_prompt
-from agents.gap_synthesizer import SYSTEM_PROMPT as GS_SYSTEM_PROMPT, THINKING_TEXT as GS_THINKING, format_analysis_for_prompt
+from agents.gap_synthesizer import SYSTEM_PROMPT as GS_SYSTEM_PROMPT, THINKING_TEXT as GS_THINKING, format_analysis_for_prompt, ArrayItemScanner
+
+# Local imports - Batch API (offline bulk runs)
+from agents.batch_runner import to_batch_row, run_batch
+from agents.query_planner import build_messages as build_planner_messages
+from agents.literature_analyzer import build_messages as build_analyzer_messages
+from agents.gap_synthesizer import build_messages as build_synthesizer_messages
 
 # Config
-from config import MAX_PAPERS_TOTAL, OPENAI_API_KEY, MODEL_NAME, LLM_TEMPERATURE, LLM_TEMPERATURE_CREATIVE
+from config import (
+    MAX_PAPERS_TOTAL, OPENAI_API_KEY, MODEL_NAME, LLM_TEMPERATURE, LLM_TEMPERATURE_CREATIVE,
+    PROMPT_PREWARM_ENABLED, FUSED_SYNTHESIS_ENABLED, LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES,
+    MODEL_PLANNER, MODEL_ANALYZER, MODEL_SYNTHESIZER, LLM_TOP_P, LLM_SEED, LLM_MAX_RETRIES
+)
+
+# Debug output is formatted only when DEBUG is enabled for this logger
+logger = logging.getLogger(__name__)
 
 
 # =============================================================================
 # JSON Repair Helper
 # =============================================================================
 
+# One pass drops a comma before either closing bracket
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+# "term"[MeSH] -> 'term'[MeSH] for one-, two- and three-word terms
+_MESH_QUOTE_RES = (
+    re.compile(r'"(\w+)"\['),
+    re.compile(r'"(\w+\s+\w+)"\['),
+    re.compile(r'"(\w+\s+\w+\s+\w+)"\['),
+)
+_SEARCH_QUERIES_RE = re.compile(r'"search_queries"\s*:\s*\[(.*?)\]', re.DOTALL)
+_QUERY_LINE_SPLIT_RE = re.compile(r',\s*\n')
+# Last-resort planner fallback: quoted single-line strings that look like
+# boolean queries. Bounded spans and the capped scan keep backtracking linear
+_BOOLEAN_QUERY_RE = re.compile(r'"([^"\n]{10,500}(?:AND|OR)[^"\n]{5,500})"')
+_BOOLEAN_QUERY_SCAN_LIMIT = 20000
+# String fields salvaged from JSON that cannot be repaired
+_STRING_FIELD_RES = {
+    field: re.compile(rf'"{field}"\s*:\s*"([^"]*)"')
+    for field in (
+        "domain_summary", "search_rationale", "key_findings_summary",
+        "synthesis_summary", "field_observations"
+    )
+}
+
+
 def repair_json_response(raw_response: str) -> dict:
     """
     Attempt to parse JSON from LLM response, with repairs for common issues.
@@ -69,56 +117,65 @@ def repair_json_response(raw_response: str) -> dict:
         Parsed dict or None if parsing fails
     """
     
+    # Fast path: JSON mode makes the raw response a bare object
+    try:
+        result = orjson.loads(raw_response)
+        if isinstance(result, dict):
+            return result
+    except orjson.JSONDecodeError:
+        pass
+    
     # Step 1: Extract JSON from markdown code blocks if present
     json_str = raw_response.strip()
     
-    if "```json" in json_str:
-        json_str = json_str.split("```json")[1].split("```")[0].strip()
-    elif "```" in json_str:
-        parts = json_str.split("```")
-        if len(parts) >= 2:
-            json_str = parts[1].strip()
+    # A bare object (the usual case) needs no fence scan, and a ``` inside
+    # one of its string values must not be mistaken for a fence
+    if not (json_str.startswith("{") and json_str.endswith("}")):
+        # partition() scans once and builds no intermediate lists
+        _, fence, after = json_str.partition("```json")
+        if not fence:
+            _, fence, after = json_str.partition("```")
+        if fence:
+            json_str = after.partition("```")[0].strip()
     
     # Step 2: Find the JSON object boundaries
     start = json_str.find("{")
     end = json_str.rfind("}") + 1
     if start == -1 or end <= start:
-        print(f"[DEBUG] repair_json: No JSON object found")
+        logger.debug("repair_json: No JSON object found")
         return None
     json_str = json_str[start:end]
     
     # Step 3: Try direct parse first
     try:
-        result = json.loads(json_str)
-        print(f"[DEBUG] repair_json: Direct parse succeeded")
+        result = orjson.loads(json_str)
+        logger.debug("repair_json: Direct parse succeeded")
         return result
-    except json.JSONDecodeError as e:
-        print(f"[DEBUG] repair_json: Direct parse failed at position {e.pos}: {e.msg}")
+    except orjson.JSONDecodeError as e:
+        logger.debug("repair_json: Direct parse failed at position %s: %s", e.pos, e.msg)
     
     # Step 4: Try common fixes
     fixed_str = json_str
     
     # Fix trailing commas
-    fixed_str = re.sub(r',\s*}', '}', fixed_str)
-    fixed_str = re.sub(r',\s*]', ']', fixed_str)
+    fixed_str = _TRAILING_COMMA_RE.sub(r'\1', fixed_str)
     
     try:
-        result = json.loads(fixed_str)
-        print(f"[DEBUG] repair_json: Fixed trailing commas, parse succeeded")
+        result = orjson.loads(fixed_str)
+        logger.debug("repair_json: Fixed trailing commas, parse succeeded")
         return result
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         pass
     
     # Fix unescaped quotes in MeSH terms: "term"[MeSH] -> 'term'[MeSH]
-    fixed_str = re.sub(r'"(\w+)"\[', r"'\1'[", fixed_str)
-    fixed_str = re.sub(r'"(\w+\s+\w+)"\[', r"'\1'[", fixed_str)
-    fixed_str = re.sub(r'"(\w+\s+\w+\s+\w+)"\[', r"'\1'[", fixed_str)
+    for mesh_quote_re in _MESH_QUOTE_RES:
+        fixed_str = mesh_quote_re.sub(r"'\1'[", fixed_str)
     
     try:
-        result = json.loads(fixed_str)
-        print(f"[DEBUG] repair_json: Fixed MeSH quotes, parse succeeded")
+        result = orjson.loads(fixed_str)
+        logger.debug("repair_json: Fixed MeSH quotes, parse succeeded")
         return result
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         pass
     
     # Step 5: Try to extract key fields manually as last resort
@@ -127,10 +184,10 @@ def repair_json_response(raw_response: str) -> dict:
         
         # For Query Planner
         if "search_queries" in json_str:
-            match = re.search(r'"search_queries"\s*:\s*\[(.*?)\]', json_str, re.DOTALL)
+            match = _SEARCH_QUERIES_RE.search(json_str)
             if match:
                 queries_content = match.group(1)
-                query_lines = re.split(r',\s*\n', queries_content)
+                query_lines = _QUERY_LINE_SPLIT_RE.split(queries_content)
                 cleaned_queries = []
                 for line in query_lines:
                     line = line.strip().strip('"').strip("'").strip(',').strip()
@@ -140,57 +197,103 @@ def repair_json_response(raw_response: str) -> dict:
                     result["search_queries"] = cleaned_queries
         
         # Extract simple string fields
-        string_fields = [
-            "domain_summary", "search_rationale", "key_findings_summary",
-            "synthesis_summary", "field_observations"
-        ]
-        for field in string_fields:
-            match = re.search(rf'"{field}"\s*:\s*"([^"]*)"', json_str)
+        for field, field_re in _STRING_FIELD_RES.items():
+            match = field_re.search(json_str)
             if match:
                 result[field] = match.group(1)
         
         if result:
             result["partial_parse"] = True
-            print(f"[DEBUG] repair_json: Partial extraction with {len(result)} fields")
+            logger.debug("repair_json: Partial extraction with %d fields", len(result))
             return result
             
     except Exception as ex:
-        print(f"[DEBUG] repair_json: Extraction failed: {ex}")
+        logger.debug("repair_json: Extraction failed: %s", ex)
     
-    print(f"[DEBUG] repair_json: All repair attempts failed")
+    logger.debug("repair_json: All repair attempts failed")
     return None
 
 
+JSON_RETRY_PROMPT = "The previous response was not valid JSON. Respond with ONLY the corrected JSON object."
+
+
+async def retry_json_response(llm, messages: list, raw_response: str) -> dict:
+    """
+    Ask the LLM once more for valid JSON, with JSON mode enforced.
+    
+    Used only after repair_json_response() has given up.
+    
+    Args:
+        llm: The LLM that produced raw_response
+        messages: Messages of the original request
+        raw_response: The unparseable response text
+        
+    Returns:
+        Parsed dict or None if the retry also fails
+    """
+    json_llm = llm.bind(response_format={"type": "json_object"})
+    retry_messages = [*messages, AIMessage(content=raw_response), HumanMessage(content=JSON_RETRY_PROMPT)]
+    try:
+        response = await json_llm.ainvoke(retry_messages)
+    except Exception as e:
+        logger.debug("retry_json: Retry call failed: %s", e)
+        return None
+    return repair_json_response(response.content)
+
+
+async def prewarm_prompts(system_prompts: tuple[tuple[str, str], ...]) -> None:
+    """
+    Send each system prompt with a one-token completion so the provider's
+    prefix cache holds it before the real call.
+
+    Prompts are warmed on the model that will receive them, since the
+    prefix cache is per model. Failures are ignored: a cold cache only
+    costs latency.
+
+    Args:
+        system_prompts: (model, system prompt) pairs
+    """
+    async def warm(model: str, system_prompt: str):
+        try:
+            llm = get_json_llm(model).bind(max_tokens=1)
+            await llm.ainvoke([SystemMessage(content=system_prompt), HumanMessage(content="ping")])
+        except Exception:
+            pass
+    
+    await asyncio.gather(*(warm(model, prompt) for model, prompt in system_prompts))
+
+
 # =============================================================================
 # State Definition
 # =============================================================================
 
-class GapFinderState(TypedDict):
-    """State shared across all nodes in the LangGraph pipeline."""
+@dataclass(slots=True)
+class GapFinderState:
+    """State shared across all nodes in the pipeline; nodes update it in place."""
     
     # Input
     user_query: str
     
     # Query Planner outputs
-    search_plan: dict
-    search_queries: list[str]
+    search_plan: dict = field(default_factory=dict)
+    search_queries: list[str] = field(default_factory=list)
     
     # Data Fetcher outputs
-    raw_papers: list[dict]
-    paper_count: int
+    raw_papers: list[dict] = field(default_factory=list)
+    paper_count: int = 0
     
     # Aggregator outputs
-    statistics: dict
+    statistics: dict = field(default_factory=dict)
     
     # Literature Analyzer outputs
-    analysis: dict
+    analysis: dict = field(default_factory=dict)
     
     # Gap Synthesizer outputs
-    gaps: dict
+    gaps: dict = field(default_factory=dict)
     
     # Status tracking
-    current_node: str
-    error: Optional[str]
+    current_node: str = ""
+    error: Optional[str] = None
 
 
 # =============================================================================
@@ -226,27 +329,139 @@ NODE_METADATA = {
 }
 
 
+# =============================================================================
+# System Prompts
+# =============================================================================
+
+# The JSON-only reminder is part of each system prompt rather than appended to
+# every user message, so it falls inside the provider-cached prompt prefix
+JSON_ONLY_REMINDER = "\n\nIMPORTANT: Respond with ONLY a valid JSON object. No markdown code blocks, no explanations, just the raw JSON."
+
+QP_SYSTEM_MSG = SystemMessage(content=QP_SYSTEM_PROMPT + JSON_ONLY_REMINDER)
+LA_SYSTEM_MSG = SystemMessage(content=LA_SYSTEM_PROMPT + JSON_ONLY_REMINDER)
+GS_SYSTEM_MSG = SystemMessage(content=GS_SYSTEM_PROMPT + JSON_ONLY_REMINDER)
+
+# Both LLM stages in one call (FUSED_SYNTHESIS_ENABLED)
+FUSED_SYSTEM_MSG = SystemMessage(content=f"""You complete two tasks in a single pass.
+
+TASK 1 - LITERATURE ANALYSIS:
+{LA_SYSTEM_PROMPT}
+
+TASK 2 - GAP SYNTHESIS (build on your TASK 1 analysis):
+{GS_SYSTEM_PROMPT}
+
+Return ONE JSON object of the form {{"analysis": <TASK 1 JSON>, "gaps": <TASK 2 JSON>}}.{JSON_ONLY_REMINDER}""")
+
+
 # =============================================================================
 # LLM Streaming Helper
 # =============================================================================
 
-def get_streaming_llm(creative: bool = False):
-    """Get configured LLM instance for streaming."""
+@lru_cache(maxsize=None)
+def _build_llm(model: str, creative: bool, streaming: bool) -> ChatOpenAI:
+    """Build the shared LLM instance for a model and sampling mode (once per process)."""
     return ChatOpenAI(
-        model=MODEL_NAME,
+        model=model,
         temperature=LLM_TEMPERATURE_CREATIVE if creative else LLM_TEMPERATURE,
-        streaming=True,
-        api_key=OPENAI_API_KEY
+        streaming=streaming,
+        max_retries=LLM_MAX_RETRIES,
+        api_key=OPENAI_API_KEY,
+        http_async_client=get_openai_http_client()
     )
 
 
-def get_llm(creative: bool = False):
+def get_streaming_llm(creative: bool = False, model: str = MODEL_NAME):
+    """Get configured LLM instance for streaming."""
+    return _build_llm(model, creative, True)
+
+
+def get_llm(creative: bool = False, model: str = MODEL_NAME):
     """Get configured LLM instance (non-streaming, for ainvoke)."""
-    return ChatOpenAI(
-        model=MODEL_NAME,
-        temperature=LLM_TEMPERATURE_CREATIVE if creative else LLM_TEMPERATURE,
-        streaming=False,
-        api_key=OPENAI_API_KEY
+    return _build_llm(model, creative, False)
+
+
+def _json_mode(model: str):
+    """Bind JSON mode to the deterministic LLM for a model."""
+    return get_llm(creative=False, model=model).bind(response_format={"type": "json_object"})
+
+
+@lru_cache(maxsize=None)
+def get_json_llm(model: str):
+    """
+    Get the deterministic JSON-mode LLM for an agent's model tier.
+
+    Rate-limited calls fall back to the synthesizer tier, as the
+    standalone query planner does.
+    """
+    llm = _json_mode(model)
+    if model == MODEL_SYNTHESIZER:
+        return llm
+    return llm.with_fallbacks(
+        [_json_mode(MODEL_SYNTHESIZER)],
+        exceptions_to_handle=(RateLimitError,)
+    )
+
+
+_LLM_RESPONSE_CACHE = JsonlCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+
+
+def llm_cache_key(model: str, messages: list) -> Optional[str]:
+    """
+    Key for an LLM call in the on-disk response cache (None when disabled).
+
+    The key covers the model, its sampling settings and every message, so
+    any prompt change (including the formatted statistics) is a miss.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    return make_key(
+        model, LLM_TEMPERATURE,
+        [(message.type, message.content) for message in messages]
+    )
+
+
+async def stream_llm_cached(llm, messages: list, key: Optional[str]) -> AsyncGenerator[str, None]:
+    """
+    Stream the LLM's response text, replaying it from disk for identical calls.
+
+    Only reads the cache - the caller stores the response with
+    store_llm_response() once it has parsed. A replayed response arrives
+    as a single chunk.
+
+    Args:
+        llm: Chat model from get_json_llm()
+        messages: Messages to send
+        key: Cache key from llm_cache_key(), or None to skip the cache
+
+    Yields:
+        Response text chunks
+    """
+    if key is not None:
+        await asyncio.to_thread(_LLM_RESPONSE_CACHE.load)
+        content = _LLM_RESPONSE_CACHE.get(key)
+        if content is not None:
+            yield content
+            return
+    
+    async for chunk in llm.astream(messages):
+        if chunk.content:
+            yield chunk.content
+
+
+async def store_llm_response(key: Optional[str], parsed: Optional[dict]) -> None:
+    """
+    Cache a response that parsed into a complete JSON object.
+
+    The parsed object is stored re-serialized, so a response that needed
+    repair or a JSON retry replays as clean JSON. Partial extractions and
+    entries already cached are not written.
+    """
+    if key is None or not parsed or parsed.get("partial_parse"):
+        return
+    if _LLM_RESPONSE_CACHE.get(key) is not None:
+        return
+    await asyncio.to_thread(
+        _LLM_RESPONSE_CACHE.put_many, {key: orjson.dumps(parsed).decode()}
     )
 
 
@@ -271,67 +486,43 @@ async def data_fetcher_node(state: GapFinderState) -> GapFinderState:
     Node 2: Data Fetcher (No LLM)
     Executes PubMed searches and fetches paper data.
     """
+    state.current_node = "data_fetcher"
+    state.raw_papers = []
+    state.paper_count = 0
     try:
-        queries = state["search_queries"]
+        queries = state.search_queries
         
         if not queries:
-            return {
-                **state,
-                "raw_papers": [],
-                "paper_count": 0,
-                "current_node": "data_fetcher",
-                "error": "No search queries provided"
-            }
+            state.error = "No search queries provided"
+            return state
         
-        # Search PubMed with all queries
-        all_pmids = await search_multiple_queries(queries, max_per_query=100)
-        
-        # Limit total papers
-        pmids = list(all_pmids)[:MAX_PAPERS_TOTAL]
+        # Search PubMed with all queries; each query's fetch overlaps the other searches
+        pmids, papers = await search_and_fetch_multiple(
+            queries, max_per_query=100, max_total=MAX_PAPERS_TOTAL, batch_size=200
+        )
         
         if not pmids:
-            return {
-                **state,
-                "raw_papers": [],
-                "paper_count": 0,
-                "current_node": "data_fetcher",
-                "error": "No papers found for search queries"
-            }
-        
-        # Fetch paper details
-        xml_data = await fetch_in_batches(pmids, batch_size=50)
+            state.error = "No papers found for search queries"
+            return state
         
-        # Parse XML
-        papers = parse_pubmed_xml(xml_data)
+        # Records arrive already parsed from the streamed XML
         papers = deduplicate_papers(papers)
         
         # Enrich with OpenAlex (optional, may fail)
+        # enrich_papers_by_doi() adds citation_count to these dicts in place
         try:
-            dois = [p.get("doi") for p in papers if p.get("doi")]
-            if dois:
-                enrichments = await enrich_papers_by_doi(dois[:50])
-                doi_to_enrichment = {e["doi"]: e for e in enrichments if e.get("doi")}
-                for paper in papers:
-                    if paper.get("doi") in doi_to_enrichment:
-                        paper["citations"] = doi_to_enrichment[paper["doi"]].get("cited_by_count", 0)
+            papers_with_doi = [p for p in papers if p.get("doi")][:50]
+            if papers_with_doi:
+                await enrich_papers_by_doi(papers_with_doi)
         except Exception:
             pass
         
-        return {
-            **state,
-            "raw_papers": papers,
-            "paper_count": len(papers),
-            "current_node": "data_fetcher",
-            "error": None
-        }
+        state.raw_papers = papers
+        state.paper_count = len(papers)
+        state.error = None
     except Exception as e:
-        return {
-            **state,
-            "raw_papers": [],
-            "paper_count": 0,
-            "current_node": "data_fetcher",
-            "error": f"Data fetch error: {str(e)}"
-        }
+        state.error = f"Data fetch error: {str(e)}"
+    return state
 
 
 async def aggregator_node(state: GapFinderState) -> GapFinderState:
@@ -339,33 +530,54 @@ async def aggregator_node(state: GapFinderState) -> GapFinderState:
     Node 3: Aggregator (No LLM)
     Computes statistics from papers.
     """
+    state.current_node = "aggregator"
     try:
-        papers = state["raw_papers"]
+        papers = state.raw_papers
         
         if not papers:
-            return {
-                **state,
-                "statistics": {"error": "No papers to aggregate"},
-                "current_node": "aggregator",
-                "error": "No papers available for aggregation"
-            }
+            state.statistics = {"error": "No papers to aggregate"}
+            state.error = "No papers available for aggregation"
+            return state
         
         # Generate comprehensive statistics
-        statistics = generate_statistics_summary(papers)
-        
-        return {
-            **state,
-            "statistics": statistics,
-            "current_node": "aggregator",
-            "error": None
-        }
+        state.statistics = generate_statistics_summary(papers)
+        state.error = None
+
+        # The summary keeps its own digests of the sampled abstracts; the
+        # full texts (a few KB per paper) are dead weight for the LLM stages
+        for paper in papers:
+            paper.pop("abstract", None)
     except Exception as e:
-        return {
-            **state,
-            "statistics": {},
-            "current_node": "aggregator",
-            "error": f"Aggregation error: {str(e)}"
-        }
+        state.statistics = {}
+        state.error = f"Aggregation error: {str(e)}"
+    return state
+
+
+def _fallback_query_plan(full_response: str, user_query: str) -> tuple[dict, list[str]]:
+    """
+    Build a plan when the planner's JSON could not be recovered.
+    
+    Args:
+        full_response: Raw planner response
+        user_query: Research domain or question
+        
+    Returns:
+        Tuple of (search plan, search queries)
+    """
+    # Look for quoted strings that look like search queries
+    query_patterns = _BOOLEAN_QUERY_RE.findall(full_response[:_BOOLEAN_QUERY_SCAN_LIMIT])
+    if query_patterns:
+        logger.debug("Extracted %d queries via AND/OR pattern", len(query_patterns[:6]))
+        return (
+            {"domain_summary": user_query, "search_rationale": "Extracted via pattern matching"},
+            query_patterns[:6]
+        )
+    
+    logger.debug("Using fallback queries")
+    return (
+        {"domain_summary": user_query, "search_rationale": "Fallback search due to parsing error"},
+        [user_query, f'{user_query}[Title/Abstract]']
+    )
 
 
 # =============================================================================
@@ -385,18 +597,7 @@ async def run_gap_finder_streaming(user_query: str) -> AsyncGenerator[dict, None
     
     yield {"type": "pipeline_start", "query": user_query}
     
-    current_state: GapFinderState = {
-        "user_query": user_query,
-        "search_plan": {},
-        "search_queries": [],
-        "raw_papers": [],
-        "paper_count": 0,
-        "statistics": {},
-        "analysis": {},
-        "gaps": {},
-        "current_node": "",
-        "error": None
-    }
+    current_state = GapFinderState(user_query=user_query)
     
     # =========================================================================
     # Node 1: Query Planner (LLM)
@@ -406,64 +607,59 @@ async def run_gap_finder_streaming(user_query: str) -> AsyncGenerator[dict, None
     meta = NODE_METADATA[node_id]
     
     yield {"type": "agent_event", "agent": node_id, "phase": "thinking", "content": meta["thinking"]}
-    await asyncio.sleep(0.5)
+    await sse.pace(0.5)
     
     yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": "Generating search strategy..."}
     
-    # Run LLM (not streaming raw tokens)
     try:
         user_message = f"""Research domain: {user_query}
 
-Generate a comprehensive PubMed search strategy for research gap analysis.
-
-IMPORTANT: Respond with ONLY a valid JSON object. No markdown code blocks, no explanations, just the raw JSON."""
+Generate a comprehensive PubMed search strategy for research gap analysis."""
         
-        llm = get_llm(creative=False)
-        messages = [SystemMessage(content=QP_SYSTEM_PROMPT), HumanMessage(content=user_message)]
-        response = await llm.ainvoke(messages)
-        full_response = response.content
+        llm = get_json_llm(MODEL_PLANNER)
+        messages = [QP_SYSTEM_MSG, HumanMessage(content=user_message)]
+        cache_key = llm_cache_key(MODEL_PLANNER, messages)
+        # Stream the raw JSON so the panel shows progress; the complete
+        # event replaces it with the formatted summary
+        yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": "\n\n"}
+        chunks = []
+        async for chunk in sse.coalesce(stream_llm_cached(llm, messages, cache_key)):
+            chunks.append(chunk)
+            yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": chunk}
+        full_response = "".join(chunks)
         
-        print(f"[DEBUG] Query Planner raw response length: {len(full_response)}")
-        print(f"[DEBUG] Query Planner response preview: {full_response[:500]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Query Planner raw response length: %d", len(full_response))
+            logger.debug("Query Planner response preview: %s...", full_response[:500])
         
-        # Parse response using repair function
-        plan = repair_json_response(full_response)
+        # Parse response using repair function (off the event loop)
+        plan = await asyncio.to_thread(repair_json_response, full_response)
+        if not plan or not plan.get("search_queries"):
+            plan = await retry_json_response(llm, messages, full_response) or plan
         
         if plan and plan.get("search_queries"):
             queries = plan.get("search_queries", [])
-            print(f"[DEBUG] Successfully parsed {len(queries)} queries")
+            logger.debug("Successfully parsed %d queries", len(queries))
+            await store_llm_response(cache_key, plan)
         else:
-            print(f"[DEBUG] repair_json_response returned: {plan}")
-            # Fallback: try to extract queries from text using regex
-            
-            # Look for quoted strings that look like search queries
-            query_patterns = re.findall(r'"([^"]{10,}(?:AND|OR)[^"]{5,})"', full_response)
-            if query_patterns:
-                queries = query_patterns[:6]
-                plan = {"domain_summary": user_query, "search_rationale": "Extracted via pattern matching"}
-                print(f"[DEBUG] Extracted {len(queries)} queries via AND/OR pattern")
-            else:
-                queries = [user_query, f'{user_query}[Title/Abstract]']
-                plan = {"domain_summary": user_query, "search_rationale": "Fallback search due to parsing error"}
-                print(f"[DEBUG] Using fallback queries")
+            logger.debug("repair_json_response returned: %s", plan)
+            plan, queries = _fallback_query_plan(full_response, user_query)
         
-        current_state["search_plan"] = plan
-        current_state["search_queries"] = queries
-        current_state["current_node"] = node_id
+        current_state.search_plan = plan
+        current_state.search_queries = queries
+        current_state.current_node = node_id
         
     except Exception as e:
-        print(f"[DEBUG] Query Planner exception: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Query Planner failed")
         yield {"type": "agent_event", "agent": node_id, "phase": "error", "content": str(e)}
-        current_state["error"] = str(e)
-        current_state["search_queries"] = [user_query]
+        current_state.error = str(e)
+        current_state.search_queries = [user_query]
     
     # Format display output
     display_output = _format_query_planner_output(current_state)
     yield {"type": "agent_event", "agent": node_id, "phase": "complete", "content": display_output, "full_output": display_output}
     
-    await asyncio.sleep(0.2)
+    await sse.pace(0.2)
     
     # =========================================================================
     # Node 2: Data Fetcher (No LLM)
@@ -473,19 +669,29 @@ IMPORTANT: Respond with ONLY a valid JSON object. No markdown code blocks, no ex
     meta = NODE_METADATA[node_id]
     
     yield {"type": "agent_event", "agent": node_id, "phase": "thinking", "content": meta["thinking"]}
-    await asyncio.sleep(0.3)
+    await sse.pace(0.3)
     
     yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": "Searching PubMed..."}
     
+    # The fetch is seconds of HTTP wait that the analyzer and synthesizer
+    # calls cannot start before; warm their long system prompts meanwhile
+    prewarm_task = None
+    if PROMPT_PREWARM_ENABLED:
+        if FUSED_SYNTHESIS_ENABLED:
+            prompts = ((MODEL_ANALYZER, FUSED_SYSTEM_MSG.content),)
+        else:
+            prompts = ((MODEL_ANALYZER, LA_SYSTEM_MSG.content), (MODEL_SYNTHESIZER, GS_SYSTEM_MSG.content))
+        prewarm_task = asyncio.create_task(prewarm_prompts(prompts))
+    
     current_state = await data_fetcher_node(current_state)
     
-    display_output = f"Retrieved {current_state['paper_count']} papers from PubMed.\nPapers enriched with citation data."
+    display_output = f"Retrieved {current_state.paper_count} papers from PubMed.\nPapers enriched with citation data."
     yield {"type": "agent_event", "agent": node_id, "phase": "complete", "content": display_output, "full_output": display_output}
     
-    if current_state.get("error"):
-        yield {"type": "agent_event", "agent": node_id, "phase": "warning", "content": current_state["error"]}
+    if current_state.error:
+        yield {"type": "agent_event", "agent": node_id, "phase": "warning", "content": current_state.error}
     
-    await asyncio.sleep(0.2)
+    await sse.pace(0.2)
     
     # =========================================================================
     # Node 3: Aggregator (No LLM)
@@ -495,16 +701,27 @@ IMPORTANT: Respond with ONLY a valid JSON object. No markdown code blocks, no ex
     meta = NODE_METADATA[node_id]
     
     yield {"type": "agent_event", "agent": node_id, "phase": "thinking", "content": meta["thinking"]}
-    await asyncio.sleep(0.3)
+    await sse.pace(0.3)
     
     yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": "Building statistics..."}
     
     current_state = await aggregator_node(current_state)
     
-    display_output = _format_aggregator_output(current_state)
+    display_output = await asyncio.to_thread(_format_aggregator_output, current_state)
     yield {"type": "agent_event", "agent": node_id, "phase": "complete", "content": display_output, "full_output": display_output}
     
-    await asyncio.sleep(0.2)
+    # Statistics are usable on their own while the LLM stages run
+    yield {
+        "type": "pipeline_partial",
+        "stage": node_id,
+        "result": {
+            "statistics": current_state.statistics,
+            "search_queries": current_state.search_queries,
+            "total_papers": current_state.paper_count
+        }
+    }
+    
+    await sse.pace(0.2)
     
     # =========================================================================
     # Node 4: Literature Analyzer (LLM)
@@ -514,53 +731,69 @@ IMPORTANT: Respond with ONLY a valid JSON object. No markdown code blocks, no ex
     meta = NODE_METADATA[node_id]
     
     yield {"type": "agent_event", "agent": node_id, "phase": "thinking", "content": meta["thinking"]}
-    await asyncio.sleep(0.5)
+    await sse.pace(0.5)
     
     yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": "Analyzing literature patterns..."}
     
+    fused_gaps = None
     try:
-        stats = current_state.get("statistics", {})
+        stats = current_state.statistics
         if stats and not stats.get("error"):
-            formatted_stats = format_statistics_for_prompt(stats)
+            # Prompt formatting is CPU-bound - keep it off the event loop serving other streams
+            formatted_stats = await asyncio.to_thread(format_statistics_for_prompt, stats)
             user_message = f"""RESEARCH DOMAIN: {user_query}
 
 {formatted_stats}
 
-Analyze these statistics and identify research gaps, patterns, and opportunities.
-
-IMPORTANT: Respond with ONLY valid JSON. No markdown code blocks."""
+Analyze these statistics and identify research gaps, patterns, and opportunities."""
             
-            llm = get_llm(creative=False)
-            messages = [SystemMessage(content=LA_SYSTEM_PROMPT), HumanMessage(content=user_message)]
-            response = await llm.ainvoke(messages)
-            full_response = response.content
+            llm = get_json_llm(MODEL_ANALYZER)
+            system_msg = FUSED_SYSTEM_MSG if FUSED_SYNTHESIS_ENABLED else LA_SYSTEM_MSG
+            messages = [system_msg, HumanMessage(content=user_message)]
+            cache_key = llm_cache_key(MODEL_ANALYZER, messages)
+            # Stream the raw JSON so the panel shows progress; the complete
+            # event replaces it with the formatted summary
+            yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": "\n\n"}
+            chunks = []
+            async for chunk in sse.coalesce(stream_llm_cached(llm, messages, cache_key)):
+                chunks.append(chunk)
+                yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": chunk}
+            full_response = "".join(chunks)
             
-            print(f"[DEBUG] Literature Analyzer response length: {len(full_response)}")
+            logger.debug("Literature Analyzer response length: %d", len(full_response))
             
-            # Parse response using repair function
-            analysis = repair_json_response(full_response)
+            # Parse response using repair function (off the event loop)
+            analysis = await asyncio.to_thread(repair_json_response, full_response)
+            if not analysis:
+                analysis = await retry_json_response(llm, messages, full_response)
+            await store_llm_response(cache_key, analysis)
+            
+            if FUSED_SYNTHESIS_ENABLED and analysis:
+                # The synthesizer node reuses the gaps from this same response
+                fused_gaps = analysis.get("gaps")
+                analysis = analysis.get("analysis")
             
             if not analysis:
-                print(f"[DEBUG] Literature Analyzer JSON repair failed, using raw")
+                logger.debug("Literature Analyzer JSON repair failed, using raw")
                 analysis = {"raw_analysis": full_response, "parse_error": True}
             else:
-                print(f"[DEBUG] Literature Analyzer parsed successfully")
+                logger.debug("Literature Analyzer parsed successfully")
             
-            current_state["analysis"] = analysis
+            current_state.analysis = analysis
         else:
-            current_state["analysis"] = {"error": "No statistics to analyze"}
+            current_state.analysis = {"error": "No statistics to analyze"}
         
-        current_state["current_node"] = node_id
+        current_state.current_node = node_id
         
     except Exception as e:
-        print(f"[DEBUG] Literature Analyzer exception: {e}")
+        logger.exception("Literature Analyzer failed")
         yield {"type": "agent_event", "agent": node_id, "phase": "error", "content": str(e)}
-        current_state["analysis"] = {"error": str(e)}
+        current_state.analysis = {"error": str(e)}
     
-    display_output = _format_literature_analyzer_output(current_state)
+    display_output = await asyncio.to_thread(_format_literature_analyzer_output, current_state)
     yield {"type": "agent_event", "agent": node_id, "phase": "complete", "content": display_output, "full_output": display_output}
     
-    await asyncio.sleep(0.2)
+    await sse.pace(0.2)
     
     # =========================================================================
     # Node 5: Gap Synthesizer (LLM)
@@ -570,48 +803,68 @@ IMPORTANT: Respond with ONLY valid JSON. No markdown code blocks."""
     meta = NODE_METADATA[node_id]
     
     yield {"type": "agent_event", "agent": node_id, "phase": "thinking", "content": meta["thinking"]}
-    await asyncio.sleep(0.5)
+    await sse.pace(0.5)
     
     yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": "Synthesizing research gaps and generating hypotheses..."}
     
     try:
-        analysis = current_state.get("analysis", {})
-        stats = current_state.get("statistics", {})
+        analysis = current_state.analysis
+        stats = current_state.statistics
         
-        if analysis and not analysis.get("error"):
-            formatted_input = format_analysis_for_prompt(analysis, stats, user_query)
-            formatted_input += "\n\nIMPORTANT: Respond with ONLY valid JSON. No markdown code blocks."
+        if fused_gaps:
+            for gap in fused_gaps.get("research_gaps") or []:
+                yield {"type": "agent_event", "agent": node_id, "phase": "gap", "content": gap}
+            current_state.gaps = fused_gaps
+        elif analysis and not analysis.get("error"):
+            formatted_input = await asyncio.to_thread(format_analysis_for_prompt, analysis, stats, user_query)
             
-            llm = get_llm(creative=True)
-            messages = [SystemMessage(content=GS_SYSTEM_PROMPT), HumanMessage(content=formatted_input)]
-            response = await llm.ainvoke(messages)
-            full_response = response.content
+            llm = get_json_llm(MODEL_SYNTHESIZER)
+            messages = [GS_SYSTEM_MSG, HumanMessage(content=formatted_input)]
+            cache_key = llm_cache_key(MODEL_SYNTHESIZER, messages)
+            # Stream the raw JSON so the panel shows progress; the complete
+            # event replaces it with the formatted summary. Each research gap
+            # also goes out as its own event once its closing brace arrives.
+            yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": "\n\n"}
+            scanner = ArrayItemScanner("research_gaps")
+            chunks = []
+            async for chunk in sse.coalesce(stream_llm_cached(llm, messages, cache_key)):
+                chunks.append(chunk)
+                yield {"type": "agent_event", "agent": node_id, "phase": "output", "content": chunk}
+                for gap in scanner.feed(chunk):
+                    yield {"type": "agent_event", "agent": node_id, "phase": "gap", "content": gap}
+            full_response = "".join(chunks)
             
-            print(f"[DEBUG] Gap Synthesizer response length: {len(full_response)}")
+            logger.debug("Gap Synthesizer response length: %d", len(full_response))
             
-            # Parse response using repair function
-            gaps = repair_json_response(full_response)
+            # Parse response using repair function (off the event loop)
+            gaps = await asyncio.to_thread(repair_json_response, full_response)
+            if not gaps:
+                gaps = await retry_json_response(llm, messages, full_response)
+            await store_llm_response(cache_key, gaps)
             
             if not gaps:
-                print(f"[DEBUG] Gap Synthesizer JSON repair failed, using raw")
+                logger.debug("Gap Synthesizer JSON repair failed, using raw")
                 gaps = {"raw_synthesis": full_response, "parse_error": True}
             else:
-                print(f"[DEBUG] Gap Synthesizer parsed successfully")
+                logger.debug("Gap Synthesizer parsed successfully")
             
-            current_state["gaps"] = gaps
+            current_state.gaps = gaps
         else:
-            current_state["gaps"] = {"error": "No analysis to synthesize"}
+            current_state.gaps = {"error": "No analysis to synthesize"}
         
-        current_state["current_node"] = node_id
+        current_state.current_node = node_id
         
     except Exception as e:
-        print(f"[DEBUG] Gap Synthesizer exception: {e}")
+        logger.exception("Gap Synthesizer failed")
         yield {"type": "agent_event", "agent": node_id, "phase": "error", "content": str(e)}
-        current_state["gaps"] = {"error": str(e)}
+        current_state.gaps = {"error": str(e)}
     
-    display_output = _format_gap_synthesizer_output(current_state)
+    display_output = await asyncio.to_thread(_format_gap_synthesizer_output, current_state)
     yield {"type": "agent_event", "agent": node_id, "phase": "complete", "content": display_output, "full_output": display_output}
     
+    if prewarm_task is not None:
+        await prewarm_task  # Long finished; reaps the task
+    
     # =========================================================================
     # Pipeline Complete
     # =========================================================================
@@ -619,10 +872,10 @@ IMPORTANT: Respond with ONLY valid JSON. No markdown code blocks."""
     yield {
         "type": "pipeline_complete",
         "result": {
-            "gaps": current_state.get("gaps", {}),
+            "gaps": current_state.gaps,
             "statistics": {
-                "total_papers": current_state.get("paper_count", 0),
-                "queries_used": len(current_state.get("search_queries", []))
+                "total_papers": current_state.paper_count,
+                "queries_used": len(current_state.search_queries)
             }
         }
     }
@@ -632,12 +885,16 @@ IMPORTANT: Respond with ONLY valid JSON. No markdown code blocks."""
 # Display Formatters
 # =============================================================================
 
+_HEAVY_RULE = "=" * 50
+_LIGHT_RULE = "-" * 40
+
+
 def _format_query_planner_output(state: GapFinderState) -> str:
     """Format query planner output for display."""
-    plan = state.get("search_plan", {})
-    queries = state.get("search_queries", [])
+    plan = state.search_plan
+    queries = state.search_queries
     lines = [
-        f"Domain: {plan.get('domain_summary', state['user_query'])}",
+        f"Domain: {plan.get('domain_summary', state.user_query)}",
         "",
         "Search Queries Generated:",
     ]
@@ -650,7 +907,7 @@ def _format_query_planner_output(state: GapFinderState) -> str:
 
 def _format_aggregator_output(state: GapFinderState) -> str:
     """Format aggregator output for display."""
-    stats = state.get("statistics", {})
+    stats = state.statistics
     total = stats.get("total_papers", 0)
     
     lines = [f"Analyzed {total} papers", ""]
@@ -659,14 +916,14 @@ def _format_aggregator_output(state: GapFinderState) -> str:
     pop_counts = stats.get("distributions", {}).get("population", {})
     if pop_counts:
         lines.append("Population Coverage:")
-        for cat, data in sorted(pop_counts.items(), key=lambda x: x[1]["count"], reverse=True)[:5]:
+        for data in heapq.nlargest(5, pop_counts.values(), key=itemgetter("count")):
             lines.append(f"  - {data['display_name']}: {data['count']} ({data['percentage']}%)")
     
     # Intervention summary
     int_counts = stats.get("distributions", {}).get("intervention", {})
     if int_counts:
         lines.append("\nIntervention Coverage:")
-        for cat, data in sorted(int_counts.items(), key=lambda x: x[1]["count"], reverse=True)[:5]:
+        for data in heapq.nlargest(5, int_counts.values(), key=itemgetter("count")):
             lines.append(f"  - {data['display_name']}: {data['count']} ({data['percentage']}%)")
     
     # Sparse combinations
@@ -679,11 +936,12 @@ def _format_aggregator_output(state: GapFinderState) -> str:
 
 def _format_literature_analyzer_output(state: GapFinderState) -> str:
     """Format literature analyzer output for display."""
-    analysis = state.get("analysis", {})
+    analysis = state.analysis
     
     # Check for errors
-    if analysis.get("error"):
-        return f"Error: {analysis.get('error')}"
+    error = analysis.get("error")
+    if error:
+        return f"Error: {error}"
     
     # If we have a partial parse or full parse, try to display it
     summary = analysis.get("key_findings_summary", "")
@@ -693,37 +951,34 @@ def _format_literature_analyzer_output(state: GapFinderState) -> str:
         lines.append(f"Summary: {summary}")
         lines.append("")
     
-    dist = analysis.get("distribution_insights", {})
+    dist = analysis.get("distribution_insights") or {}
     
-    understudied_pops = dist.get("understudied_populations", [])
+    understudied_pops = dist.get("understudied_populations")
     if understudied_pops:
         lines.append("Understudied Populations:")
-        for item in understudied_pops[:5]:
-            cat = item.get('category', 'Unknown')
-            pct = item.get('percentage', 'N/A')
-            sig = item.get('significance', '')
-            valid = item.get('is_valid_intervention_target', True)
-            status = "✓" if valid else "✗"
-            lines.append(f"  {status} {cat} ({pct}%): {sig}")
-    
-    understudied_intervs = dist.get("understudied_interventions", [])
+        lines.extend(
+            f"  {'✓' if item.get('is_valid_intervention_target', True) else '✗'} "
+            f"{item.get('category', 'Unknown')} ({item.get('percentage', 'N/A')}%): {item.get('significance', '')}"
+            for item in understudied_pops[:5]
+        )
+    
+    understudied_intervs = dist.get("understudied_interventions")
     if understudied_intervs:
         lines.append("\nUnderstudied Interventions:")
-        for item in understudied_intervs[:5]:
-            cat = item.get('category', 'Unknown')
-            sig = item.get('significance', '')
-            lines.append(f"  - {cat}: {sig}")
+        lines.extend(
+            f"  - {item.get('category', 'Unknown')}: {item.get('significance', '')}"
+            for item in understudied_intervs[:5]
+        )
     
-    sparse = analysis.get("sparse_combination_analysis", [])
-    genuine_gaps = [s for s in sparse if s.get("is_genuine_gap")]
+    genuine_gaps = [s for s in analysis.get("sparse_combination_analysis") or () if s.get("is_genuine_gap")]
     if genuine_gaps:
         lines.append(f"\nGenuine Research Gaps ({len(genuine_gaps)}):")
-        for gap in genuine_gaps[:5]:
-            combo = gap.get('combination', 'Unknown')
-            count = gap.get('paper_count', 0)
-            lines.append(f"  - {combo}: {count} papers")
+        lines.extend(
+            f"  - {gap.get('combination', 'Unknown')}: {gap.get('paper_count', 0)} papers"
+            for gap in genuine_gaps[:5]
+        )
     
-    temporal = analysis.get("temporal_insights", {})
+    temporal = analysis.get("temporal_insights")
     if temporal:
         lines.append(f"\nField Trend: {temporal.get('overall_trend', 'unknown')}")
     
@@ -732,51 +987,52 @@ def _format_literature_analyzer_output(state: GapFinderState) -> str:
 
 def _format_gap_synthesizer_output(state: GapFinderState) -> str:
     """Format gap synthesizer output for display."""
-    gaps = state.get("gaps", {})
+    gaps = state.gaps
     
     # Check for errors
-    if gaps.get("error"):
-        return f"Error: {gaps.get('error')}"
+    error = gaps.get("error")
+    if error:
+        return f"Error: {error}"
     
     lines = []
     
-    if gaps.get("synthesis_summary"):
-        lines.append(f"SUMMARY: {gaps['synthesis_summary']}")
+    summary = gaps.get("synthesis_summary")
+    if summary:
+        lines.append(f"SUMMARY: {summary}")
         lines.append("")
     
-    research_gaps = gaps.get("research_gaps", [])
+    research_gaps = gaps.get("research_gaps")
     if research_gaps:
-        lines.append(f"{'='*50}")
+        lines.append(_HEAVY_RULE)
         lines.append(f"TOP {len(research_gaps)} RESEARCH GAPS")
-        lines.append(f"{'='*50}")
+        lines.append(_HEAVY_RULE)
         
         for gap in research_gaps:
-            rank = gap.get('rank', '?')
-            title = gap.get('title', 'Untitled')
-            lines.append(f"\n#{rank}: {title}")
-            lines.append("-" * 40)
+            lines.append(f"\n#{gap.get('rank', '?')}: {gap.get('title', 'Untitled')}")
+            lines.append(_LIGHT_RULE)
             
-            if gap.get('description'):
-                lines.append(f"Description: {gap['description']}")
+            description = gap.get('description')
+            if description:
+                lines.append(f"Description: {description}")
             
-            impact = gap.get('impact_rating', 'N/A')
-            feasibility = gap.get('feasibility_rating', 'N/A')
-            novelty = gap.get('novelty_rating', 'N/A')
-            lines.append(f"Ratings: Impact={impact}, Feasibility={feasibility}, Novelty={novelty}")
+            lines.append(
+                f"Ratings: Impact={gap.get('impact_rating', 'N/A')}, "
+                f"Feasibility={gap.get('feasibility_rating', 'N/A')}, "
+                f"Novelty={gap.get('novelty_rating', 'N/A')}"
+            )
             
-            hypothesis = gap.get("hypothesis", {})
-            if hypothesis.get("statement"):
-                lines.append(f"Hypothesis: {hypothesis['statement']}")
+            statement = (gap.get("hypothesis") or {}).get("statement")
+            if statement:
+                lines.append(f"Hypothesis: {statement}")
             
-            study = gap.get("suggested_study_design", {})
+            study = gap.get("suggested_study_design")
             if study:
                 lines.append(f"Study Design: {study.get('design', 'N/A')} - {study.get('population', 'N/A')}")
     
-    recs = gaps.get("methodological_recommendations", [])
+    recs = gaps.get("methodological_recommendations")
     if recs:
         lines.append("\nRecommendations:")
-        for rec in recs[:3]:
-            lines.append(f"  • {rec}")
+        lines.extend(f"  • {rec}" for rec in recs[:3])
     
     return "\n".join(lines) if lines else "Synthesis completed"
 
@@ -785,20 +1041,133 @@ def _format_gap_synthesizer_output(state: GapFinderState) -> str:
 # Non-Streaming Pipeline (for programmatic use)
 # =============================================================================
 
-async def run_gap_finder_pipeline(user_query: str) -> dict:
+async def run_gap_finder_pipeline(user_query: str, statistics_only: bool = False) -> dict:
     """
     Run the gap finder pipeline and return final results.
     
     Args:
         user_query: Research domain or question
+        statistics_only: Stop after the aggregator and return its statistics,
+                         skipping the analyzer and synthesizer LLM calls
         
     Returns:
-        Dict with gaps, statistics, and metadata
+        Dict with gaps, statistics, and metadata (statistics, search queries
+        and paper count if statistics_only)
     """
-    final_result = {}
+    wanted = "pipeline_partial" if statistics_only else "pipeline_complete"
+    events = run_gap_finder_streaming(user_query)
+    try:
+        async for event in events:
+            if event["type"] == wanted:
+                return event["result"]
+    finally:
+        # Closing early stops the pipeline at the current stage
+        await events.aclose()
+    
+    return {}
+
+
+# =============================================================================
+# Batch Pipeline (offline bulk runs)
+# =============================================================================
+
+def _batch_row(custom_id: str, model: str, messages: list) -> dict:
+    """Build a JSON-mode Batch API row with the agents' sampling settings."""
+    return to_batch_row(
+        custom_id, model, messages,
+        temperature=LLM_TEMPERATURE, top_p=LLM_TOP_P, seed=LLM_SEED,
+        response_format={"type": "json_object"}
+    )
+
+
+async def run_gap_finder_batch(user_queries: list[str], poll_interval: float = 30.0) -> dict[str, dict]:
+    """
+    Run the gap finder for many domains through the OpenAI Batch API.
+    
+    Batched calls cost half as much but may take up to the 24h completion
+    window, so this is for offline sweeps only. Each LLM stage depends on
+    the previous one, so the run is three batches (planners, analyzers,
+    synthesizers) for all domains at once. Fetching and aggregation run
+    locally between the first two.
     
-    async for event in run_gap_finder_streaming(user_query):
-        if event.get("type") == "pipeline_complete":
-            final_result = event.get("result", {})
+    Args:
+        user_queries: Research domains or questions
+        poll_interval: Seconds between batch status checks
+        
+    Returns:
+        Dict mapping each query to the result run_gap_finder_pipeline() returns
+    """
+    user_queries = list(dict.fromkeys(user_queries))
+    
+    # Pass 1: query planners
+    responses = await run_batch(
+        [
+            _batch_row(f"{i}-planner", MODEL_PLANNER, build_planner_messages(user_query))
+            for i, user_query in enumerate(user_queries)
+        ],
+        poll_interval
+    )
     
-    return final_result
\ No newline at end of file
+    states = []
+    for i, user_query in enumerate(user_queries):
+        content = responses.get(f"{i}-planner", "")
+        plan = repair_json_response(content)
+        if plan and plan.get("search_queries"):
+            queries = plan["search_queries"]
+        else:
+            plan, queries = _fallback_query_plan(content, user_query)
+        states.append(GapFinderState(
+            user_query=user_query,
+            search_plan=plan,
+            search_queries=queries,
+            current_node="query_planner"
+        ))
+    
+    # Local stages: PUBMED_LIMITER paces the concurrent fetches
+    states = await asyncio.gather(*(data_fetcher_node(state) for state in states))
+    states = await asyncio.gather(*(aggregator_node(state) for state in states))
+    
+    # Pass 2: literature analyzers
+    rows = []
+    for i, state in enumerate(states):
+        stats = state.statistics
+        if stats and not stats.get("error"):
+            messages = await asyncio.to_thread(build_analyzer_messages, stats, state.user_query)
+            rows.append(_batch_row(f"{i}-analyzer", MODEL_ANALYZER, messages))
+        else:
+            state.analysis = {"error": "No statistics to analyze"}
+    
+    responses = await run_batch(rows, poll_interval) if rows else {}
+    for i, state in enumerate(states):
+        content = responses.get(f"{i}-analyzer")
+        if content is not None:
+            state.analysis = repair_json_response(content) or {"raw_analysis": content, "parse_error": True}
+    
+    # Pass 3: gap synthesizers
+    rows = []
+    for i, state in enumerate(states):
+        analysis = state.analysis
+        if analysis and not analysis.get("error"):
+            messages = await asyncio.to_thread(
+                build_synthesizer_messages, analysis, state.statistics, state.user_query
+            )
+            rows.append(_batch_row(f"{i}-synthesizer", MODEL_SYNTHESIZER, messages))
+        else:
+            state.gaps = {"error": "No analysis to synthesize"}
+    
+    responses = await run_batch(rows, poll_interval) if rows else {}
+    for i, state in enumerate(states):
+        content = responses.get(f"{i}-synthesizer")
+        if content is not None:
+            state.gaps = repair_json_response(content) or {"raw_synthesis": content, "parse_error": True}
+    
+    return {
+        state.user_query: {
+            "gaps": state.gaps,
+            "statistics": {
+                "total_papers": state.paper_count,
+                "queries_used": len(state.search_queries)
+            }
+        }
+        for state in states
+    }
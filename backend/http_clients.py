@@ -0,0 +1,75 @@
+"""
+Shared HTTP clients.
+
+One connection pool per upstream so keep-alive TCP/TLS sessions are reused
+across agents and requests instead of being rebuilt per call. Both clients
+speak HTTP/2, so concurrent calls and streams multiplex over a single
+connection per host.
+"""
+
+from typing import Optional
+
+import httpx
+
+from config import OPENALEX_EMAIL
+
+
+# =============================================================================
+# OpenAI
+# =============================================================================
+
+_openai_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_openai_http_client() -> httpx.AsyncClient:
+    """Get the process-wide httpx client used by every ChatOpenAI instance."""
+    global _openai_http_client
+    if _openai_http_client is None or _openai_http_client.is_closed:
+        _openai_http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=httpx.Timeout(120.0, connect=10.0)
+        )
+    return _openai_http_client
+
+
+# =============================================================================
+# Literature APIs (PubMed, OpenAlex)
+# =============================================================================
+
+_api_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_api_http_client() -> httpx.AsyncClient:
+    """Get the process-wide httpx client used by the PubMed and OpenAlex clients."""
+    global _api_http_client
+    if _api_http_client is None or _api_http_client.is_closed:
+        _api_http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=60.0
+            ),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            headers={
+                # efetch XML and OpenAlex JSON compress ~5x
+                "Accept-Encoding": "gzip",
+                "User-Agent": f"research-gap-finder (mailto:{OPENALEX_EMAIL})"
+            }
+        )
+    return _api_http_client
+
+
+# =============================================================================
+# Lifecycle
+# =============================================================================
+
+async def close_http_clients() -> None:
+    """Close all shared clients. Call once on application shutdown."""
+    global _openai_http_client, _api_http_client
+    for client in (_openai_http_client, _api_http_client):
+        if client is not None:
+            await client.aclose()
+    _openai_http_client = None
+    _api_http_client = None
@@ -0,0 +1,104 @@
+"""
+Abstract Digest.
+
+Extractive compression of abstracts for LLM prompts. Instead of a raw
+character prefix (mostly background boilerplate, cut mid-sentence), keeps
+the whole sentences that carry findings - numbers, effect sizes, and
+result/conclusion language - in their original order.
+No LLM - regex heuristics only.
+"""
+
+import re
+
+
+# Sentence boundary: terminal punctuation followed by whitespace and a capital/digit
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9])")
+
+# Structured-abstract labels as joined by xml_parser ("RESULTS: ...")
+_LABEL_RE = re.compile(r"^([A-Z][A-Za-z ]{2,30}):\s+")
+
+# Numbers, percentages, and statistical reporting
+_NUMERIC_RE = re.compile(r"\d+(?:\.\d+)?\s*%|\bp\s*[<=>]|\b(?:CI|OR|RR|HR)\b|\d")
+
+_FINDING_RE = re.compile(
+    r"\b(?:associated|increase[ds]?|decrease[ds]?|reduc(?:ed|tion)|improv(?:ed|ement)|"
+    r"significant(?:ly)?|effective|effect|found|showed|suggests?|indicates?|compared)\b",
+    re.IGNORECASE
+)
+
+# Section label -> score bonus; findings beat background
+_SECTION_WEIGHTS = {
+    "results": 3,
+    "findings": 3,
+    "conclusion": 2,
+    "conclusions": 2,
+    "interpretation": 2,
+    "methods": 1,
+    "design": 1,
+    "participants": 1,
+    "background": -2,
+    "introduction": -2,
+    "context": -2,
+}
+
+
+def _split_sentences(abstract: str) -> list[tuple[str, str]]:
+    """Split into (section label, sentence) pairs with labels stripped from the text."""
+    sentences = []
+    section = ""
+    for sentence in _SENTENCE_SPLIT_RE.split(abstract.strip()):
+        match = _LABEL_RE.match(sentence)
+        if match:
+            section = match.group(1).lower()
+            sentence = sentence[match.end():]
+        if sentence:
+            sentences.append((section, sentence))
+    return sentences
+
+
+def _score(section: str, sentence: str) -> int:
+    score = _SECTION_WEIGHTS.get(section, 0)
+    if _NUMERIC_RE.search(sentence):
+        score += 2
+    if _FINDING_RE.search(sentence):
+        score += 1
+    return score
+
+
+def digest(abstract: str, max_chars: int = 300) -> str:
+    """
+    Compress an abstract to its most informative sentences.
+
+    Args:
+        abstract: Full abstract text
+        max_chars: Upper bound on the digest length
+
+    Returns:
+        Highest-scoring whole sentences in original order, or a word-boundary
+        truncation when not even one sentence fits
+    """
+    if len(abstract) <= max_chars:
+        return abstract
+
+    sentences = _split_sentences(abstract)
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: _score(*sentences[i]),
+        reverse=True
+    )
+
+    chosen = []
+    used = 0
+    for i in ranked:
+        if chosen and _score(*sentences[i]) < 0:
+            break  # Leftover room is not worth spending on background
+        length = len(sentences[i][1]) + (1 if chosen else 0)
+        if used + length <= max_chars:
+            chosen.append(i)
+            used += length
+
+    if not chosen:
+        best = sentences[ranked[0]][1] if sentences else abstract
+        return best[:max_chars - 3].rsplit(" ", 1)[0] + "..."
+
+    return " ".join(sentences[i][1] for i in sorted(chosen))
@@ -5,158 +5,238 @@ Builds frequency distributions, co-occurrence matrices, and identifies sparse ce
 No LLM - pure Python statistics.
 """
 
-from collections import Counter
 from typing import Optional
 import random
+
+import numpy as np
+
 from .mesh_mapper import (
     POPULATION_CATEGORIES,
     INTERVENTION_CATEGORIES,
     SETTING_CATEGORIES,
     OUTCOME_CATEGORIES,
     STUDY_TYPE_CATEGORIES,
+    DIMENSION_CATEGORIES,
+    CATEGORY_IDS,
     get_dimension_display_name
 )
+from .abstract_digest import digest
+
+
+# paper_categories key for each PICO dimension, and back
+DIMENSION_KEYS = {
+    "population": "populations",
+    "intervention": "interventions",
+    "setting": "settings",
+    "outcome": "outcomes",
+    "study_type": "study_types",
+}
+_KEY_DIMENSIONS = {key: dimension for dimension, key in DIMENSION_KEYS.items()}
+
+
+def _category_masks(rows: np.ndarray, ids: np.ndarray, n_papers: int, n_categories: int) -> np.ndarray:
+    """Pack each paper's category ids into uint64 bitmask words (bit id % 64 of word id // 64)."""
+    masks = np.zeros((n_papers, (n_categories + 63) // 64), dtype=np.uint64)
+    np.bitwise_or.at(masks, (rows, ids >> 6), np.left_shift(np.uint64(1), (ids & 63).astype(np.uint64)))
+    return masks
+
+
+def _unpack_masks(masks: np.ndarray, n_categories: int) -> np.ndarray:
+    """Expand bitmask words back into a paper x category 0/1 incidence matrix."""
+    bits = np.unpackbits(masks.astype("<u8").view(np.uint8), axis=1, bitorder="little")
+    return bits[:, :n_categories].astype(np.int32)
 
 
 def aggregate_papers(papers: list[dict]) -> dict:
     """
     Aggregate papers into frequency distributions across PICO dimensions.
     
+    Categories are encoded as their CATEGORY_IDS integers, so counting is a
+    bincount and co-occurrence a matrix product rather than string hashing.
+    Categories missing from CATEGORY_IDS (e.g. from records cached under an
+    older mapping) are skipped.
+    
     Args:
         papers: List of parsed paper dictionaries with 'pico' field
         
     Returns:
         Dictionary with counts, matrices, and computed statistics
     """
-    # Initialize counters
-    population_counts = Counter()
-    intervention_counts = Counter()
-    setting_counts = Counter()
-    outcome_counts = Counter()
-    study_type_counts = Counter()
-    year_counts = Counter()
-    
-    # Track which papers have which categories for co-occurrence
-    paper_categories = []
-    
-    for paper in papers:
-        pico = paper.get("pico", {})
+    years = []
+    
+    # Flattened (paper index, category id) pairs per dimension
+    paper_rows = {dimension: [] for dimension in CATEGORY_IDS}
+    category_ids = {dimension: [] for dimension in CATEGORY_IDS}
+    
+    # Bound methods resolved once rather than per paper and dimension
+    dimension_sinks = [
+        (dimension, ids.get, category_ids[dimension].extend, paper_rows[dimension].extend)
+        for dimension, ids in CATEGORY_IDS.items()
+    ]
+    add_year = years.append
+    
+    for i, paper in enumerate(papers):
+        paper_get = paper.get
+        pico_get = (paper_get("pico") or {}).get
         
-        # Count each dimension
-        for cat in pico.get("population", []):
-            population_counts[cat] += 1
-        for cat in pico.get("intervention", []):
-            intervention_counts[cat] += 1
-        for cat in pico.get("setting", []):
-            setting_counts[cat] += 1
-        for cat in pico.get("outcome", []):
-            outcome_counts[cat] += 1
-        for cat in pico.get("study_type", []):
-            study_type_counts[cat] += 1
+        for dimension, category_id, extend_ids, extend_rows in dimension_sinks:
+            cats = pico_get(dimension)
+            if cats:
+                found = [cat_id for cat_id in map(category_id, cats) if cat_id is not None]
+                extend_ids(found)
+                extend_rows([i] * len(found))
         
-        # Count years
-        year = paper.get("year")
+        year = paper_get("year")
         if year:
-            year_counts[str(year)] += 1
-        
-        # Store for co-occurrence analysis
-        paper_categories.append({
-            "populations": set(pico.get("population", [])),
-            "interventions": set(pico.get("intervention", [])),
-            "outcomes": set(pico.get("outcome", [])),
-            "settings": set(pico.get("setting", [])),
-            "study_types": set(pico.get("study_type", []))
-        })
+            add_year(year)
     
     total = len(papers)
     
+    # Years span a few decades at most - bincount over offsets from the earliest.
+    # Keys are ints in ascending order, so consumers never sort year strings.
+    year_counts = {}
+    if years:
+        years = np.array(years, dtype=np.int64)
+        first_year = int(years.min())
+        year_counts = {
+            first_year + offset: count
+            for offset, count in enumerate(np.bincount(years - first_year).tolist())
+            if count
+        }
+    
+    counts = {}
+    paper_categories = {}
+    for dimension, categories in DIMENSION_CATEGORIES.items():
+        ids = np.array(category_ids[dimension], dtype=np.intp)
+        dimension_counts = np.bincount(ids, minlength=len(categories)).tolist()
+        counts[dimension] = {cat: count for cat, count in zip(categories, dimension_counts) if count}
+        
+        # One bitmask per paper (8 bytes per 64 categories); a category listed
+        # twice on a paper sets the same bit, so it co-occurs once
+        paper_categories[DIMENSION_KEYS[dimension]] = _category_masks(
+            np.array(paper_rows[dimension], dtype=np.intp), ids, total, len(categories)
+        )
+    
     return {
         "total_papers": total,
-        "population_counts": dict(population_counts),
-        "intervention_counts": dict(intervention_counts),
-        "setting_counts": dict(setting_counts),
-        "outcome_counts": dict(outcome_counts),
-        "study_type_counts": dict(study_type_counts),
-        "year_counts": dict(year_counts),
+        "population_counts": counts["population"],
+        "intervention_counts": counts["intervention"],
+        "setting_counts": counts["setting"],
+        "outcome_counts": counts["outcome"],
+        "study_type_counts": counts["study_type"],
+        "year_counts": year_counts,
         "paper_categories": paper_categories  # For co-occurrence matrix
     }
 
 
 def build_cooccurrence_matrix(
-    paper_categories: list[dict],
+    paper_categories: dict[str, np.ndarray],
     dim1: str = "populations",
     dim2: str = "interventions"
-) -> dict[str, dict[str, int]]:
+) -> np.ndarray:
     """
     Build co-occurrence matrix between two dimensions.
     
     Args:
-        paper_categories: List of category sets per paper
+        paper_categories: Per-paper category bitmasks per dimension key
         dim1: First dimension key (e.g., "populations")
         dim2: Second dimension key (e.g., "interventions")
         
     Returns:
-        Nested dict: matrix[dim1_category][dim2_category] = count
+        Dense count matrix: matrix[dim1_category_id, dim2_category_id] = count,
+        with ids from CATEGORY_IDS
     """
-    matrix = {}
+    incidence1 = _unpack_masks(paper_categories[dim1], len(DIMENSION_CATEGORIES[_KEY_DIMENSIONS[dim1]]))
+    incidence2 = _unpack_masks(paper_categories[dim2], len(DIMENSION_CATEGORIES[_KEY_DIMENSIONS[dim2]]))
+    return incidence1.T @ incidence2
+
+
+def build_cooccurrence_matrices(
+    paper_categories: dict[str, np.ndarray],
+    pairs: list[tuple[str, str]]
+) -> dict[tuple[str, str], np.ndarray]:
+    """
+    Build co-occurrence matrices for several dimension pairs together.
     
-    for paper_cats in paper_categories:
-        cats1 = paper_cats.get(dim1, set())
-        cats2 = paper_cats.get(dim2, set())
+    Each dimension's bitmasks are unpacked once and shared by every pair
+    that uses it, instead of once per build_cooccurrence_matrix() call.
+    
+    Args:
+        paper_categories: Per-paper category bitmasks per dimension key
+        pairs: (dim1, dim2) dimension key pairs, e.g. ("populations", "outcomes")
         
-        for c1 in cats1:
-            if c1 not in matrix:
-                matrix[c1] = Counter()
-            for c2 in cats2:
-                matrix[c1][c2] += 1
-    
-    # Convert Counters to dicts
-    return {k: dict(v) for k, v in matrix.items()}
+    Returns:
+        Dict mapping each pair to its matrix, as from build_cooccurrence_matrix
+    """
+    incidence = {
+        key: _unpack_masks(paper_categories[key], len(DIMENSION_CATEGORIES[_KEY_DIMENSIONS[key]]))
+        for key in dict.fromkeys(key for pair in pairs for key in pair)
+    }
+    return {(dim1, dim2): incidence[dim1].T @ incidence[dim2] for dim1, dim2 in pairs}
 
 
 def find_sparse_cells(
-    matrix: dict[str, dict[str, int]],
+    matrix: np.ndarray,
     dim1_categories: list[str],
     dim2_categories: list[str],
-    threshold: int = 3
+    threshold: int = 3,
+    dim1: str = "population",
+    dim2: str = "intervention",
+    limit: Optional[int] = None
 ) -> list[dict]:
     """
     Find cells in co-occurrence matrix with counts below threshold.
     
     Args:
         matrix: Co-occurrence matrix from build_cooccurrence_matrix
-        dim1_categories: All possible categories for dimension 1
-        dim2_categories: All possible categories for dimension 2
+        dim1_categories: Categories to check for dimension 1
+        dim2_categories: Categories to check for dimension 2
         threshold: Papers below this count = sparse
+        dim1: PICO dimension of the matrix rows (e.g., "population")
+        dim2: PICO dimension of the matrix columns (e.g., "intervention")
+        limit: Return only the first this many cells
         
     Returns:
-        List of sparse cell dicts with category names and counts
+        List of sparse cell dicts with category names and counts; categories
+        missing from CATEGORY_IDS are skipped
     """
-    sparse = []
-    
-    for cat1 in dim1_categories:
-        for cat2 in dim2_categories:
-            count = matrix.get(cat1, {}).get(cat2, 0)
-            if count < threshold:
-                sparse.append({
-                    "dimension1": cat1,
-                    "dimension2": cat2,
-                    "count": count,
-                    "display": f"{get_dimension_display_name(cat1)} + {get_dimension_display_name(cat2)}"
-                })
-    
-    # Sort by count ascending (most sparse first)
-    sparse.sort(key=lambda x: x["count"])
-    
-    return sparse
+    dim1_categories = [cat for cat in dim1_categories if cat in CATEGORY_IDS[dim1]]
+    dim2_categories = [cat for cat in dim2_categories if cat in CATEGORY_IDS[dim2]]
+    ids1 = np.array([CATEGORY_IDS[dim1][cat] for cat in dim1_categories], dtype=np.intp)
+    ids2 = np.array([CATEGORY_IDS[dim2][cat] for cat in dim2_categories], dtype=np.intp)
+    
+    # Submatrix in (dim1_categories, dim2_categories) order; nonzero() walks it row-major
+    counts = matrix[np.ix_(ids1, ids2)]
+    rows, cols = np.nonzero(counts < threshold)
+    cell_counts = counts[rows, cols]
+    
+    # Sort by count ascending (most sparse first), ties in row-major order
+    if limit is not None and limit < len(cell_counts):
+        # Select the first `limit` without sorting the rest. Unique keys
+        # (count, then position) make the selection match the stable sort.
+        keys = cell_counts.astype(np.int64) * len(cell_counts) + np.arange(len(cell_counts))
+        order = np.argpartition(keys, limit)[:limit]
+        order = order[np.argsort(keys[order])]
+    else:
+        order = np.argsort(cell_counts, kind="stable")
+    
+    return [
+        {
+            "dimension1": dim1_categories[i],
+            "dimension2": dim2_categories[j],
+            "count": count,
+            "display": f"{get_dimension_display_name(dim1_categories[i])} + {get_dimension_display_name(dim2_categories[j])}"
+        }
+        for i, j, count in zip(rows[order].tolist(), cols[order].tolist(), cell_counts[order].tolist())
+    ]
 
 
-def calculate_temporal_trends(year_counts: dict[str, int]) -> dict:
+def calculate_temporal_trends(year_counts: dict[int, int]) -> dict:
     """
     Calculate year-over-year trends and identify emerging/declining topics.
     
     Args:
-        year_counts: Dict mapping year to paper count
+        year_counts: Dict mapping year (int) to paper count
         
     Returns:
         Dict with trend analysis
@@ -164,32 +244,34 @@ def calculate_temporal_trends(year_counts: dict[str, int]) -> dict:
     if not year_counts:
         return {"trend": "insufficient_data", "changes": []}
     
-    # Sort years
-    sorted_years = sorted(year_counts.keys())
+    # Integer years sort numerically
+    sorted_years = sorted(year_counts)
     
     if len(sorted_years) < 2:
         return {"trend": "insufficient_data", "changes": []}
     
-    # Calculate year-over-year changes
-    changes = []
-    for i in range(1, len(sorted_years)):
-        prev_year = sorted_years[i-1]
-        curr_year = sorted_years[i]
-        prev_count = year_counts[prev_year]
-        curr_count = year_counts[curr_year]
-        
-        if prev_count > 0:
-            pct_change = ((curr_count - prev_count) / prev_count) * 100
-        else:
-            pct_change = 100 if curr_count > 0 else 0
-        
-        changes.append({
+    # Year-over-year changes for all consecutive pairs at once
+    counts = np.array([year_counts[year] for year in sorted_years], dtype=np.int64)
+    prev_counts, curr_counts = counts[:-1], counts[1:]
+    pct_changes = np.where(
+        prev_counts > 0,
+        (curr_counts - prev_counts) / np.maximum(prev_counts, 1) * 100,
+        np.where(curr_counts > 0, 100, 0)
+    )
+    
+    changes = [
+        {
             "from_year": prev_year,
             "to_year": curr_year,
             "from_count": prev_count,
             "to_count": curr_count,
             "pct_change": round(pct_change, 1)
-        })
+        }
+        for prev_year, curr_year, prev_count, curr_count, pct_change in zip(
+            sorted_years, sorted_years[1:],
+            prev_counts.tolist(), curr_counts.tolist(), pct_changes.tolist()
+        )
+    ]
     
     # Determine overall trend
     recent_changes = changes[-3:] if len(changes) >= 3 else changes
@@ -206,8 +288,8 @@ def calculate_temporal_trends(year_counts: dict[str, int]) -> dict:
         "trend": trend,
         "avg_recent_change": round(avg_change, 1),
         "changes": changes,
-        "peak_year": max(year_counts.keys(), key=lambda y: year_counts[y]),
-        "peak_count": max(year_counts.values())
+        "peak_year": sorted_years[int(np.argmax(counts))],
+        "peak_count": int(counts.max())
     }
 
 
@@ -236,42 +318,45 @@ def sample_abstracts(
     if strategy == "random":
         return random.sample(with_abstracts, n)
     
-    # Diverse sampling: try to get papers from different categories
+    # Diverse sampling: try to get papers from different categories.
+    # Papers are tracked by index with one "used" mask; the study type
+    # groups are disjoint, so only the fill step needs to consult it.
     sampled = []
-    sampled_pmids = set()
+    used = np.zeros(len(with_abstracts), dtype=bool)
     
     # Group by study type first (want mix of RCTs, reviews, observational)
     by_study_type = {}
-    for paper in with_abstracts:
-        study_types = paper.get("pico", {}).get("study_type", ["unknown"])
+    for i, paper in enumerate(with_abstracts):
+        study_types = (paper.get("pico") or {}).get("study_type", ())
         st = study_types[0] if study_types else "unknown"
-        if st not in by_study_type:
-            by_study_type[st] = []
-        by_study_type[st].append(paper)
+        by_study_type.setdefault(st, []).append(i)
     
     # Sample proportionally from each study type
     per_type = max(1, n // len(by_study_type)) if by_study_type else n
     
-    for study_type, type_papers in by_study_type.items():
-        available = [p for p in type_papers if p.get("pmid") not in sampled_pmids]
-        to_sample = min(per_type, len(available))
-        if to_sample > 0:
-            selected = random.sample(available, to_sample)
-            for p in selected:
-                sampled.append(p)
-                sampled_pmids.add(p.get("pmid"))
+    for type_indices in by_study_type.values():
+        selected = random.sample(type_indices, min(per_type, len(type_indices)))
+        used[selected] = True
+        sampled.extend(with_abstracts[i] for i in selected)
     
     # Fill remaining slots randomly
     remaining = n - len(sampled)
     if remaining > 0:
-        available = [p for p in with_abstracts if p.get("pmid") not in sampled_pmids]
+        available = np.flatnonzero(~used).tolist()
         if available:
             additional = random.sample(available, min(remaining, len(available)))
-            sampled.extend(additional)
+            sampled.extend(with_abstracts[i] for i in additional)
     
     return sampled[:n]
 
 
+def _percentages(counts: dict[str, int], total: int) -> np.ndarray:
+    """Percent of total papers for each count, in counts order (all zero if total is 0)."""
+    if total <= 0:
+        return np.zeros(len(counts), dtype=np.int64)
+    return np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) / total * 100
+
+
 def compute_distribution_percentages(counts: dict[str, int], total: int) -> dict:
     """
     Convert counts to percentages.
@@ -281,15 +366,20 @@ def compute_distribution_percentages(counts: dict[str, int], total: int) -> dict
         total: Total paper count
         
     Returns:
-        Dict with count and percentage for each category
+        Dict with count, percentage, and the preformatted prompt line
+        for each category
     """
     result = {}
-    for cat, count in counts.items():
-        pct = (count / total * 100) if total > 0 else 0
+    for (cat, count), pct in zip(counts.items(), _percentages(counts, total).tolist()):
+        # Python's round() (correctly rounded) so values match the prompt text exactly
+        pct = round(pct, 1)
+        display_name = get_dimension_display_name(cat)
         result[cat] = {
             "count": count,
-            "percentage": round(pct, 1),
-            "display_name": get_dimension_display_name(cat)
+            "percentage": pct,
+            "display_name": display_name,
+            # Rendered once here so prompt formatting is a plain join
+            "line": f"  - {display_name}: {count} papers ({pct}%)"
         }
     return result
 
@@ -310,17 +400,22 @@ def identify_understudied(
     Returns:
         List of understudied category dicts
     """
-    understudied = []
-    
-    for cat, count in counts.items():
-        pct = (count / total * 100) if total > 0 else 0
-        if pct < threshold_pct:
-            understudied.append({
-                "category": cat,
-                "display_name": get_dimension_display_name(cat),
-                "count": count,
-                "percentage": round(pct, 1)
-            })
+    pcts = _percentages(counts, total)
+    selected = np.nonzero(pcts < threshold_pct)[0].tolist()
+    if not selected:
+        return []
+    
+    categories = list(counts)
+    pcts = pcts.tolist()
+    understudied = [
+        {
+            "category": categories[i],
+            "display_name": get_dimension_display_name(categories[i]),
+            "count": counts[categories[i]],
+            "percentage": round(pcts[i], 1)
+        }
+        for i in selected
+    ]
     
     # Sort by percentage ascending (most understudied first)
     understudied.sort(key=lambda x: x["percentage"])
@@ -343,15 +438,14 @@ def generate_statistics_summary(papers: list[dict]) -> dict:
     total = agg["total_papers"]
     
     # Co-occurrence matrices
-    pop_interv_matrix = build_cooccurrence_matrix(
-        agg["paper_categories"], "populations", "interventions"
-    )
-    pop_outcome_matrix = build_cooccurrence_matrix(
-        agg["paper_categories"], "populations", "outcomes"
-    )
-    interv_outcome_matrix = build_cooccurrence_matrix(
-        agg["paper_categories"], "interventions", "outcomes"
-    )
+    matrices = build_cooccurrence_matrices(agg["paper_categories"], [
+        ("populations", "interventions"),
+        ("populations", "outcomes"),
+        ("interventions", "outcomes"),
+    ])
+    pop_interv_matrix = matrices["populations", "interventions"]
+    pop_outcome_matrix = matrices["populations", "outcomes"]
+    interv_outcome_matrix = matrices["interventions", "outcomes"]
     
     # Find sparse cells (potential gaps)
     # Get categories that actually appear in data
@@ -360,7 +454,7 @@ def generate_statistics_summary(papers: list[dict]) -> dict:
     active_outcomes = list(agg["outcome_counts"].keys())
     
     sparse_pop_interv = find_sparse_cells(
-        pop_interv_matrix, active_populations, active_interventions, threshold=3
+        pop_interv_matrix, active_populations, active_interventions, threshold=3, limit=20
     )
     
     # Temporal trends
@@ -377,8 +471,8 @@ def generate_statistics_summary(papers: list[dict]) -> dict:
     return {
         "total_papers": total,
         "year_range": {
-            "min": min(agg["year_counts"].keys()) if agg["year_counts"] else None,
-            "max": max(agg["year_counts"].keys()) if agg["year_counts"] else None
+            "min": min(agg["year_counts"]) if agg["year_counts"] else None,
+            "max": max(agg["year_counts"]) if agg["year_counts"] else None
         },
         "distributions": {
             "population": compute_distribution_percentages(agg["population_counts"], total),
@@ -388,7 +482,7 @@ def generate_statistics_summary(papers: list[dict]) -> dict:
             "study_type": compute_distribution_percentages(agg["study_type_counts"], total)
         },
         "temporal_trends": temporal,
-        "sparse_combinations": sparse_pop_interv[:20],  # Top 20 gaps
+        "sparse_combinations": sparse_pop_interv,  # Top 20 gaps
         "understudied": {
             "populations": understudied_pops,
             "interventions": understudied_intervs,
@@ -398,7 +492,7 @@ def generate_statistics_summary(papers: list[dict]) -> dict:
             {
                 "pmid": p.get("pmid"),
                 "title": p.get("title"),
-                "abstract": p.get("abstract", "")[:500],  # Truncate for LLM
+                "abstract": digest(p.get("abstract", ""), 500),  # Key sentences for LLM
                 "year": p.get("year"),
                 "study_type": p.get("pico", {}).get("study_type", [])
             }
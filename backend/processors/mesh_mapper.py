@@ -12,6 +12,9 @@ Maps PubMed MeSH (Medical Subject Headings) terms to structured PICO dimensions:
 No LLM - pure dictionary lookups.
 """
 
+import sys
+from functools import lru_cache
+
 # =============================================================================
 # PICO Dimension Mappings
 # =============================================================================
@@ -203,18 +206,24 @@ MESH_TO_PICO = {
     "Pilot Projects": ("study_type", "pilot"),
 }
 
+# Interned keys: the parser interns descriptor names too, so lookups of the
+# same term match by identity and each distinct term is stored once
+MESH_TO_PICO = {sys.intern(term): mapping for term, mapping in MESH_TO_PICO.items()}
+
 
 # =============================================================================
 # Reverse Lookups
 # =============================================================================
 
+# Categories per dimension, built in one pass over the mapping
+_DIMENSION_CATEGORY_SETS: dict[str, set[str]] = {}
+for _dim, _cat in MESH_TO_PICO.values():
+    _DIMENSION_CATEGORY_SETS.setdefault(_dim, set()).add(_cat)
+
+
 def get_all_categories(dimension: str) -> list[str]:
     """Get all unique category values for a given dimension."""
-    categories = set()
-    for mesh_term, (dim, cat) in MESH_TO_PICO.items():
-        if dim == dimension:
-            categories.add(cat)
-    return sorted(list(categories))
+    return sorted(_DIMENSION_CATEGORY_SETS.get(dimension, ()))
 
 
 # Pre-computed category lists
@@ -224,6 +233,20 @@ SETTING_CATEGORIES = get_all_categories("setting")
 OUTCOME_CATEGORIES = get_all_categories("outcome")
 STUDY_TYPE_CATEGORIES = get_all_categories("study_type")
 
+# Dense integer id of each category within its dimension (its index in the
+# sorted list above), so counts can live in arrays instead of string-keyed dicts
+DIMENSION_CATEGORIES = {
+    "population": POPULATION_CATEGORIES,
+    "intervention": INTERVENTION_CATEGORIES,
+    "setting": SETTING_CATEGORIES,
+    "outcome": OUTCOME_CATEGORIES,
+    "study_type": STUDY_TYPE_CATEGORIES,
+}
+CATEGORY_IDS = {
+    dimension: {category: i for i, category in enumerate(categories)}
+    for dimension, categories in DIMENSION_CATEGORIES.items()
+}
+
 
 # =============================================================================
 # Mapping Functions
@@ -260,16 +283,15 @@ def map_mesh_terms(mesh_terms: list[str]) -> dict[str, list[str]]:
         "study_type": []
     }
     
-    for term in mesh_terms:
-        mapping = MESH_TO_PICO.get(term)
-        if mapping:
-            dimension, category = mapping
-            if category not in result[dimension]:
-                result[dimension].append(category)
+    # dict.fromkeys dedupes (dimension, category) pairs in one hashed pass and
+    # keeps first-seen order (callers take e.g. the first study type)
+    for dimension, category in dict.fromkeys(filter(None, map(MESH_TO_PICO.get, mesh_terms))):
+        result[dimension].append(category)
     
     return result
 
 
+@lru_cache(maxsize=None)
 def get_dimension_display_name(category: str) -> str:
-    """Convert category slug to display name."""
+    """Convert category slug to display name (cached - the slug set is fixed)."""
     return category.replace("_", " ").title()
\ No newline at end of file
@@ -5,71 +5,224 @@ Extracts structured data from PubMed efetch XML responses.
 No LLM - pure XML parsing.
 """
 
-import xml.etree.ElementTree as ET
-from typing import Optional
+import io
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Iterator, Optional
+from lxml import etree as ET
 from .mesh_mapper import map_mesh_terms, MESH_TO_PICO
 
 
-def parse_pubmed_xml(xml_string: str) -> list[dict]:
+# libxml2 options for every document parse. recover=True salvages truncated
+# or slightly malformed input; entities are not expanded, which PubMed's
+# XML never needs.
+_PARSE_OPTIONS = dict(
+    huge_tree=True,
+    recover=True,
+    remove_blank_text=True,
+    collect_ids=False,
+    resolve_entities=False
+)
+
+# Compiled once; paths are anchored at PubmedArticle per the PubMed DTD, so
+# each lookup walks a single branch instead of the whole article subtree.
+# text() results are plain strings (smart strings would pin their element).
+_ARTICLE = "./MedlineCitation/Article"
+_XP_PMID = ET.XPath("./MedlineCitation/PMID/text()", smart_strings=False)
+_XP_TITLE = ET.XPath(f"{_ARTICLE}/ArticleTitle")
+_XP_ABSTRACT = ET.XPath(f"{_ARTICLE}/Abstract/AbstractText")
+_XP_PUB_YEAR = ET.XPath(f"{_ARTICLE}/Journal/JournalIssue/PubDate/Year/text()", smart_strings=False)
+_XP_ARTICLE_YEAR = ET.XPath(f"{_ARTICLE}/ArticleDate/Year/text()", smart_strings=False)
+_XP_MEDLINE_DATE = ET.XPath(f"{_ARTICLE}/Journal/JournalIssue/PubDate/MedlineDate/text()", smart_strings=False)
+_XP_JOURNAL_TITLE = ET.XPath(f"{_ARTICLE}/Journal/Title/text()", smart_strings=False)
+_XP_JOURNAL_ABBREV = ET.XPath(f"{_ARTICLE}/Journal/ISOAbbreviation/text()", smart_strings=False)
+_XP_AUTHORS = ET.XPath(f"{_ARTICLE}/AuthorList/Author")
+_XP_MESH = ET.XPath("./MedlineCitation/MeshHeadingList/MeshHeading/DescriptorName/text()", smart_strings=False)
+_XP_PUBTYPES = ET.XPath(f"{_ARTICLE}/PublicationTypeList/PublicationType/text()", smart_strings=False)
+# The article's own ids only - ReferenceList entries carry ArticleIds too
+_XP_DOI = ET.XPath('./PubmedData/ArticleIdList/ArticleId[@IdType="doi"]/text()', smart_strings=False)
+
+# Publication types that map to a PICO category ("Randomized Controlled Trial", ...)
+_MESH_PICO_KEYS = frozenset(MESH_TO_PICO)
+
+# First 4-digit year in a MedlineDate such as "2023 Jan-Feb"
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+
+# Punctuation dropped when comparing titles for deduplication
+_TITLE_PUNCT_RE = re.compile(r"[^\w\s]")
+
+# Prefixes stripped so every spelling of a DOI compares equal
+_DOI_PREFIXES = ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "http://dx.doi.org/", "doi:")
+
+# Threads for parsing concatenated documents in parse_pubmed_xml()
+PARSE_MAX_WORKERS = 8
+
+# Near-duplicate titles: share this fraction of the shorter title's words
+# (a "[in German]" suffix or reworded punctuation still matches), with enough
+# words that short generic titles never match by containment alone
+FUZZY_TITLE_OVERLAP = 0.9
+FUZZY_TITLE_MIN_WORDS = 4
+
+
+def parse_pubmed_xml(xml_data: str | bytes) -> list[dict]:
     """
     Parse PubMed XML and extract structured paper data.
     
     Args:
-        xml_string: Raw XML from PubMed efetch
+        xml_data: Raw XML from PubMed efetch; bytes are parsed without decoding
         
     Returns:
         List of paper dictionaries with standardized fields
     """
-    papers = []
+    documents = _split_documents(xml_data)
+    if len(documents) == 1:
+        return list(_iter_single_xml(documents[0]))
+    
+    # Independent documents parse in parallel - lxml releases the GIL while
+    # libxml2 tokenizes. map() keeps document order.
+    with ThreadPoolExecutor(max_workers=min(PARSE_MAX_WORKERS, len(documents))) as pool:
+        return [
+            paper
+            for papers in pool.map(lambda document: list(_iter_single_xml(document)), documents)
+            for paper in papers
+        ]
+
+
+def iter_pubmed_xml(xml_data: str | bytes) -> Iterator[dict]:
+    """
+    Parse PubMed XML lazily, yielding each paper as its article is read.
+    
+    Callers that consume papers one at a time (deduplicate_papers, a
+    writer) never hold the full list.
+    
+    Args:
+        xml_data: Raw XML from PubMed efetch; bytes are parsed without decoding
+        
+    Yields:
+        Paper dictionaries with standardized fields
+    """
+    for document in _split_documents(xml_data):
+        yield from _iter_single_xml(document)
+
+
+def _split_documents(xml_data: str | bytes) -> list[bytes]:
+    """Split concatenated XML documents (one per efetch batch) apart, as bytes."""
+    if isinstance(xml_data, str):
+        # The only encode on the parse path; lxml rejects str input that
+        # carries an encoding declaration, and bytes skip a decode anyway
+        xml_data = xml_data.encode("utf-8")
+    declaration = b"<?xml"
+    
+    # Each document opens with an XML declaration. Locate the later ones with
+    # find() - for the usual single document that is one scan and no copies.
+    starts = []
+    pos = xml_data.find(declaration, 1)
+    while pos != -1:
+        starts.append(pos)
+        pos = xml_data.find(declaration, pos + len(declaration))
     
-    # Handle multiple XML documents concatenated together
-    # Wrap in a root element if needed
-    if xml_string.count("<?xml") > 1:
-        # Multiple XML docs, need to handle each separately
-        xml_parts = xml_string.split("<?xml")
-        for part in xml_parts:
-            if part.strip():
-                if not part.startswith("<?xml"):
-                    part = "<?xml" + part
-                papers.extend(_parse_single_xml(part))
-    else:
-        papers = _parse_single_xml(xml_string)
+    if not starts:
+        return [xml_data]
     
-    return papers
+    bounds = [0, *starts, len(xml_data)]
+    return [xml_data[start:end] for start, end in zip(bounds, bounds[1:])]
 
 
-def _parse_single_xml(xml_string: str) -> list[dict]:
-    """Parse a single PubMed XML document."""
-    papers = []
+def _iter_single_xml(source: bytes | BinaryIO) -> Iterator[dict]:
+    """
+    Parse a single PubMed XML document in one streaming pass.
+    
+    Each PubmedArticle is parsed as soon as its end tag is read and then
+    discarded, together with any siblings already handled, so the tree
+    never holds more than about one article.
+    
+    Args:
+        source: Document bytes, or a binary file-like object to read it from
+        
+    Yields:
+        Paper dictionaries
+    """
+    if isinstance(source, bytes):
+        # Anything before the first tag (even whitespace) would put the XML
+        # declaration out of place, which recovery mode does not forgive
+        start_idx = source.find(b"<")
+        if start_idx > 0:
+            source = source[start_idx:]
+        source = io.BytesIO(source)
     
     try:
-        root = ET.fromstring(xml_string)
-    except ET.ParseError:
-        # Try to fix common XML issues
-        try:
-            # Remove any content before first <
-            start_idx = xml_string.find("<")
-            if start_idx > 0:
-                xml_string = xml_string[start_idx:]
-            root = ET.fromstring(xml_string)
-        except:
-            return []
+        for article in _fast_iter(ET.iterparse(source, events=("end",), tag="PubmedArticle", **_PARSE_OPTIONS)):
+            paper = _parse_article(article)
+            if paper:
+                yield paper
+    except ET.XMLSyntaxError:
+        # Empty or unrecoverable document; the articles read so far were yielded
+        pass
+
+
+class PubmedStreamParser:
+    """
+    Incremental parser for one PubMed efetch XML document.
+    
+    Feed response bytes as they arrive; each completed PubmedArticle is
+    parsed and then cleared, so memory holds roughly one article at a time
+    instead of the whole document.
+    """
+    
+    def __init__(self):
+        # Same libxml2 options as whole-document parses; only PubmedArticle
+        # end events are reported
+        self._parser = ET.XMLPullParser(events=("end",), tag="PubmedArticle", **_PARSE_OPTIONS)
     
-    # Find all PubmedArticle elements
-    for article in root.findall(".//PubmedArticle"):
-        paper = _parse_article(article)
-        if paper:
-            papers.append(paper)
+    def feed(self, chunk: bytes) -> list[dict]:
+        """
+        Consume a chunk of XML and return the papers it completed.
+        
+        Args:
+            chunk: Next bytes of the response body
+            
+        Returns:
+            Paper dictionaries for every PubmedArticle closed by this chunk
+        """
+        self._parser.feed(chunk)
+        papers = []
+        for elem in _fast_iter(self._parser.read_events()):
+            paper = _parse_article(elem)
+            if paper:
+                papers.append(paper)
+        return papers
+
+
+def _fast_iter(events: Iterator[tuple[str, ET._Element]]) -> Iterator[ET._Element]:
+    """
+    Yield each element from (event, element) pairs, then free it.
     
-    return papers
+    Once the consumer is done with an element it is cleared, and the
+    emptied siblings before it are detached from the parent, so the tree
+    stays at about one element however long the document is.
+    """
+    for _, elem in events:
+        yield elem
+        elem.clear(keep_tail=False)
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
 
 
-def _parse_article(article: ET.Element) -> Optional[dict]:
-    """Parse a single PubmedArticle element."""
+def _parse_article(article: ET._Element) -> Optional[dict]:
+    """Parse a single PubmedArticle element (None if it has no PMID or title)."""
+    
+    pmid = _XP_PMID(article)
+    title_elem = _XP_TITLE(article)
+    # Nothing to identify or show - skip before building the record
+    if not pmid and not title_elem:
+        return None
     
     paper = {
-        "pmid": None,
-        "title": None,
+        "pmid": pmid[0] if pmid else None,
+        "title": _get_text_content(title_elem[0]) if title_elem else None,
         "abstract": None,
         "year": None,
         "journal": None,
@@ -81,19 +234,9 @@ def _parse_article(article: ET.Element) -> Optional[dict]:
         "source": "pubmed"
     }
     
-    # PMID
-    pmid_elem = article.find(".//PMID")
-    if pmid_elem is not None:
-        paper["pmid"] = pmid_elem.text
-    
-    # Title
-    title_elem = article.find(".//ArticleTitle")
-    if title_elem is not None:
-        paper["title"] = _get_text_content(title_elem)
-    
     # Abstract
     abstract_parts = []
-    for abstract_text in article.findall(".//AbstractText"):
+    for abstract_text in _XP_ABSTRACT(article):
         label = abstract_text.get("Label", "")
         text = _get_text_content(abstract_text)
         if text:
@@ -105,27 +248,17 @@ def _parse_article(article: ET.Element) -> Optional[dict]:
     if abstract_parts:
         paper["abstract"] = " ".join(abstract_parts)
     
-    # Year - try multiple locations
+    # Year - try PubDate Year, then ArticleDate Year
     year = None
-    
-    # Try PubDate Year
-    pub_date_year = article.find(".//PubDate/Year")
-    if pub_date_year is not None and pub_date_year.text:
-        year = pub_date_year.text
-    
-    # Try ArticleDate Year
-    if not year:
-        article_date_year = article.find(".//ArticleDate/Year")
-        if article_date_year is not None and article_date_year.text:
-            year = article_date_year.text
+    years = _XP_PUB_YEAR(article) or _XP_ARTICLE_YEAR(article)
+    if years:
+        year = years[0]
     
     # Try MedlineDate (format like "2023 Jan-Feb")
     if not year:
-        medline_date = article.find(".//PubDate/MedlineDate")
-        if medline_date is not None and medline_date.text:
-            # Extract first 4-digit year
-            import re
-            year_match = re.search(r'\b(19|20)\d{2}\b', medline_date.text)
+        medline_date = _XP_MEDLINE_DATE(article)
+        if medline_date:
+            year_match = _YEAR_RE.search(medline_date[0])
             if year_match:
                 year = year_match.group(0)
     
@@ -135,106 +268,165 @@ def _parse_article(article: ET.Element) -> Optional[dict]:
         except ValueError:
             pass
     
-    # Journal
-    journal_elem = article.find(".//Journal/Title")
-    if journal_elem is not None:
-        paper["journal"] = journal_elem.text
-    else:
-        # Try ISOAbbreviation
-        journal_abbrev = article.find(".//Journal/ISOAbbreviation")
-        if journal_abbrev is not None:
-            paper["journal"] = journal_abbrev.text
+    # Journal - full title, else ISOAbbreviation. Interned like the other
+    # vocabulary fields below: a batch repeats a handful of journals.
+    journal = _XP_JOURNAL_TITLE(article) or _XP_JOURNAL_ABBREV(article)
+    if journal:
+        paper["journal"] = sys.intern(journal[0])
     
     # Authors
-    for author in article.findall(".//Author"):
-        last_name = author.find("LastName")
-        fore_name = author.find("ForeName")
-        initials = author.find("Initials")
-        
-        if last_name is not None:
-            name_parts = [last_name.text]
-            if fore_name is not None:
-                name_parts.append(fore_name.text)
-            elif initials is not None:
-                name_parts.append(initials.text)
-            paper["authors"].append(" ".join(name_parts))
-    
-    # MeSH Terms
-    for mesh_heading in article.findall(".//MeshHeading"):
-        descriptor = mesh_heading.find("DescriptorName")
-        if descriptor is not None and descriptor.text:
-            paper["mesh_terms"].append(descriptor.text)
-        
-        # Also get qualifiers for more context
-        for qualifier in mesh_heading.findall("QualifierName"):
-            if qualifier.text:
-                # Store as "Descriptor/Qualifier" for reference
-                pass  # Keep simple for now
-    
-    # Publication Types
-    for pub_type in article.findall(".//PublicationType"):
-        if pub_type.text:
-            paper["publication_types"].append(pub_type.text)
-            # Also check if it's in our mapping
-            if pub_type.text in MESH_TO_PICO:
-                paper["mesh_terms"].append(pub_type.text)
+    # Collective authors (CollectiveName, no LastName) are skipped
+    for author in _XP_AUTHORS(article):
+        last_name = author.findtext("LastName")
+        if not last_name:
+            continue
+        given = author.findtext("ForeName") or author.findtext("Initials")
+        paper["authors"].append(f"{last_name} {given}" if given else last_name)
+    
+    # MeSH Terms - "Humans", "Female", ... repeat across nearly every record
+    paper["mesh_terms"] = [sys.intern(term) for term in _XP_MESH(article)]
+    
+    # Publication Types ("Journal Article", "Review", ...)
+    for pub_type in _XP_PUBTYPES(article):
+        pub_type = sys.intern(pub_type)
+        paper["publication_types"].append(pub_type)
+        # Also check if it's in our mapping
+        if pub_type in _MESH_PICO_KEYS:
+            paper["mesh_terms"].append(pub_type)
     
     # DOI
-    for article_id in article.findall(".//ArticleId"):
-        if article_id.get("IdType") == "doi":
-            paper["doi"] = article_id.text
-            break
+    doi = _XP_DOI(article)
+    if doi:
+        paper["doi"] = doi[0]
     
-    # Map MeSH terms to PICO categories
-    paper["pico"] = map_mesh_terms(paper["mesh_terms"])
+    # Map MeSH terms to PICO categories. Records not yet MeSH-indexed keep
+    # the template's empty pico; consumers read it with .get()
+    if paper["mesh_terms"]:
+        paper["pico"] = map_mesh_terms(paper["mesh_terms"])
     
     return paper
 
 
-def _get_text_content(element: ET.Element) -> str:
+def _get_text_content(element: ET._Element) -> str:
     """Extract all text content from an element, including nested tags."""
-    texts = []
-    if element.text:
-        texts.append(element.text)
-    for child in element:
-        if child.text:
-            texts.append(child.text)
-        if child.tail:
-            texts.append(child.tail)
-    return " ".join(texts).strip()
-
-
-def deduplicate_papers(papers: list[dict]) -> list[dict]:
+    # Text and tails in document order, at any depth, without extra spaces
+    # ("H<sub>2</sub>O" reads "H2O"); comment text is not included
+    return "".join(element.itertext()).strip()
+
+
+def _normalize_title(title: str) -> str:
+    """Casefold a title and drop punctuation and repeated whitespace for matching."""
+    return " ".join(_TITLE_PUNCT_RE.sub("", title.casefold()).split())
+
+
+def _normalize_doi(doi: Optional[str]) -> str:
+    """Lowercase a DOI and drop any resolver-URL or "doi:" prefix."""
+    doi = (doi or "").strip().lower()
+    for prefix in _DOI_PREFIXES:
+        if doi.startswith(prefix):
+            return doi[len(prefix):]
+    return doi
+
+
+def _fill_missing(paper: dict, duplicate: dict):
+    """Copy fields that paper lacks (None or empty) from a duplicate record."""
+    for key, value in duplicate.items():
+        if value and not paper.get(key):
+            paper[key] = value
+
+
+def _metadata_score(paper: dict) -> int:
+    """How many of the optional fields worth keeping a duplicate for are present."""
+    return bool(paper.get("abstract")) + bool(paper.get("doi"))
+
+
+def _surnames(paper: dict) -> set[str]:
+    """Casefolded author surnames (names are stored "LastName ForeName")."""
+    return {author.split()[0].casefold() for author in paper.get("authors") or () if author}
+
+
+def _is_near_duplicate(words: frozenset, other_words: frozenset) -> bool:
+    """Token-set match: the shorter title's words nearly all appear in the other."""
+    shorter = min(len(words), len(other_words))
+    return (
+        shorter >= FUZZY_TITLE_MIN_WORDS
+        and len(words & other_words) >= FUZZY_TITLE_OVERLAP * shorter
+    )
+
+
+def deduplicate_papers(papers: Iterable[dict]) -> list[dict]:
     """
     Remove duplicate papers based on PMID or title.
     
+    Records sharing a DOI are merged first: the first keeps its place and
+    takes any fields it lacks from the others. Then PMID duplicates are
+    dropped, with no string work beyond the DOI key. Titles are then
+    normalized once per surviving paper. Two papers are the same work if
+    their titles match exactly, or if they share a year and an author
+    surname and their titles nearly match as word sets. The copy with more
+    metadata (abstract, DOI) is kept, in the first one's place.
+    
     Args:
-        papers: List of paper dictionaries
+        papers: Paper dictionaries; any iterable, e.g. iter_pubmed_xml()
         
     Returns:
-        Deduplicated list
+        Deduplicated list, in first-seen order
     """
+    # Pass 1: one record per DOI, then per PMID (papers with neither all survive)
+    seen_dois = {}
     seen_pmids = set()
-    seen_titles = set()
-    unique_papers = []
-    
+    survivors = []
     for paper in papers:
+        doi = _normalize_doi(paper.get("doi"))
+        if doi:
+            kept = seen_dois.get(doi)
+            if kept is not None:
+                _fill_missing(survivors[kept], paper)
+                continue
+        
         pmid = paper.get("pmid")
-        title = paper.get("title", "").lower().strip()
+        if pmid:
+            if pmid in seen_pmids:
+                continue
+            seen_pmids.add(pmid)
         
-        # Skip if we've seen this PMID
-        if pmid and pmid in seen_pmids:
+        if doi:
+            seen_dois[doi] = len(survivors)
+        survivors.append(paper)
+    
+    # Pass 2: normalized title -> position in unique_papers, plus per-year
+    # (words, surnames, position) entries for near-duplicate matching
+    seen_titles = {}
+    by_year = {}
+    unique_papers = []
+    for paper in survivors:
+        title = _normalize_title(paper.get("title") or "")
+        if not title:
+            unique_papers.append(paper)
             continue
         
-        # Skip if we've seen very similar title (exact match)
-        if title and title in seen_titles:
-            continue
+        kept = seen_titles.get(title)
+        if kept is None:
+            # Only same-year candidates are compared, which keeps this near linear
+            words = frozenset(title.split())
+            surnames = _surnames(paper)
+            candidates = by_year.setdefault(paper.get("year"), [])
+            if surnames:
+                kept = next(
+                    (
+                        position for other_words, other_surnames, position in candidates
+                        if surnames & other_surnames and _is_near_duplicate(words, other_words)
+                    ),
+                    None
+                )
         
-        if pmid:
-            seen_pmids.add(pmid)
-        if title:
-            seen_titles.add(title)
+        if kept is not None:
+            if _metadata_score(paper) > _metadata_score(unique_papers[kept]):
+                unique_papers[kept] = paper
+            continue
         
+        seen_titles[title] = len(unique_papers)
+        candidates.append((words, surnames, len(unique_papers)))
         unique_papers.append(paper)
     
     return unique_papers
@@ -0,0 +1,72 @@
+"""
+Server-Sent Events encoding.
+
+Agent output events fire once per streamed token, so their JSON envelope
+prefix is serialized once per (agent, phase) and only the content string
+is encoded per event. Everything else goes through event(). Events are
+returned as bytes, which StreamingResponse writes without re-encoding.
+coalesce() batches LLM tokens so one event carries several of them.
+"""
+
+import asyncio
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator
+
+import orjson
+
+from config import UI_PACING_ENABLED
+
+# coalesce() flushes after this many tokens or this many seconds
+COALESCE_MAX_TOKENS = 8
+COALESCE_MAX_DELAY = 0.025
+
+
+@lru_cache(maxsize=256)
+def _agent_event_prefix(agent: str, phase: str) -> bytes:
+    return (
+        b'data: {"agent":' + orjson.dumps(agent)
+        + b',"phase":' + orjson.dumps(phase)
+        + b',"content":'
+    )
+
+
+def agent_event(agent: str, phase: str, content: Any) -> bytes:
+    """Encode an {"agent", "phase", "content"} event as an SSE data line."""
+    return _agent_event_prefix(agent, phase) + orjson.dumps(content) + b"}\n\n"
+
+
+def event(payload: dict) -> bytes:
+    """Encode an arbitrary payload as an SSE data line."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+async def coalesce(
+    tokens: AsyncIterator[str],
+    max_tokens: int = COALESCE_MAX_TOKENS,
+    max_delay: float = COALESCE_MAX_DELAY
+) -> AsyncIterator[str]:
+    """
+    Join streamed tokens into larger chunks for fewer, bigger events.
+
+    A chunk is flushed once it holds max_tokens tokens or max_delay seconds
+    have passed since the last flush (checked as each token arrives), and
+    at the end of the stream. The frontend appends output events, so the
+    rendered text is unchanged.
+    """
+    buffer: list[str] = []
+    last_flush = time.monotonic()
+    async for token in tokens:
+        buffer.append(token)
+        now = time.monotonic()
+        if len(buffer) >= max_tokens or now - last_flush >= max_delay:
+            yield "".join(buffer)
+            buffer.clear()
+            last_flush = now
+    if buffer:
+        yield "".join(buffer)
+
+
+async def pace(seconds: float) -> None:
+    """Pause for UI pacing when UI_PACING_ENABLED; otherwise just yield to the loop."""
+    await asyncio.sleep(seconds if UI_PACING_ENABLED else 0)